@@ -1,6 +1,28 @@
 import unittest
+import importlib.util
 import datetime as dt
-from pandasCGcalc import Portfolio, AssetType
+from pandasCGcalc import Portfolio, AssetType, TransactionType, TransactionHistory, EngineProfile, TaxEvent, Holdings, HoldingsDelta, toDay
+from workpaperExport import partitionByFinancialYear, financialYear
+from startupBenchmark import startupBudget, runStartupBenchmark
+from engineBenchmark import generateHistory, benchmarkHistory, compareResults
+from memoryDiagnostics import runMemoryDiagnostics, pipelineStages
+from saleScenarios import compareSaleMethods
+from taxLotOptimizer import optimizeFinancialYear
+from clientWorkspace import ClientWorkspace
+from transactionStore import TransactionStore
+from editJournal import EditJournal
+from transactionWatcher import TransactionWatcher
+from eventStream import chunks, withProgress, financialYearTotals
+from markToMarket import readPrices, markToMarket
+from transactionValidation import validateTransactions, checkTransactions
+from resultCache import ResultCache, transactionsKey
+from liveRecalculation import CheckpointedReplay, LiveRecalculation
+import tracemalloc
+import threading
+import random
+import tempfile
+import os
+import pandas as pd
 
 class PortfolioTestCase(unittest.TestCase):
     def setUp(self):
@@ -529,5 +551,801 @@ class PortfolioTestCase(unittest.TestCase):
         assert testParcels[0][1] == 5000.00, "lowestgain_sale() failed test: cost base of shares in first parcel does not match expected value"
         assert testParcels[1][1] == 5000.00, "lowestgain_sale() failed test: cost base of shares in second parcel does not match expected value"
 
+    def test_centsAllocation(self):
+        """
+        Confirms cost base and proceeds are allocated in whole cents with
+        nothing lost to rounding: a parcel of 3 bought for 100.00 sold one
+        unit at a time gives cost bases summing exactly to 100.00, and a
+        sale spanning two parcels splits its proceeds exactly
+        """
+        self.standardSharePurchase(value = 100.00, quantity = 3.00, purchaseDate = dt.date(2022, 3, 30))
+        costBases = []
+        for saleDate in [dt.date(2023, 4, 1), dt.date(2023, 4, 2), dt.date(2023, 4, 3)]:
+            costBases.append(self.portfolio.fifoSale(AssetType.Share, 'TEST', saleDate, 10.00, 1.00)[0]['CostBase'])
+        assert costBases == [33.33, 33.34, 33.33], "fifoSale() cents failed test: cost bases do not match expected values"
+        assert self.portfolio.holdingsSize() == 0, "fifoSale() cents failed test: parcel not removed once sold out"
+
+        self.standardSharePurchase(value = 10.00, quantity = 3.00, purchaseDate = dt.date(2022, 3, 30))
+        self.standardSharePurchase(value = 10.00, quantity = 3.00, purchaseDate = dt.date(2022, 4, 30))
+        testValues = self.portfolio.fifoSale(AssetType.Share, 'TEST', dt.date(2023, 4, 1), 100.00, 4.00)
+        assert [event['Proceeds'] for event in testValues] == [75.00, 25.00], "fifoSale() cents failed test: proceeds do not match expected values"
+        assert [event['CostBase'] for event in testValues] == [10.00, 3.33], "fifoSale() cents failed test: cost bases do not match expected values"
+        consolidated = self.portfolio.consolidatePortfolio()
+        assert consolidated['Quantity'].tolist() == [2] and consolidated['Value'].tolist() == [6.67], "consolidatePortfolio() cents failed test: remaining parcel does not match expected value"
+        assert round(self.portfolio.assets['Value'].sum(), 2) == 6.67, "assets cents failed test: units do not sum to the parcel cost base"
+
+    def test_taxEventColumns(self):
+        """
+        Confirms recorded events are built into the taxable transactions frame
+        with the expected columns, dollar amounts and order, and that the
+        frame is rebuilt once more events are recorded
+        """
+        self.portfolio.recordEvents([
+            TaxEvent(dt.date(2023, 4, 1), 'TEST', AssetType.Share, TransactionType.FIFO_Sale, 5, dt.date(2022, 3, 30), 1000001, 500000, True),
+            TaxEvent(dt.date(2023, 4, 2), 'TEST', AssetType.Share, TransactionType.FIFO_Sale, 1, dt.date(2023, 3, 30), 100, 150, 'Loss')
+        ])
+        taxTransactions = self.portfolio.taxableTransactions
+        assert taxTransactions.columns.tolist() == ['Date', 'AssetID', 'AssetType', 'TransactionType', 'Quantity', 'AcquisitionDate', 'Proceeds', 'CostBase', 'GrossValue', 'Discountable'], "TaxEventColumns failed test: columns do not match expected values"
+        assert taxTransactions['Proceeds'].tolist() == [10000.01, 1.00], "TaxEventColumns failed test: proceeds do not match expected values"
+        assert taxTransactions['GrossValue'].tolist() == [5000.01, -0.50], "TaxEventColumns failed test: gross values do not match expected values"
+        assert taxTransactions['Discountable'].tolist() == [True, 'Loss'], "TaxEventColumns failed test: discountable does not match expected values"
+        self.portfolio.recordEvents([TaxEvent(dt.date(2023, 4, 3), 'TEST', AssetType.Share, TransactionType.FIFO_Sale, 1, dt.date(2023, 3, 30), 100, 100, False)])
+        assert len(self.portfolio.taxableTransactions) == 3, "TaxEventColumns failed test: frame not rebuilt after recording events"
+
+    def test_recordedSaleMethods(self):
+        """
+        Confirms every share sale method replayed through readTransactions
+        records its CGT events, with cost bases summing exactly to the
+        cents paid for the units sold
+        """
+        for transactionType in [TransactionType.FIFO_Sale, TransactionType.LIFO_Sale, TransactionType.HighestGain_Sale, TransactionType.LowestGain_Sale]:
+            portfolio = Portfolio()
+            portfolio.readTransactions(pd.DataFrame({
+                'Date': [dt.date(2022, 3, 30), dt.date(2022, 4, 30), dt.date(2023, 4, 1)],
+                'AssetType': [AssetType.Share] * 3,
+                'AssetID': ['TEST'] * 3,
+                'TransactionType': [TransactionType.Purchase, TransactionType.Purchase, transactionType],
+                'Quantity': [7.00, 3.00, 10.00],
+                'Value': [100.01, 33.33, 200.00],
+                'OptionID': [None] * 3,
+                'OptionSplitID': [None] * 3
+            }))
+            taxTransactions = portfolio.taxableTransactions
+            assert len(taxTransactions) == 2, f"readTransactions() {transactionType.name} failed test: events were not recorded"
+            assert round(taxTransactions['CostBase'].sum(), 2) == 133.34, f"readTransactions() {transactionType.name} failed test: cost base does not match expected value"
+            assert round(taxTransactions['Proceeds'].sum(), 2) == 200.00, f"readTransactions() {transactionType.name} failed test: proceeds do not match expected value"
+
+    def test_holdingsSummary(self):
+        """
+        Confirms the holdings summary kept up to date during replay matches
+        grouping the parcels held, after purchases, share and option sales,
+        splits, merges, exercises and expiries
+        """
+        transactionHistory = TransactionHistory()
+        transactionHistory.readData(generateHistory(4000, tickers = 8, seed = 9))
+        portfolio = Portfolio()
+        portfolio.readTransactions(transactionHistory.transactions)
+        grouped = portfolio.parcelTable().groupby(['AssetIdentifier', 'AssetType', 'OptionID', 'PurchaseDate']).agg({'Quantity' : 'sum', 'Cents' : 'sum'}).reset_index()
+        summary = portfolio.summary.frame()
+        assert summary.astype(str).equals(grouped.astype(str)), "HoldingsSummary failed test: summary does not match grouped parcels"
+        assert (portfolio.consolidatePortfolio()['Value'] * 100).round().astype(int).tolist() == grouped['Cents'].tolist(), "consolidatePortfolio() failed test: values do not match grouped parcels"
+
+        portfolio.clearAssets()
+        assert portfolio.consolidatePortfolio().empty and portfolio.holdingsAsOf(dt.date(2030, 6, 30)).empty, "clearAssets() failed test: holdings remain after clearing"
+
+    def test_holdingsAsOf(self):
+        """
+        Confirms holdings as at past dates match replaying only the
+        transactions up to each date, including dates inside a snapshot
+        block and before the first transaction, and that a fork's later sales
+        do not change the parent's history
+        """
+        transactionHistory = TransactionHistory()
+        transactionHistory.readData(generateHistory(3000, tickers = 6, seed = 10))
+        transactions = transactionHistory.transactions
+        portfolio = Portfolio()
+        portfolio.readTransactions(transactions)
+        assert len(portfolio.history.days) > 1, "readTransactions() failed test: holdings history was not split into blocks"
+        for date in [dt.date(2000, 1, 1), dt.date(2010, 6, 30), dt.date(2011, 2, 14), dt.date(2012, 6, 30), dt.date(2030, 6, 30)]:
+            truncated = Portfolio()
+            truncated.readTransactions(transactions[transactions['Date'] <= pd.Timestamp(date)])
+            assert portfolio.holdingsAsOf(date).equals(truncated.consolidate(truncated.summary, date)), f"holdingsAsOf() failed test: holdings at {date} do not match truncated replay"
+
+        before = portfolio.holdingsAsOf(dt.date(2030, 6, 30))
+        fork = portfolio.fork()
+        asset = before.loc[before['AssetType'] == AssetType.Share, 'AssetIdentifier'].iloc[0]
+        fork.recordDate(dt.date(2030, 7, 1))
+        fork.recordEvents(fork.sellShares(TransactionType.FIFO_Sale, AssetType.Share, asset, dt.date(2030, 7, 1), 100.00, 1.00))
+        assert portfolio.holdingsAsOf(dt.date(2030, 7, 1)).drop(columns = 'Discountable').equals(before.drop(columns = 'Discountable')), "holdingsAsOf() failed test: fork sale changed parent history"
+        assert fork.holdingsAsOf(dt.date(2030, 7, 1))['Quantity'].sum() == before['Quantity'].sum() - 1, "holdingsAsOf() failed test: fork sale missing from fork history"
+
+class PortfolioForkTestCase(unittest.TestCase):
+    def setUp(self):
+        self.portfolio = Portfolio()
+        self.portfolio.purchase(AssetType.Share, 'TEST', dt.date(2022, 3, 30), 1000.00, 10.00)
+        self.portfolio.purchase(AssetType.Share, 'OTHER', dt.date(2022, 3, 30), 500.00, 5.00)
+        self.portfolio.recordEvents(self.portfolio.sellShares(TransactionType.FIFO_Sale, AssetType.Share, 'TEST', dt.date(2022, 6, 30), 200.00, 2.00))
+
+    def holdings(self, portfolio: Portfolio) -> list:
+        return portfolio.consolidatePortfolio()[['AssetIdentifier', 'Quantity', 'Value']].values.tolist()
+
+    def test_forkIsolation(self):
+        """
+        Confirms sales, purchases and recorded events on a fork never reach
+        the parent, and that changes to the parent after forking never reach
+        the fork, including through nested forks
+        """
+        before = self.holdings(self.portfolio)
+        fork = self.portfolio.fork()
+        fork.recordEvents(fork.sellShares(TransactionType.LIFO_Sale, AssetType.Share, 'TEST', dt.date(2023, 6, 30), 400.00, 4.00))
+        fork.purchase(AssetType.Share, 'NEW', dt.date(2023, 6, 30), 100.00, 1.00)
+        assert self.holdings(self.portfolio) == before, "fork() failed test: fork changes leaked into parent holdings"
+        assert len(self.portfolio.taxableTransactions) == 1 and len(fork.taxableTransactions) == 2, "fork() failed test: events do not match expected values"
+
+        forkHoldings = self.holdings(fork)
+        self.portfolio.recordEvents(self.portfolio.sellShares(TransactionType.FIFO_Sale, AssetType.Share, 'OTHER', dt.date(2023, 6, 30), 100.00, 5.00))
+        self.portfolio.purchase(AssetType.Share, 'TEST', dt.date(2023, 7, 1), 100.00, 1.00)
+        assert self.holdings(fork) == forkHoldings, "fork() failed test: parent changes leaked into fork holdings"
+        assert len(fork.taxableTransactions) == 2, "fork() failed test: parent events leaked into fork"
+
+        nested = fork.fork()
+        nested.recordEvents(nested.sellShares(TransactionType.FIFO_Sale, AssetType.Share, 'NEW', dt.date(2023, 7, 1), 100.00, 1.00))
+        assert self.holdings(fork) == forkHoldings and len(fork.taxableTransactions) == 2, "fork() failed test: nested fork changes leaked into fork"
+        assert ['NEW', 1, 100.00] not in self.holdings(nested), "fork() failed test: nested fork sale not applied"
+
+    def test_forkSharing(self):
+        """
+        Confirms a fork shares parcel arrays with its parent until it changes
+        them, and only copies the books it changes
+        """
+        fork = self.portfolio.fork()
+        assert fork.holdings.get((AssetType.Share, 'TEST')) is self.portfolio.holdings.get((AssetType.Share, 'TEST')), "fork() failed test: holdings not shared"
+        fork.recordEvents(fork.sellShares(TransactionType.FIFO_Sale, AssetType.Share, 'TEST', dt.date(2023, 6, 30), 100.00, 1.00))
+        parentBook, forkBook = self.portfolio.holdings.get((AssetType.Share, 'TEST')), fork.holdings.get((AssetType.Share, 'TEST'))
+        assert forkBook is not parentBook and forkBook.purchaseDates is parentBook.purchaseDates, "fork() failed test: changed book not shared structurally"
+        assert fork.holdings.get((AssetType.Share, 'OTHER')) is self.portfolio.holdings.get((AssetType.Share, 'OTHER')), "fork() failed test: unchanged book was copied"
+        for i in range(40):
+            fork = fork.fork()
+        assert fork.holdings.depth <= Holdings.maxDepth and self.holdings(fork) == self.holdings(fork.fork()), "fork() failed test: snapshot chain not flattened"
+
+class TransactionHistoryTestCase(unittest.TestCase):
+    def test_categoricalColumns(self):
+        """
+        Confirms readData decodes enum and identifier columns to categoricals,
+        decodes sales by asset type, and sorts options ahead of shares on the
+        same date
+        """
+        transactionHistory = TransactionHistory()
+        transactionHistory.readData(pd.DataFrame({
+            'Date': ['02/01/2023', '01/01/2023', '01/01/2023'],
+            'AssetType': ['Share', 'share', 'Option'],
+            'AssetID': ['TEST', 'TEST', 'TEST'],
+            'TransactionType': ['Sale', 'Buy', 'Sale'],
+            'Quantity': [1.00, 2.00, 3.00],
+            'Value': [10.00, 20.00, 30.00],
+            'OptionID': [None, None, 'TEST1'],
+            'OptionSplitID': [None, None, None]
+        }))
+        transactions = transactionHistory.transactions
+        for column in ['AssetType', 'AssetID', 'TransactionType', 'OptionID']:
+            assert isinstance(transactions[column].dtype, pd.CategoricalDtype), f"readData() failed test: {column} is not categorical"
+        assert transactions['AssetType'].tolist() == [AssetType.Option, AssetType.Share, AssetType.Share], "readData() failed test: sort order does not match expected values"
+        assert transactions['TransactionType'].tolist() == [TransactionType.Option_Sale, TransactionType.Purchase, TransactionType.FIFO_Sale], "readData() failed test: transaction types do not match expected values"
+        assert AssetType.Option < AssetType.Share and TransactionType.Purchase < TransactionType.FIFO_Sale, "Enum ordering failed test: members out of order"
+
+    def test_datetimeColumns(self):
+        """
+        Confirms dates are decoded to datetime64 and filtered with dt.date
+        bounds, and that the discount applies only to shares held for more
+        than a year, including purchases made on 29 February
+        """
+        transactionHistory = TransactionHistory()
+        transactionHistory.readData(pd.DataFrame({
+            'Date': ['29/02/2024', '30/03/2022', '28/02/2025', '30/03/2023', '2025-03-01'],
+            'AssetType': ['Share'] * 5,
+            'AssetID': ['LEAP', 'TEST', 'LEAP', 'TEST', 'LEAP'],
+            'TransactionType': ['Buy', 'Buy', 'Sale', 'Sale', 'Sale'],
+            'Quantity': [2.00, 1.00, 1.00, 1.00, 1.00],
+            'Value': [10.00, 10.00, 20.00, 20.00, 20.00],
+            'OptionID': [None] * 5,
+            'OptionSplitID': [None] * 5
+        }))
+        transactions = transactionHistory.transactions
+        assert pd.api.types.is_datetime64_dtype(transactions['Date']), "readData() failed test: dates are not datetime64"
+        assert len(transactionHistory.filterByDate(transactions, dt.date(2023, 3, 30), dt.date(2024, 2, 29))) == 2, "filterByDate() failed test: filtered rows do not match expected value"
+        portfolio = Portfolio()
+        portfolio.readTransactions(transactions)
+        taxTransactions = portfolio.taxableTransactions
+        assert pd.api.types.is_datetime64_dtype(taxTransactions['AcquisitionDate']), "taxableTransactions failed test: acquisition dates are not datetime64"
+        assert taxTransactions['Discountable'].tolist() == [False, False, True], "discountable failed test: one year boundary does not match expected values"
+
+class EngineProfileTestCase(unittest.TestCase):
+    def test_profiledReplay(self):
+        """
+        Confirms a profiled decode and replay records every decode stage and
+        transaction handler, produces the same result as an unprofiled run,
+        and exports a chrome trace with one event per handler call
+        """
+        history = generateHistory(60, tickers = 3, seed = 4)
+        profile = EngineProfile()
+        transactionHistory = TransactionHistory(profile)
+        transactionHistory.readData(history.copy())
+        profiledPortfolio = Portfolio(profile)
+        profiledPortfolio.readTransactions(transactionHistory.transactions)
+        portfolio = Portfolio()
+        portfolio.readTransactions(transactionHistory.transactions)
+
+        assert set(profile.stages) == {'decodeAssetType', 'decodeTransactionType', 'decodeDate', 'decodeNumbers', 'sortByDate'}, "EngineProfile failed test: decode stages do not match expected values"
+        assert sum(stats['calls'] for stats in profile.handlers.values()) == len(history), "EngineProfile failed test: handler calls do not match transaction count"
+        assert profile.handlers['Purchase']['peakHoldings'] >= portfolio.holdingsSize(), "EngineProfile failed test: peak holdings lower than final holdings"
+        assert profiledPortfolio.taxableTransactions.equals(portfolio.taxableTransactions), "EngineProfile failed test: profiled replay changed the result"
+        report = profile.report()
+        assert len(report) == len(profile.handlers) + len(profile.stages), "EngineProfile failed test: report rows do not match expected value"
+        trace = profile.toChromeTrace()['traceEvents']
+        assert len([event for event in trace if event['ph'] == 'X' and event['cat'] == 'readTransactions']) == len(history), "EngineProfile failed test: trace events do not match transaction count"
+
+class MemoryDiagnosticsTestCase(unittest.TestCase):
+    def test_runMemoryDiagnostics(self):
+        """
+        Confirms every pipeline stage is reported with a peak at least as
+        large as what it retained, the replay stage sizes the holdings
+        frame, and tracing is stopped afterwards
+        """
+        profile = runMemoryDiagnostics(generateHistory(60, tickers = 3, seed = 5))
+        assert list(profile.stages) == pipelineStages, "runMemoryDiagnostics() failed test: stages do not match expected values"
+        for stage, stats in profile.stages.items():
+            assert stats['peakBytes'] >= stats['retainedBytes'], f"runMemoryDiagnostics() failed test: {stage} retained more than its peak"
+        assert profile.stages['replay']['frameBytes']['holdings'] > 0, "runMemoryDiagnostics() failed test: holdings frame was not sized"
+        assert profile.peakBytes() > 0, "runMemoryDiagnostics() failed test: no peak recorded"
+        assert not tracemalloc.is_tracing(), "runMemoryDiagnostics() failed test: tracemalloc left running"
+        result = {'rows': 1, 'seed': 0, 'tickers': 1, 'peakBytes': {stage: stats['peakBytes'] for stage, stats in profile.stages.items()}}
+        larger = {**result, 'peakBytes': {stage: peak * 2 + 1 for stage, peak in result['peakBytes'].items()}}
+        assert len(compareResults({'results': [result]}, {'results': [larger]}, measure = 'peakBytes')) == len(pipelineStages), "compareResults() failed test: memory regressions were not flagged"
+
+class WorkpaperExportTestCase(unittest.TestCase):
+    def test_partitionByFinancialYear(self):
+        """
+        Confirms events are allocated to the financial year ending 30 June,
+        and that years without events still get an empty partition
+        """
+        events = pd.DataFrame({
+            'Date': [dt.date(2022, 6, 30), dt.date(2022, 7, 1), dt.date(2023, 6, 30), dt.date(2024, 1, 1)],
+            'Proceeds': [1.00, 2.00, 3.00, 4.00]
+        })
+        partitions = partitionByFinancialYear(events, [2022, 2023, 2024, 2025])
+        assert partitions[2022]['Proceeds'].tolist() == [1.00], "partitionByFinancialYear() failed test: FY2022 events do not match expected values"
+        assert partitions[2023]['Proceeds'].tolist() == [2.00, 3.00], "partitionByFinancialYear() failed test: FY2023 events do not match expected values"
+        assert partitions[2024]['Proceeds'].tolist() == [4.00], "partitionByFinancialYear() failed test: FY2024 events do not match expected values"
+        assert partitions[2025].empty, "partitionByFinancialYear() failed test: FY2025 should have no events"
+
+class StartupBudgetTestCase(unittest.TestCase):
+    def test_excelSerialDate(self):
+        """
+        Confirms excel serial dates still decode now that xlrd is only
+        imported when one is seen
+        """
+        assert TransactionHistory().decodeDate('44702') == dt.date(2022, 5, 21), "decodeDate() failed test: excel serial date does not match expected value"
+        assert TransactionHistory().decodeDate('21/05/2022') == dt.date(2022, 5, 21), "decodeDate() failed test: short date does not match expected value"
+
+    @unittest.skipUnless(importlib.util.find_spec('PySide6'), "PySide6 is required to open the main window")
+    def test_startupBudget(self):
+        """
+        Opens the main window in a fresh interpreter and confirms it is shown
+        within budget without loading openpyxl, xlrd or the feature modules
+        deferred until their actions are used
+        """
+        report = runStartupBenchmark()
+        assert report['firstWindowSeconds'] <= startupBudget['firstWindowSeconds'], f"startup failed test: first window took {report['firstWindowSeconds']:.2f}s"
+        assert report['deferredModulesLoaded'] == [], f"startup failed test: {report['deferredModulesLoaded']} imported before first use"
+        assert 'CapitalGainUiNew' in report['importSeconds'], "startup failed test: import time of app module was not recorded"
+
+class EngineBenchmarkTestCase(unittest.TestCase):
+    def test_generateHistory(self):
+        """
+        Confirms the synthetic history generator is deterministic for a seed
+        and produces exactly the requested number of rows
+        """
+        history = generateHistory(500, tickers = 5, seed = 1)
+        assert len(history) == 500, "generateHistory() failed test: row count does not match expected value"
+        assert history.equals(generateHistory(500, tickers = 5, seed = 1)), "generateHistory() failed test: same seed produced different histories"
+        assert not history.equals(generateHistory(500, tickers = 5, seed = 2)), "generateHistory() failed test: different seeds produced the same history"
+        assert set(history['TransactionType']) >= {'Purchase', 'Sale', 'Split', 'Merge', 'Exercise'}, "generateHistory() failed test: expected transaction types are missing"
+
+    def test_benchmarkHistory(self):
+        """
+        Runs every benchmark stage over a small generated history and confirms
+        each stage is timed and comparisons flag slower stages
+        """
+        result = benchmarkHistory(150, tickers = 5, export = False)
+        expectedStages = {'readData', 'readTransactions_FIFO', 'readTransactions_LIFO', 'readTransactions_HighestGain', 'readTransactions_LowestGain', 'filterTaxTransactions', 'consolidatePortfolio'}
+        assert expectedStages <= set(result['seconds']), "benchmarkHistory() failed test: stage timings are missing"
+        assert result['taxableEvents'] > 0, "benchmarkHistory() failed test: no taxable events were produced"
+        slower = {'results': [{**result, 'seconds': {stage: seconds * 2 + 1 for stage, seconds in result['seconds'].items()}}]}
+        assert len(compareResults({'results': [result]}, slower)) == len(result['seconds']), "compareResults() failed test: regressions were not flagged"
+        assert compareResults({'results': [result]}, {'results': [result]}) == [], "compareResults() failed test: identical results flagged as regressions"
+
+class SaleScenariosTestCase(unittest.TestCase):
+    def test_compareSaleMethods(self):
+        """
+        Confirms a what-if sale is evaluated under every sale method with the
+        expected cost bases and net gains, and leaves the portfolio unchanged
+        """
+        portfolio = Portfolio()
+        portfolio.purchase(AssetType.Share, 'TEST', dt.date(2021, 3, 30), 1000.00, 10.00) # held over a year at sale
+        portfolio.purchase(AssetType.Share, 'TEST', dt.date(2023, 1, 30), 3000.00, 10.00)
+        scenarios = compareSaleMethods(portfolio, 'TEST', dt.date(2023, 4, 1), 2000.00, 10.00).set_index('Method')
+        assert scenarios.loc['FIFO', 'CostBase'] == 1000.00 and scenarios.loc['FIFO', 'DiscountableGain'] == 1000.00, "compareSaleMethods() failed test: FIFO does not match expected values"
+        assert scenarios.loc['FIFO', 'NetGain'] == 500.00, "compareSaleMethods() failed test: FIFO net gain does not match expected value"
+        assert scenarios.loc['LIFO', 'CostBase'] == 3000.00 and scenarios.loc['LIFO', 'Loss'] == -1000.00, "compareSaleMethods() failed test: LIFO does not match expected values"
+        assert scenarios.loc['LowestGain', 'NetGain'] == -1000.00, "compareSaleMethods() failed test: lowest gain net gain does not match expected value"
+        assert portfolio.taxableTransactions.empty and portfolio.consolidatePortfolio()['Quantity'].tolist() == [10, 10], "compareSaleMethods() failed test: scenario changed the portfolio"
+        with self.assertRaises(Exception):
+            compareSaleMethods(portfolio, 'TEST', dt.date(2023, 4, 1), 2000.00, 21.00)
+
+class ClientWorkspaceTestCase(unittest.TestCase):
+    def test_spillAndReopen(self):
+        """
+        Confirms clients beyond the byte limit are spilled least recently
+        used first and reopen from the cache with their calculated results,
+        and that a client whose file has changed is read again
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            paths = [os.path.join(directory, f'client{i}.csv') for i in range(3)]
+            for seed, path in enumerate(paths):
+                generateHistory(300, tickers = 5, seed = seed).to_csv(path, index = False)
+            workspace = ClientWorkspace(byteLimit = 0, cacheDirectory = os.path.join(directory, 'cache'))
+            expected = [len(workspace.calculate(path).taxTransactions) for path in paths]
+            assert list(workspace.clients) == [paths[2]] and set(workspace.spilled) == set(paths[:2]), "evict() failed test: least recently used clients were not spilled"
+            client = workspace.get(paths[0])
+            assert client is not None and len(client.taxTransactions) == expected[0] and client.portfolio.holdingsSize() > 0, "get() failed test: spilled client did not reopen with its results"
+            assert workspace.paths()[0] == paths[0], "paths() failed test: reopened client is not most recent"
+            workspace.byteLimit = 2**30
+            assert workspace.get(paths[1]) is not None and len(workspace.clients) == 2, "get() failed test: clients within the byte limit were spilled"
+            generateHistory(200, tickers = 5, seed = 9).to_csv(paths[1], index = False)
+            assert workspace.get(paths[1]) is None and workspace.open(paths[1]).portfolio is None, "get() failed test: changed file reopened from the workspace"
+            workspace.close(paths[0])
+            assert paths[0] not in workspace and paths[0] not in workspace.paths(), "close() failed test: client is still open"
+
+            journal = EditJournal(paths[2])
+            journal.update(0, 4, '10')
+            transactions = workspace.update(paths[2], workspace.open(paths[2]).transactions).transactions
+            assert workspace.get(paths[2]) is not None, "update() failed test: edited client was not kept"
+            journal.open()
+            workspace.refreshSignature(paths[2])
+            assert workspace.get(paths[2]).transactions is transactions, "refreshSignature() failed test: client was read again after its journal marked it opened"
+
+    def test_spillFilesRemoved(self):
+        """
+        Confirms spill files are removed once read back or out of date, and
+        that files left by an earlier session are trimmed to the cache limit
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            cacheDirectory = os.path.join(directory, 'cache')
+            paths = [os.path.join(directory, f'client{i}.csv') for i in range(2)]
+            for seed, path in enumerate(paths):
+                generateHistory(300, tickers = 5, seed = seed).to_csv(path, index = False)
+            workspace = ClientWorkspace(byteLimit = 0, cacheDirectory = cacheDirectory)
+            for path in paths:
+                workspace.calculate(path)
+            assert len(workspace.cacheFiles()) == 1, "spill() failed test: spilled client was not written to the cache"
+            generateHistory(200, tickers = 5, seed = 9).to_csv(paths[0], index = False)
+            workspace.calculate(paths[0])
+            assert workspace.get(paths[0]) is not None and [path for path, size in workspace.cacheFiles()] == [workspace.cacheFile(paths[1], workspace.spilled[paths[1]])], "get() failed test: out of date spill file was kept"
+            assert workspace.get(paths[1]) is not None and len(workspace.cacheFiles()) == 1, "get() failed test: spill file was kept once read back"
+
+            for i in range(3):
+                with open(os.path.join(cacheDirectory, f'earlier{i}.client'), 'wb') as cacheFile:
+                    cacheFile.write(b'0' * 1000)
+            workspace = ClientWorkspace(cacheDirectory = cacheDirectory, cacheByteLimit = 1500)
+            assert sum(size for path, size in workspace.cacheFiles()) <= 1500, "trimCache() failed test: spill files from an earlier session were kept beyond the limit"
+
+class TransactionStoreTestCase(unittest.TestCase):
+    def test_queryAndReplay(self):
+        """
+        Confirms a bulk imported store reads back the same decoded frame as
+        readData, that asset and date queries return only matching rows, and
+        that a chunked replay gives the same CGT events as replaying the frame
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            csvFile = os.path.join(directory, 'history.csv')
+            generateHistory(2000, tickers = 10, seed = 4).to_csv(csvFile, index = False)
+            transactionHistory = TransactionHistory()
+            transactionHistory.readData(pd.read_csv(csvFile))
+            transactions = transactionHistory.transactions
+            with TransactionStore(os.path.join(directory, 'history.sqlite'), chunkSize = 300) as store:
+                store.importFile(csvFile)
+                assert len(store) == len(transactions) and store.read().astype(str).equals(transactions.astype(str)), "read() failed test: stored transactions do not match decoded transactions"
+                assert len(list(store.query())) == 7, "query() failed test: rows were not streamed in chunks"
+                asset = store.read(assetIdentifier = 'T003')
+                assert len(asset) == (transactions['AssetID'] == 'T003').sum() and set(asset['AssetID']) == {'T003'}, "read() failed test: asset query does not match expected rows"
+                window = store.read(startDate = dt.date(2011, 1, 1), endDate = dt.date(2011, 6, 30))
+                assert len(window) == len(transactionHistory.filterByDate(transactions, dt.date(2011, 1, 1), dt.date(2011, 6, 30))), "read() failed test: date query does not match expected rows"
+                portfolio = Portfolio()
+                portfolio.readTransactions(transactions)
+                assert store.replay().taxableTransactions.equals(portfolio.taxableTransactions), "replay() failed test: CGT events do not match replaying the decoded frame"
+
+    def test_failedReplace(self):
+        """
+        Confirms a replace whose insert fails leaves the rows already stored
+        """
+        transactionHistory = TransactionHistory()
+        transactionHistory.readData(generateHistory(200, tickers = 2, seed = 5))
+        transactions = transactionHistory.transactions
+        with tempfile.TemporaryDirectory() as directory:
+            with TransactionStore(os.path.join(directory, 'history.sqlite')) as store:
+                store.insert(transactions)
+                invalid = transactions.astype({'TransactionType': object})
+                invalid.loc[len(invalid) - 1, 'TransactionType'] = 'Bogus'
+                with self.assertRaises(Exception):
+                    store.replace(invalid)
+                assert len(store) == len(transactions) and store.read().astype(str).equals(transactions.astype(str)), "replace() failed test: stored rows were lost when the insert failed"
+
+class EditJournalTestCase(unittest.TestCase):
+    def test_journalAndCompact(self):
+        """
+        Confirms journalled edits address rows in table order, that only
+        committed edits load unless unsaved ones are asked for, that a torn
+        last line is ignored, and that compaction folds the saved edits into
+        the CSV
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            csvFile = os.path.join(directory, 'history.csv')
+            pd.DataFrame({'Date': ['01/03/2023', '01/01/2023', '01/02/2023'], 'AssetType': ['Share'] * 3, 'AssetID': ['C', 'A', 'B'],
+                          'TransactionType': ['Purchase'] * 3, 'Quantity': ['10', '20', '30'], 'Value': ['100', '200', '300'],
+                          'OptionID': [''] * 3, 'OptionSplitID': [''] * 3}).to_csv(csvFile, index = False)
+            journal = EditJournal(csvFile)
+            journal.update(0, 4, '25')
+            journal.delete(1)
+            journal.insert(2, ['2023-04-01', 'Share', 'D', 'Purchase', '40', '400', '', ''])
+            journal.commit()
+            journal.update(0, 5, '999')
+            with open(journal.journalPath, 'a', encoding = 'utf-8') as journalFile:
+                journalFile.write('{"op": "del')
+            assert journal.load()['AssetID'].tolist() == ['A', 'C', 'D'] and journal.load()['Quantity'].tolist() == ['25', '10', '40'], "load() failed test: saved edits do not match expected rows"
+            assert journal.load(includeUnsaved = True)['Value'].tolist() == ['999', '100', '400'], "load() failed test: unsaved edit was not applied"
+            journal.discardUnsaved()
+            assert journal.read()[1] == [] and journal.load()['Value'].tolist() == ['200', '100', '400'], "discardUnsaved() failed test: unsaved edit was kept"
+
+            journal.open()
+            journal.delete(0)
+            journal.compact()
+            transactions = pd.read_csv(csvFile, dtype = str, keep_default_na = False)
+            assert transactions['AssetID'].tolist() == ['A', 'C', 'D'] and journal.read() == ([], [{'op': 'sort'}, {'op': 'delete', 'row': 0}]), "compact() failed test: saved edits were not folded into the CSV"
+            assert journal.load(includeUnsaved = True)['AssetID'].tolist() == ['C', 'D'], "compact() failed test: unsaved edits were not carried over"
+            pd.DataFrame(transactions).to_csv(csvFile, index = False, header = False, mode = 'a')
+            assert not journal.isCurrent() and len(journal.load()) == 6, "isCurrent() failed test: journal for a changed CSV was applied"
+
+class TransactionWatcherTestCase(unittest.TestCase):
+    def test_pollAppendedRows(self):
+        """
+        Confirms rows appended to a watched file are replayed onto the
+        existing portfolio, that a partly written line waits until it is
+        complete, including one the file ended with when it was first read,
+        and that an earlier dated row replays the whole history to the same
+        CGT events as reading the file from scratch
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            csvFile = os.path.join(directory, 'history.csv')
+            history = generateHistory(1500, tickers = 5, seed = 6)
+            history.iloc[:1000].to_csv(csvFile, index = False)
+            lines = history.iloc[1000:].to_csv(index = False, header = False)
+            with open(csvFile, 'a', newline = '') as file:
+                file.write(lines[:lines.index('\n') + 5])
+            watcher = TransactionWatcher(csvFile)
+            watcher.start()
+            assert len(watcher.transactions) == 1001, "start() failed test: partly written last line was read"
+            events = len(watcher.portfolio.taxEvents)
+            with open(csvFile, 'a', newline = '') as file:
+                file.write(lines[lines.index('\n') + 5:])
+            assert watcher.poll() and not watcher.replayed and len(watcher.newEvents()) == len(watcher.portfolio.taxEvents) - events, "poll() failed test: appended rows were not replayed onto the portfolio"
+            with open(csvFile, 'a') as file:
+                file.write('01/01/2000,Share,T001,Purchase,')
+            assert not watcher.poll() and len(watcher.transactions) == 1500, "poll() failed test: partly written line was read"
+            with open(csvFile, 'a') as file:
+                file.write('10,100,,\n')
+            assert watcher.poll() and watcher.replayed and len(watcher.transactions) == 1501, "poll() failed test: earlier dated row did not replay the history"
+            transactionHistory = TransactionHistory()
+            transactionHistory.readData(pd.read_csv(csvFile))
+            portfolio = Portfolio()
+            portfolio.readTransactions(transactionHistory.transactions)
+            assert watcher.transactions.astype(str).equals(transactionHistory.transactions.astype(str)), "poll() failed test: transactions do not match reading the file"
+            assert watcher.portfolio.taxableTransactions.equals(portfolio.taxableTransactions), "poll() failed test: CGT events do not match replaying the file"
+
+class EventStreamTestCase(unittest.TestCase):
+    def test_streamEvents(self):
+        """
+        Confirms streamed events match taxableTransactions from a full
+        replay, that holdings deltas sum to the units held, that unrecorded
+        streams leave no events behind, and that financial year totals match
+        the replayed events
+        """
+        transactionHistory = TransactionHistory()
+        transactionHistory.readData(generateHistory(3000, tickers = 6, seed = 8))
+        portfolio = Portfolio()
+        portfolio.readTransactions(transactionHistory.transactions)
+        taxTransactions = portfolio.taxableTransactions
+
+        streamed = Portfolio()
+        progress = []
+        events = list(streamed.streamEvents(withProgress(chunks(transactionHistory.transactions, 500), progress.append), holdingsDeltas = True))
+        assert streamed.taxableTransactions.equals(taxTransactions) and len([event for event in events if isinstance(event, TaxEvent)]) == len(taxTransactions), "streamEvents() failed test: streamed events do not match replayed events"
+        assert progress == list(range(500, 3001, 500)), "withProgress() failed test: progress counts do not match chunks"
+        assert sum(event.quantity for event in events if isinstance(event, HoldingsDelta)) == portfolio.parcelTable()['Quantity'].sum(), "streamEvents() failed test: holdings deltas do not sum to units held"
+
+        unrecorded = Portfolio()
+        totals = financialYearTotals(unrecorded.streamEvents(transactionHistory.transactions, record = False))
+        assert len(unrecorded.taxEvents) == 0, "streamEvents() failed test: unrecorded events were kept"
+        grossGains = taxTransactions.groupby(financialYear(taxTransactions['Date']))['GrossValue'].sum()
+        assert totals['Year'].tolist() == grossGains.index.tolist() and abs(totals[['Discountable', 'NonDiscountable', 'Losses']].sum(axis = 1).to_numpy() - grossGains.to_numpy()).max() < 0.005, "financialYearTotals() failed test: totals do not match replayed events"
+
+class MarkToMarketTestCase(unittest.TestCase):
+    def test_markToMarket(self):
+        """
+        Values holdings at the last price on or before the valuation date,
+        confirms unpriced holdings are left blank and only gains on
+        discountable parcels are discounted
+        """
+        transactionHistory = TransactionHistory()
+        transactionHistory.readData(pd.DataFrame({
+            'Date': ['01/01/2021', '01/05/2023', '01/05/2023'],
+            'AssetID': ['TEST', 'TEST', 'OTHER'],
+            'TransactionType': ['Buy'] * 3,
+            'Quantity': [10.00, 5.00, 2.00],
+            'Value': [1000.00, 1000.00, 50.00],
+            'AssetType': ['Share'] * 3, 'OptionID': [None] * 3, 'OptionSplitID': [None] * 3
+        }))
+        portfolio = Portfolio()
+        portfolio.readTransactions(transactionHistory.transactions)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'prices.csv')
+            pd.DataFrame({'Date': ['01/06/2023', '01/07/2023'], 'Ticker': ['TEST'] * 2, 'Close': ['150.00', '1,500.00']}).to_csv(path, index = False)
+            prices = readPrices(path)
+        assert prices['Price'].tolist() == [150.00, 1500.00] and prices['Date'].dt.month.tolist() == [6, 7], "readPrices() failed test: prices do not match price file"
+
+        valued = markToMarket(portfolio.holdingsAsOf(dt.date(2023, 6, 30)), prices, dt.date(2023, 6, 30)).set_index(['AssetIdentifier', 'Discountable'])
+        assert valued.loc[('TEST', True), 'MarketValue'] == 1500.00 and valued.loc[('TEST', False), 'MarketValue'] == 750.00, "markToMarket() failed test: market values do not match expected values"
+        assert valued.loc[('TEST', True), 'DiscountedGain'] == 250.00 and valued.loc[('TEST', False), 'DiscountedGain'] == -250.00, "markToMarket() failed test: discounted gains do not match expected values"
+        assert pd.isna(valued.loc[('OTHER', False), 'Price']) and pd.isna(valued.loc[('OTHER', False), 'MarketValue']), "markToMarket() failed test: unpriced holding was valued"
+
+class TransactionValidationTestCase(unittest.TestCase):
+    def test_validateTransactions(self):
+        """
+        Confirms oversells, unmatched share exercises, expiries of options
+        not held and sale types on the wrong asset type are each reported
+        against their row, and that a valid history reports nothing
+        """
+        transactionHistory = TransactionHistory()
+        transactionHistory.readData(pd.DataFrame({
+            'Date': ['01/01/2022', '01/02/2022', '01/03/2022', '01/04/2022', '01/05/2022', '01/06/2022', '01/07/2022', '01/08/2022', '01/09/2022'],
+            'AssetType': ['Share', 'Share', 'Share', 'Option', 'Option', 'Share', 'Option', 'Option', 'Share'],
+            'AssetID': ['TEST'] * 9,
+            'TransactionType': ['Buy', 'Split', 'FIFO_Sale', 'Buy', 'Expire', 'Exercise', 'Expire', 'FIFO_Sale', 'Option_Sale'],
+            'Quantity': [10.00, 2.00, 25.00, 5.00, 5.00, 5.00, 5.00, 1.00, 1.00],
+            'Value': [1000.00, 0.00, 2500.00, 50.00, 0.00, 500.00, 0.00, 10.00, 100.00],
+            'OptionID': ['', '', '', 'OPT1', 'OPT1', 'OPT1', 'OPT1', 'OPT1', ''],
+            'OptionSplitID': [''] * 9
+        }))
+        issues = validateTransactions(transactionHistory.transactions)
+        assert issues['Row'].tolist() == [2, 5, 6, 7, 8], "validateTransactions() failed test: reported rows do not match expected rows"
+        assert [issue.split(' ')[0] for issue in issues['Issue']] == ['Sells', 'Share', 'Expires', 'Share', 'Option_Sale'], "validateTransactions() failed test: issues do not match expected issues"
+        with self.assertRaises(Exception):
+            checkTransactions(transactionHistory.transactions)
+
+        # A merge rounds each purchase date's units down, two parcels of 3 merged 2 for 1 leave 2 units, not 3
+        transactionHistory = TransactionHistory()
+        transactionHistory.readData(pd.DataFrame({
+            'Date': ['01/01/2022', '01/02/2022', '01/03/2022', '01/04/2022'],
+            'AssetType': ['Share'] * 4,
+            'AssetID': ['TEST'] * 4,
+            'TransactionType': ['Buy', 'Buy', 'Merge', 'FIFO_Sale'],
+            'Quantity': [3.00, 3.00, 2.00, 3.00],
+            'Value': [300.00, 300.00, 0.00, 450.00],
+            'OptionID': [''] * 4,
+            'OptionSplitID': [''] * 4
+        }))
+        issues = validateTransactions(transactionHistory.transactions)
+        assert issues['Row'].tolist() == [3] and issues['Issue'].tolist() == ['Sells more units than are held'], "validateTransactions() failed test: sale of units lost rounding a merge was not reported"
+
+        transactionHistory = TransactionHistory()
+        transactionHistory.readData(generateHistory(2000, tickers = 4, seed = 9))
+        assert validateTransactions(transactionHistory.transactions).empty, "validateTransactions() failed test: generated history reported problems"
+
+class ResultCacheTestCase(unittest.TestCase):
+    def test_cachedResults(self):
+        """
+        Confirms a second calculation of the same transactions is read from
+        the cache with the same results and pending option exercises, that
+        an edited row gives a new key, and that results beyond the size
+        limit are evicted least recently used first and clear removes all
+        """
+        transactionHistory = TransactionHistory()
+        transactionHistory.readData(generateHistory(2000, tickers = 4, seed = 10))
+        transactions = transactionHistory.transactions
+        with tempfile.TemporaryDirectory() as directory:
+            resultCache = ResultCache(directory = directory)
+            portfolio, taxTransactions, assets = resultCache.calculate(transactions)
+            cached = resultCache.get(transactionsKey(transactions))
+            assert cached is not None and cached[1].equals(taxTransactions) and cached[2].equals(assets), "get() failed test: cached results do not match calculated results"
+            assert cached[0].optionExercises == portfolio.optionExercises and cached[0] is not portfolio, "get() failed test: cached portfolio does not match replayed portfolio"
+
+            edited = transactions.copy()
+            edited.loc[len(edited) - 1, 'Quantity'] += 1
+            assert transactionsKey(edited) != transactionsKey(transactions) and resultCache.get(transactionsKey(edited)) is None, "transactionsKey() failed test: edited transactions share a key"
+            resultCache.calculate(edited)
+            resultCache.byteLimit = resultCache.sizeBytes() - 1
+            resultCache.get(transactionsKey(transactions))
+            resultCache.evict()
+            assert resultCache.get(transactionsKey(edited)) is None and resultCache.get(transactionsKey(transactions)) is not None, "evict() failed test: most recently used result was evicted"
+            assert resultCache.clear() == 1 and resultCache.sizeBytes() == 0, "clear() failed test: cached results remain"
+
+@unittest.skipUnless(importlib.util.find_spec('PySide6'), "PySide6 is required for the table models")
+class TableModelTestCase(unittest.TestCase):
+    def test_pagedEvents(self):
+        """
+        Confirms the CGT event proxy pages rows into the view, sorts and date
+        filters by index array, and totals every filtered row rather than
+        only those fetched
+        """
+        from CapitalGainUiNew import FrameTableModel, RowIndexProxyModel
+        from PySide6.QtCore import Qt
+        transactionHistory = TransactionHistory()
+        transactionHistory.readData(generateHistory(20000, tickers = 4, seed = 11))
+        portfolio = Portfolio()
+        portfolio.readTransactions(transactionHistory.transactions)
+        events = portfolio.taxableTransactions
+        model = FrameTableModel(events)
+        rows = RowIndexProxyModel()
+        rows.setSourceModel(model)
+        assert len(events) > rows.pageSize and rows.rowCount() == rows.pageSize and rows.canFetchMore(), "RowIndexProxyModel failed test: first page is not the page size"
+        rows.fetchMore()
+        assert rows.rowCount() == min(len(events), 2 * rows.pageSize), "fetchMore() failed test: second page was not fetched"
+
+        column = events.columns.get_loc('GrossValue')
+        rows.sort(column, Qt.DescendingOrder)
+        assert rows.index(0, column).data() == f"{events['GrossValue'].max():,.2f}", "sort() failed test: largest gain is not first"
+
+        start, end = dt.date(2021, 7, 1), dt.date(2022, 6, 30)
+        rows.sort(-1)
+        rows.setRowFilter(lambda source: source.rowsBetween('Date', toDay(start), toDay(end)))
+        filtered = events[(events['Date'] >= toDay(start)) & (events['Date'] <= toDay(end))]
+        assert (rows.rows == filtered.index.to_numpy()).all(), "rowsBetween() failed test: date filter rows do not match"
+        assert abs(rows.columnTotals()['GrossValue'] - filtered['GrossValue'].sum()) < 1e-6, "columnTotals() failed test: total does not match filtered events"
+
+    def test_transactionTable(self):
+        """
+        Confirms edits, inserted rows and removed rows in the transaction
+        table model are read back by readData as entered
+        """
+        from CapitalGainUiNew import TransactionTableModel
+        transactionHistory = TransactionHistory()
+        transactionHistory.readData(generateHistory(200, tickers = 2, seed = 12))
+        transactions = transactionHistory.transactions
+        model = TransactionTableModel(transactions)
+        model.setData(model.index(0, transactions.columns.get_loc('Quantity')), '12345')
+        model.insertRow(model.rowCount())
+        model.setRow(model.rowCount() - 1, ['2030-01-01', 'Share', 'ZZZ', 'Purchase', '5', '50', '', ''])
+        model.removeRow(1)
+        saved = TransactionHistory()
+        saved.readData(model.textFrame())
+        quantities = transactions['Quantity']
+        assert len(saved.transactions) == len(transactions) and saved.transactions.iloc[-1]['AssetID'] == 'ZZZ', "textFrame() failed test: inserted row was not read back"
+        assert abs(saved.transactions['Quantity'].sum() - (quantities.sum() - quantities[0] - quantities[1] + 12345 + 5)) < 1e-6, "textFrame() failed test: edited quantity was not read back"
+
+class LiveRecalculationTestCase(unittest.TestCase):
+    def test_checkpointedReplay(self):
+        """
+        Confirms an edited history is replayed from the last checkpoint
+        before the edit with the same results as a full replay, and that a
+        cancelled replay leaves the checkpoints as they were
+        """
+        transactionHistory = TransactionHistory()
+        transactionHistory.readData(generateHistory(3000, tickers = 4, seed = 13))
+        transactions = transactionHistory.transactions
+        replay = CheckpointedReplay(500)
+        replay.replay(transactions)
+        edited = transactions.copy()
+        row = int(edited.index[edited['TransactionType'] == TransactionType.Purchase][-1])
+        edited.loc[row, 'Value'] += 100
+        assert replay.replay(edited, cancelled = lambda: True) is None and replay.transactions is transactions, "replay() failed test: cancelled replay changed the checkpoints"
+        portfolio = replay.replay(edited)
+        expected = Portfolio()
+        expected.readTransactions(edited)
+        assert replay.start == row // 500 * 500, f"replay() failed test: replayed from {replay.start} for an edit at {row}"
+        assert portfolio.taxableTransactions.equals(expected.taxableTransactions) and portfolio.consolidatePortfolio().equals(expected.consolidatePortfolio()), "replay() failed test: results do not match a full replay"
+
+    def test_supersededRuns(self):
+        """
+        Confirms only the latest of several tables submitted together is
+        delivered, and that a table that cannot be calculated delivers its
+        Exception
+        """
+        table = generateHistory(500, tickers = 2, seed = 14)
+        results = []
+        delivered = threading.Event()
+        liveRecalculation = LiveRecalculation(lambda generation, result: (results.append((generation, result)), delivered.set()), interval = 100)
+        purchase = table.index[table['TransactionType'] == 'Purchase'][0]
+        for value in [1001.5, 1002.5, 1003.5]:
+            edited = table.copy()
+            edited.loc[purchase, 'Value'] = value
+            generation = liveRecalculation.submit(edited)
+        assert delivered.wait(60) and len(results) == 1 and results[0][0] == generation, "submit() failed test: superseded runs were delivered"
+        assert (results[0][1][0].transactions['Value'] == 1003.5).any(), "submit() failed test: result is not from the latest table"
+        delivered.clear()
+        oversold = table.copy()
+        oversold.loc[len(oversold)] = ['2000-01-01', 'Share', 'ZZZ', 'FIFO_Sale', 1, 10, '', '']
+        liveRecalculation.submit(oversold)
+        assert delivered.wait(60) and isinstance(results[-1][1], Exception), "submit() failed test: check exception was not delivered"
+
+@unittest.skipUnless(importlib.util.find_spec('scipy'), "scipy is required for the tax lot optimizer")
+class TaxLotOptimizerTestCase(unittest.TestCase):
+    def readHistory(self, rows: dict) -> pd.DataFrame:
+        transactionHistory = TransactionHistory()
+        transactionHistory.readData(pd.DataFrame({**rows, 'AssetType': ['Share'] * len(rows['Date']), 'OptionID': [None] * len(rows['Date']), 'OptionSplitID': [None] * len(rows['Date'])}))
+        return transactionHistory.transactions
+
+    def test_optimizeFinancialYear(self):
+        """
+        Confirms the year's sales are reassigned to the parcels giving the
+        lowest net capital gain, with later purchases only available to later
+        sales, and that years before are replayed as entered
+        """
+        transactions = self.readHistory({
+            'Date': ['01/01/2021', '01/10/2022', '01/03/2023', '01/05/2023', '01/06/2023'],
+            'AssetID': ['TEST'] * 5,
+            'TransactionType': ['Buy', 'Buy', 'Sale', 'Buy', 'Sale'],
+            'Quantity': [10.00, 10.00, 10.00, 5.00, 8.00],
+            'Value': [1000.00, 3000.00, 2000.00, 500.00, 1600.00]
+        })
+        portfolio, summary = optimizeFinancialYear(transactions, 2023)
+        taxTransactions = portfolio.taxableTransactions
+        assert summary['AsEnteredNetGain'] == 100.00 and summary['NetGain'] == -200.00, "optimizeFinancialYear() failed test: net gains do not match expected values"
+        assert taxTransactions['GrossValue'].sum() == -200.00 and (taxTransactions['TransactionType'] == TransactionType.Optimized_Sale).all(), "optimizeFinancialYear() failed test: CGT events do not match expected values"
+        assert taxTransactions['Quantity'].sum() == 18 and portfolio.consolidatePortfolio()['Quantity'].sum() == 7, "optimizeFinancialYear() failed test: units sold do not match expected values"
+        portfolio, summary = optimizeFinancialYear(transactions, 2023, carriedLosses = 1000.00)
+        assert summary['NetGain'] == -1200.00, "optimizeFinancialYear() failed test: carried losses were not applied"
+        with self.assertRaises(Exception):
+            optimizeFinancialYear(self.readHistory({'Date': ['01/10/2022', '01/03/2023'], 'AssetID': ['TEST'] * 2, 'TransactionType': ['Buy', 'Sale'], 'Quantity': [5.00, 10.00], 'Value': [500.00, 1000.00]}), 2023)
+
+    def test_optimizeFinancialYearLaterSales(self):
+        """
+        Confirms transactions after the optimized year are replayed onto the
+        optimized parcels, so later sales stay in the CGT events and holdings
+        """
+        transactions = self.readHistory({
+            'Date': ['01/01/2021', '01/10/2022', '01/03/2023', '01/05/2023', '01/06/2023', '01/09/2023'],
+            'AssetID': ['TEST'] * 6,
+            'TransactionType': ['Buy', 'Buy', 'Sale', 'Buy', 'Sale', 'Sale'],
+            'Quantity': [10.00, 10.00, 10.00, 5.00, 8.00, 3.00],
+            'Value': [1000.00, 3000.00, 2000.00, 500.00, 1600.00, 900.00]
+        })
+        portfolio, summary = optimizeFinancialYear(transactions, 2023)
+        taxTransactions = portfolio.taxableTransactions
+        later = taxTransactions[taxTransactions['Date'] == toDay(dt.date(2023, 9, 1))]
+        assert summary['NetGain'] == -200.00, "optimizeFinancialYear() failed test: later sales were counted in the optimized year"
+        assert len(later) and later['Quantity'].sum() == 3 and (later['TransactionType'] == TransactionType.FIFO_Sale).all(), "optimizeFinancialYear() failed test: sale after the year is missing from CGT events"
+        assert portfolio.consolidatePortfolio()['Quantity'].sum() == 4, "optimizeFinancialYear() failed test: sale after the year is missing from holdings"
+
+    def test_optimizeFinancialYearScale(self):
+        """
+        Optimizes a year of sales drawing on thousands of parcels and confirms
+        the net gain is no higher than as entered with every unit accounted for
+        """
+        rng = random.Random(0)
+        purchaseDates = [dt.date(2019, 1, 1) + dt.timedelta(days = rng.randrange(1600)) for i in range(2000)]
+        saleDates = [dt.date(2023, 7, 1) + dt.timedelta(days = rng.randrange(365)) for i in range(200)]
+        quantities = [rng.randint(10, 100) for i in range(2000)] + [rng.randint(1, 20) for i in range(200)]
+        transactions = self.readHistory({
+            'Date': [date.strftime('%d/%m/%Y') for date in purchaseDates + saleDates],
+            'AssetID': [f'T{i % 10}' for i in range(2200)],
+            'TransactionType': ['Buy'] * 2000 + ['Sale'] * 200,
+            'Quantity': [float(quantity) for quantity in quantities],
+            'Value': [round(quantity * rng.uniform(1, 50), 2) for quantity in quantities]
+        })
+        portfolio, summary = optimizeFinancialYear(transactions, 2024)
+        assert summary['Parcels'] == 2000 and summary['Sales'] == 200, "optimizeFinancialYear() failed test: problem size does not match expected values"
+        assert summary['NetGain'] <= summary['AsEnteredNetGain'], "optimizeFinancialYear() failed test: optimized net gain is above the net gain as entered"
+        assert portfolio.consolidatePortfolio()['Quantity'].sum() == sum(quantities[:2000]) - sum(quantities[2000:]), "optimizeFinancialYear() failed test: units held do not match expected value"
+        assert summary['Seconds'] < 30, "optimizeFinancialYear() failed test: optimization took too long"
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -25,36 +25,28 @@ from PySide6.QtWidgets import (
     QStyledItemDelegate
 )
 from PySide6.QtGui import QStandardItemModel, QStandardItem, QIcon
-from PySide6.QtCore import Qt, QDate, QTimer
-from pandasCGcalc import TransactionHistory, Portfolio
+from PySide6.QtCore import Qt, QDate, QTimer, QAbstractTableModel, QAbstractProxyModel, QModelIndex, Signal
+from pandasCGcalc import TransactionHistory, Portfolio, AssetType, taxableColumns, toDay
+import multiprocessing
 import sys
+import numpy as np
 import pandas as pd
 import datetime as dt
 import os
-import openpyxl as px
-from openpyxl.utils import get_column_letter
-from openpyxl.styles import Alignment
 
-sys.argv += ['-platform', 'windows:darkmode=2']
 expiredate = dt.date(2023, 12, 31)
 
-class TransactionModel(QStandardItemModel):
-    def data(self, index, role=Qt.DisplayRole): # type: ignore
-        value = super().data(index, role)
-        if index.column() in [4, 5, 8]:
-            if role == Qt.DisplayRole: # type: ignore
-                return '{:,.2f}'.format(float(value))
-            elif role == Qt.TextAlignmentRole: # type: ignore
-                return Qt.AlignRight | Qt.AlignCenter # type: ignore
-        return value
-
-    def flags(self, index):
-        # This method is called with an index as an argument
-        if index.column() in [8, 9]:  # I assume these are the columns you want to be read-only
-            # You can use bitwise OR (|) to combine other flags as needed.
-            return Qt.ItemIsEnabled | Qt.ItemIsSelectable # type: ignore
-        else:
-            return super().flags(index)  # For other columns, return the default flags
+def displayValue(value) -> str:
+    # Engine dates are datetime64, shown as YYYY-MM-DD to match the date editor
+    if isinstance(value, pd.Timestamp):
+        return value.strftime('%Y-%m-%d')
+    if value is pd.NaT:
+        return ''
+    if isinstance(value, np.datetime64):
+        return '' if np.isnat(value) else str(value.astype('datetime64[D]'))
+    if isinstance(value, float) and value != value:
+        return '' # Unpriced holdings
+    return str(value)
 
 class CustomTableModel(QStandardItemModel):
     def data(self, index, role=Qt.DisplayRole): # type: ignore
@@ -62,8 +54,8 @@ class CustomTableModel(QStandardItemModel):
 
         column_title = self.headerData(index.column(), Qt.Horizontal) # type: ignore Get the column title
 
-        if column_title in ["Quantity", "Proceeds", "CostBase", "GrossValue", 'Value']: # Replace with your actual column titles
-            if role == Qt.DisplayRole and value is not None: # type: ignore
+        if column_title in ["Quantity", "Proceeds", "CostBase", "GrossValue", 'Value', 'Price', 'MarketValue', 'UnrealizedGain', 'DiscountedGain']: # Replace with your actual column titles
+            if role == Qt.DisplayRole and value is not None and value != '': # type: ignore
                 return '{:,.2f}'.format(float(value))
             elif role == Qt.TextAlignmentRole: # type: ignore
                 return Qt.AlignRight | Qt.AlignCenter # type: ignore
@@ -76,9 +68,10 @@ class TotalsModel(QStandardItemModel):
     def __init__(self, source_model):
         super().__init__(1, source_model.columnCount())
         self.source_model = source_model
-        self.columns_to_sum = self.columns_to_sum = ['Value', 'Proceeds', 'CostBase', 'Quantity', 'GrossValue']
+        self.columns_to_sum = self.columns_to_sum = ['Value', 'Proceeds', 'CostBase', 'Quantity', 'GrossValue', 'MarketValue', 'UnrealizedGain', 'DiscountedGain']
         self.source_model.rowsInserted.connect(self.update_totals)
         self.source_model.dataChanged.connect(self.update_totals)
+        self.source_model.modelReset.connect(self.update_totals)
         self.update_totals()
     
     def data(self, index, role=Qt.DisplayRole):  # type: ignore
@@ -91,11 +84,15 @@ class TotalsModel(QStandardItemModel):
     def update_totals(self):
         self.setRowCount(1)
         self.setColumnCount(self.source_model.columnCount())
+        # Paged models total every row they filter in from the column arrays, not just the rows fetched into the view
+        column_totals = self.source_model.columnTotals() if isinstance(self.source_model, RowIndexProxyModel) else None
         for column in range(self.columnCount()):
             self.setItem(0, column, QStandardItem(''))
             column_title = self.source_model.headerData(column, Qt.Horizontal)  # type: ignore # Get the column title
             self.setHeaderData(column, Qt.Horizontal, column_title)  # type: ignore # Set the column header
-            if column_title in self.columns_to_sum: 
+            if column_title in self.columns_to_sum and column_totals is not None:
+                self.setItem(0, column, QStandardItem(f'{float(column_totals.get(column_title, 0)):,.2f}'))
+            elif column_title in self.columns_to_sum: 
                 total = 0
                 for row in range(self.source_model.rowCount()):
                     index = self.source_model.index(row, column)
@@ -108,6 +105,268 @@ class TotalsModel(QStandardItemModel):
                             continue
                 self.setItem(0, column, QStandardItem(f'{float(total):,.2f}'))
 
+class FrameTableModel(QAbstractTableModel):
+    # Read-only table over a DataFrame's column arrays, cells are formatted only when a view asks for them so no items are built
+    # Sort orders are taken per column the first time they are needed and kept until the frame changes
+    numberColumns = ['Quantity', 'Proceeds', 'CostBase', 'GrossValue', 'Value', 'Price', 'MarketValue', 'UnrealizedGain', 'DiscountedGain']
+
+    def __init__(self, frame: pd.DataFrame, parent=None):
+        super().__init__(parent)
+        self.setFrame(frame)
+
+    def setFrame(self, frame: pd.DataFrame):
+        self.beginResetModel()
+        self.frame = frame
+        self.columns = frame.columns.tolist()
+        self.arrays = [frame[column].to_numpy() for column in self.columns]
+        self.orders = {}
+        self.endResetModel()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.frame)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.columns)
+
+    def text(self, row: int, column: int) -> str:
+        return displayValue(self.arrays[column][row])
+
+    def data(self, index, role=Qt.DisplayRole): # type: ignore
+        if not index.isValid():
+            return None
+        isNumber = self.columns[index.column()] in self.numberColumns
+        if role == Qt.DisplayRole: # type: ignore
+            value = self.arrays[index.column()][index.row()]
+            if isNumber and isinstance(value, (float, int, np.number)):
+                return '' if value != value else '{:,.2f}'.format(float(value))
+            return displayValue(value)
+        elif role == Qt.EditRole: # type: ignore
+            return self.text(index.row(), index.column())
+        elif role == Qt.TextAlignmentRole and (isNumber or self.columns[index.column()] == 'Discountable'): # type: ignore
+            return Qt.AlignRight | Qt.AlignCenter # type: ignore
+        return None
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole): # type: ignore
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal and 0 <= section < len(self.columns): # type: ignore
+            return self.columns[section]
+        if role == Qt.DisplayRole and orientation == Qt.Vertical: # type: ignore
+            return str(section + 1)
+        return None
+
+    def sortOrder(self, column: int) -> np.ndarray:
+        # Rows in order of the column's values, categoricals by category order and mixed columns by their text
+        if column not in self.orders:
+            values = pd.Series(self.arrays[column])
+            if isinstance(self.frame.iloc[:, column].dtype, pd.CategoricalDtype) and len(self.arrays[column]) == len(self.frame):
+                keys = self.frame.iloc[:, column].cat.codes.to_numpy()
+            elif pd.api.types.is_numeric_dtype(values) or pd.api.types.is_datetime64_any_dtype(values):
+                keys = values.to_numpy()
+            else:
+                keys = values.astype(str).to_numpy()
+            self.orders[column] = np.argsort(keys, kind='stable')
+        return self.orders[column]
+
+    def rank(self, column: int) -> np.ndarray:
+        order = self.sortOrder(column)
+        rank = np.empty(len(order), dtype=np.int64)
+        rank[order] = np.arange(len(order))
+        return rank
+
+    def rowsBetween(self, columnName: str, low, high) -> np.ndarray:
+        # Rows with low <= value <= high, in row order, found by binary search of the column's sort order
+        column = self.columns.index(columnName)
+        order = self.sortOrder(column)
+        values = self.arrays[column][order]
+        first, last = np.searchsorted(values, np.array(low, dtype=values.dtype), 'left'), np.searchsorted(values, np.array(high, dtype=values.dtype), 'right')
+        return np.sort(order[first:last])
+
+class TransactionTableModel(FrameTableModel):
+    # Editable transaction table, edits are written into copies of the decoded column arrays
+    # A numeric or date column that is given text it cannot hold keeps the text, as readData decodes it again on save
+    cellEdited = Signal(int, int, str)
+
+    def setFrame(self, frame: pd.DataFrame):
+        super().setFrame(frame)
+        self.arrays = [np.array(array, copy=True) for array in self.arrays]
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() or not self.arrays else len(self.arrays[0])
+
+    def flags(self, index):
+        return Qt.ItemIsEnabled | Qt.ItemIsSelectable | Qt.ItemIsEditable # type: ignore
+
+    def store(self, row: int, column: int, value):
+        array = self.arrays[column]
+        try:
+            if array.dtype.kind == 'f':
+                value = float(value)
+            elif array.dtype.kind == 'M':
+                value = np.datetime64(str(value)).astype(array.dtype)
+            array[row] = value
+        except (ValueError, TypeError):
+            self.arrays[column] = array.astype(object)
+            self.arrays[column][row] = value
+        self.orders.pop(column, None)
+
+    def setData(self, index, value, role=Qt.EditRole): # type: ignore
+        if not index.isValid() or role not in (Qt.EditRole, Qt.DisplayRole): # type: ignore
+            return False
+        self.store(index.row(), index.column(), value)
+        self.dataChanged.emit(index, index)
+        self.cellEdited.emit(index.row(), index.column(), self.text(index.row(), index.column()))
+        return True
+
+    def setRow(self, row: int, values: list):
+        # Fills a row without reporting it as edited
+        for column, value in enumerate(values):
+            self.store(row, column, value)
+        self.dataChanged.emit(self.index(row, 0), self.index(row, len(self.columns) - 1))
+
+    def insertRows(self, row, count, parent=QModelIndex()):
+        self.beginInsertRows(parent, row, row + count - 1)
+        blanks = {'f': 0.0, 'M': np.datetime64('NaT')}
+        self.arrays = [np.insert(array, row, [blanks.get(array.dtype.kind, '')] * count) for array in self.arrays]
+        self.orders = {}
+        self.endInsertRows()
+        return True
+
+    def removeRows(self, row, count, parent=QModelIndex()):
+        if row < 0 or row + count > self.rowCount():
+            return False
+        self.beginRemoveRows(parent, row, row + count - 1)
+        self.arrays = [np.delete(array, np.arange(row, row + count)) for array in self.arrays]
+        self.orders = {}
+        self.endRemoveRows()
+        return True
+
+    def rowValues(self, row: int) -> list:
+        return [self.text(row, column) for column in range(len(self.columns))]
+
+    def textFrame(self) -> pd.DataFrame:
+        # Table contents as readData takes them, dates as ISO text and enums by name
+        columns = {}
+        for column, array in zip(self.columns, self.arrays):
+            if array.dtype.kind == 'M':
+                columns[column] = np.datetime_as_string(array.astype('datetime64[D]'))
+            elif array.dtype.kind == 'f':
+                columns[column] = array
+            else:
+                columns[column] = pd.Series(array, dtype=object).astype(str).to_numpy()
+        return pd.DataFrame(columns, columns=self.columns)
+
+class RowIndexProxyModel(QAbstractProxyModel):
+    # Shows the source rows listed in a NumPy index array, paging them into the view as it scrolls
+    # A row filter gives the source rows to show and sorting orders them by the source model's sort order for the column, so
+    # changing either replaces the index array without touching the source
+    pageSize = 1000
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.rows = np.empty(0, dtype=np.int64)
+        self.loaded = 0
+        self.rowFilter = None
+        self.sortColumn, self.sortDirection = -1, Qt.AscendingOrder # type: ignore
+
+    def setSourceModel(self, sourceModel):
+        super().setSourceModel(sourceModel)
+        sourceModel.modelReset.connect(self.refresh)
+        sourceModel.rowsInserted.connect(self.refresh)
+        sourceModel.rowsRemoved.connect(self.refresh)
+        sourceModel.dataChanged.connect(self.sourceDataChanged)
+        self.refresh()
+
+    def setRowFilter(self, rowFilter):
+        # rowFilter is called with the source model and returns the source rows to show, None shows every row
+        self.rowFilter = rowFilter
+        self.refresh()
+
+    def sort(self, column, order=Qt.AscendingOrder): # type: ignore
+        self.sortColumn, self.sortDirection = column, order
+        self.refresh()
+
+    def refresh(self):
+        source = self.sourceModel()
+        self.beginResetModel()
+        rows = np.arange(source.rowCount()) if self.rowFilter is None else np.asarray(self.rowFilter(source), dtype=np.int64)
+        if 0 <= self.sortColumn < source.columnCount():
+            rows = rows[np.argsort(source.rank(self.sortColumn)[rows], kind='stable')]
+            if self.sortDirection == Qt.DescendingOrder: # type: ignore
+                rows = rows[::-1]
+        self.rows = rows
+        self.loaded = min(len(rows), max(self.loaded, self.pageSize))
+        self.endResetModel()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else self.loaded
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() or self.sourceModel() is None else self.sourceModel().columnCount()
+
+    def index(self, row, column, parent=QModelIndex()):
+        if parent.isValid() or not (0 <= row < self.loaded and 0 <= column < self.columnCount()):
+            return QModelIndex()
+        return self.createIndex(row, column)
+
+    def parent(self, index=None):
+        if index is None:
+            return super().parent() # QObject parent
+        return QModelIndex()
+
+    def hasChildren(self, parent=QModelIndex()):
+        return not parent.isValid()
+
+    def mapToSource(self, proxyIndex):
+        if not proxyIndex.isValid() or proxyIndex.row() >= len(self.rows):
+            return QModelIndex()
+        return self.sourceModel().index(int(self.rows[proxyIndex.row()]), proxyIndex.column())
+
+    def mapFromSource(self, sourceIndex):
+        if not sourceIndex.isValid():
+            return QModelIndex()
+        positions = np.flatnonzero(self.rows == sourceIndex.row())
+        return self.index(int(positions[0]), sourceIndex.column()) if len(positions) else QModelIndex()
+
+    def reveal(self, sourceRow: int, column: int = 0):
+        # Proxy index for a source row, fetching the pages up to it into the view
+        positions = np.flatnonzero(self.rows == sourceRow)
+        if not len(positions):
+            return QModelIndex()
+        if positions[0] >= self.loaded:
+            self.beginInsertRows(QModelIndex(), self.loaded, int(positions[0]))
+            self.loaded = int(positions[0]) + 1
+            self.endInsertRows()
+        return self.index(int(positions[0]), column)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole): # type: ignore
+        if orientation == Qt.Horizontal: # type: ignore
+            return self.sourceModel().headerData(section, orientation, role)
+        return str(section + 1) if role == Qt.DisplayRole else None # type: ignore
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and self.loaded < len(self.rows)
+
+    def fetchMore(self, parent=QModelIndex()):
+        count = min(self.pageSize, len(self.rows) - self.loaded)
+        if parent.isValid() or count <= 0:
+            return
+        self.beginInsertRows(QModelIndex(), self.loaded, self.loaded + count - 1)
+        self.loaded += count
+        self.endInsertRows()
+
+    def sourceDataChanged(self, topLeft, bottomRight, roles=None):
+        if topLeft.row() == bottomRight.row():
+            proxyIndex = self.mapFromSource(topLeft)
+            if proxyIndex.isValid():
+                self.dataChanged.emit(proxyIndex, self.index(proxyIndex.row(), bottomRight.column()))
+        elif self.loaded:
+            self.dataChanged.emit(self.index(0, topLeft.column()), self.index(self.loaded - 1, bottomRight.column()))
+
+    def columnTotals(self) -> dict:
+        # Sums of the number columns over every row shown, fetched or not
+        source = self.sourceModel()
+        return {column: np.nansum(np.asarray(array[self.rows], dtype=float)) for column, array in zip(source.columns, source.arrays)
+                if column in source.numberColumns and array.dtype.kind in 'fiu'}
+
 class DeselectingLineEdit(QLineEdit):
     def __init__(self, parent=None):
         super().__init__(parent)
@@ -252,20 +511,23 @@ class CustomDateEdit(QDateEdit):
         self.calendar_widget.show()
 
 class MainWindow(QMainWindow):
+    liveResult = Signal(int, object) # Live recalculation results, queued from the background thread to the window's
+    exportFinished = Signal(object) # Multi-year export futures once done, queued from the export thread to the window's
+    
     def __init__(self):
         super().__init__()
         
         self.transactionHistory = TransactionHistory()
         self.transactions = self.transactionHistory.transactions
-        self.transactionHistoryModel = TransactionModel()
-        self.transactionHistoryModel.setHorizontalHeaderLabels(self.transactions.columns.tolist())
+        # Feature modules are imported by the actions that use them, so they do not slow the first window
+        self.openWorkspace = None
+        self.openResultCache = None
+        self.openLiveRecalculation = None
+        self.journal = None # Edit journal for the imported CSV, edits to the transaction table are appended to it as they are made
+        self.transactionHistoryModel = TransactionTableModel(self.transactions)
+        self.transactionRows = RowIndexProxyModel() # Pages the table into the view as it scrolls
+        self.transactionRows.setSourceModel(self.transactionHistoryModel)
         self.addRow()       
-        
-        self.taxDisplay = CustomTableModel()
-        self.taxDisplay.setHorizontalHeaderLabels(['Date', 'AssetID', 'AssetType', 'TransactionType', 'Quantity', 'AcquisitionDate', 'Proceeds', 'CostBase', 'GrossValue', 'Discountable'])
-
-        self.portfolioDisplay = CustomTableModel()
-        self.portfolioDisplay.setHorizontalHeaderLabels(['AssetIdentifier', 'AssetType', 'OptionID', 'PurchaseDate', 'Quantity', 'Value', 'Discountable'])
 
         self.setWindowTitle("Capital Gains Calculator")
         self.setGeometry(100, 100, 1600, 1000)
@@ -282,10 +544,9 @@ class MainWindow(QMainWindow):
 
         # Create a table view for first tab
         self.transactionHistoryView = TransactionHistoryTable(self)
-        self.transactionHistoryView.setModel(self.transactionHistoryModel)
+        self.transactionHistoryView.setModel(self.transactionRows)
         self.transactionHistoryView.setHorizontalScrollBarPolicy(Qt.ScrollBarAlwaysOff)  # type: ignore
         self.transactionHistoryView.setVerticalScrollBarPolicy(Qt.ScrollBarAsNeeded)  # type: ignore
-        self.transactionHistoryView.setModel(self.transactionHistoryModel)
         self.transactionHistoryView.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch) # type: ignore
         
         #Defining field edit items
@@ -335,7 +596,8 @@ class MainWindow(QMainWindow):
         self.saveChangesButton.setEnabled(False)
         self.saveChangesButton.clicked.connect(self.saveChanges)
         transactionHistoryControlsLayout.addWidget(self.saveChangesButton, 2, 0, 1, 10)
-        self.transactionHistoryModel.itemChanged.connect(self.enableSaveButton)
+        self.transactionHistoryModel.cellEdited.connect(self.enableSaveButton)
+        self.transactionHistoryModel.cellEdited.connect(self.journalEdit)
         
         # Add a button for saving changes within app
         saveChangesToFileButton = QPushButton("Save Changes To File")
@@ -352,13 +614,73 @@ class MainWindow(QMainWindow):
         removeRowButton.clicked.connect(self.removeRow)
         transactionHistoryControlsLayout.addWidget(removeRowButton, 5, 0, 1, 10)
         
+        # Memory diagnostics mode, traces import, decode, replay, consolidation and export while checked
+        self.memoryProfile = None
+        memoryDiagnosticsLabel = QLabel('Memory diagnostics mode')
+        self.memoryDiagnosticsCheckbox = QCheckBox()
+        self.memoryDiagnosticsCheckbox.toggled.connect(self.toggleMemoryDiagnostics)
+        transactionHistoryControlsLayout.addWidget(memoryDiagnosticsLabel, 6, 0, 1, 9)
+        transactionHistoryControlsLayout.addWidget(self.memoryDiagnosticsCheckbox, 6, 9, 1, 1, Qt.AlignRight) # type: ignore
+        self.memoryReportButton = QPushButton("Show Memory Report")
+        self.memoryReportButton.setEnabled(False)
+        self.memoryReportButton.clicked.connect(self.showMemoryReport)
+        transactionHistoryControlsLayout.addWidget(self.memoryReportButton, 7, 0, 1, 10)
+        
+        # Clients kept open in the workspace, switching back to one reuses its decoded transactions and calculated results
+        openClientsLabel = QLabel("Open clients:")
+        self.openClientSelector = QComboBox()
+        self.openClientSelector.activated.connect(self.switchClient)
+        transactionHistoryControlsLayout.addWidget(openClientsLabel, 8, 0, 1, 1)
+        transactionHistoryControlsLayout.addWidget(self.openClientSelector, 8, 1, 1, 9)
+        workspaceLimitLabel = QLabel("Workspace memory (MB):")
+        self.workspaceLimitField = QLineEdit()
+        self.workspaceLimitField.setPlaceholderText("Default") # Filled in once a client is opened
+        self.workspaceLimitField.editingFinished.connect(self.updateWorkspaceLimit)
+        transactionHistoryControlsLayout.addWidget(workspaceLimitLabel, 9, 0, 1, 1)
+        transactionHistoryControlsLayout.addWidget(self.workspaceLimitField, 9, 1, 1, 9)
+        
+        # Watch mode, rows appended to the file are read and replayed onto the calculated portfolio as they arrive
+        self.watcher = None
+        self.watchTimer = QTimer(self)
+        self.watchTimer.setInterval(500)
+        self.watchTimer.timeout.connect(self.pollWatcher)
+        watchFileLabel = QLabel('Watch file for new transactions')
+        self.watchFileCheckbox = QCheckBox()
+        self.watchFileCheckbox.toggled.connect(self.toggleWatchFile)
+        transactionHistoryControlsLayout.addWidget(watchFileLabel, 10, 0, 1, 9)
+        transactionHistoryControlsLayout.addWidget(self.watchFileCheckbox, 10, 9, 1, 1, Qt.AlignRight) # type: ignore
+
+        # Calculated results are cached on disk by transactions, unchanged transactions are not replayed again
+        clearResultCacheButton = QPushButton("Clear Result Cache")
+        clearResultCacheButton.clicked.connect(self.clearResultCache)
+        transactionHistoryControlsLayout.addWidget(clearResultCacheButton, 11, 0, 1, 10)
+        
+        # Live mode, edits are saved and recalculated in the background once typing pauses, from the checkpoint before the edit
+        self.liveResult.connect(self.showLiveResult)
+        self.liveTimer = QTimer(self)
+        self.liveTimer.setSingleShot(True)
+        self.liveTimer.setInterval(400)
+        self.liveTimer.timeout.connect(self.recalculateLive)
+        liveRecalculationLabel = QLabel('Recalculate live after edits')
+        self.liveRecalculationCheckbox = QCheckBox()
+        self.liveRecalculationCheckbox.toggled.connect(self.toggleLiveRecalculation)
+        transactionHistoryControlsLayout.addWidget(liveRecalculationLabel, 12, 0, 1, 9)
+        transactionHistoryControlsLayout.addWidget(self.liveRecalculationCheckbox, 12, 9, 1, 1, Qt.AlignRight) # type: ignore
+        self.liveStatusLabel = QLabel()
+        self.liveStatusLabel.setWordWrap(True)
+        transactionHistoryControlsLayout.addWidget(self.liveStatusLabel, 13, 0, 1, 10)
+        self.transactionHistoryModel.cellEdited.connect(self.scheduleLiveRecalculation)
+        self.transactionHistoryModel.rowsInserted.connect(self.scheduleLiveRecalculation)
+        self.transactionHistoryModel.rowsRemoved.connect(self.scheduleLiveRecalculation)
+        
         # Add calculate button at bottom using spacer
         spacerToBottom = QSpacerItem(20, 40, QSizePolicy.Minimum, QSizePolicy.Expanding) # type: ignore
-        transactionHistoryControlsLayout.addItem(spacerToBottom, 6, 0, 1, 10)
+        transactionHistoryControlsLayout.addItem(spacerToBottom, 14, 0, 1, 10)
         self.calculate_button = QPushButton("Calculate")
         self.calculate_button.setFixedHeight(50)
         self.calculate_button.setEnabled(False)
-        transactionHistoryControlsLayout.addWidget(self.calculate_button, 7, 0, 1, 10)
+        transactionHistoryControlsLayout.addWidget(self.calculate_button, 15, 0, 1, 10)
+        self.calculate_button.clicked.connect(self.calculate)
 
         # Add the table view and the controls to the layout of the first tab
         transactionHistoryLayout.addWidget(self.transactionHistoryView)
@@ -368,15 +690,51 @@ class MainWindow(QMainWindow):
         self.tab2 = QWidget()
         self.tabsWidget.addTab(self.tab2, "CGT Events")
 
+        # Create the third tab
+        self.portfolioTab = QWidget()
+        self.tabsWidget.addTab(self.portfolioTab, "Portfolio")
+
+        # CGT Events and Portfolio tabs are only built when first opened or calculated
+        self.cgtEventsTabBuilt = False
+        self.portfolioTabBuilt = False
+        self.tabsWidget.currentChanged.connect(self.buildTab)
+
+        self.setCentralWidget(self.tabsWidget)
+        
+        if dt.date.today() > expiredate:
+            self.disableAll()
+            expireMessage = QMessageBox()
+            expireMessage.setIcon(QMessageBox.Warning) # type: ignore
+            expireMessage.setText("Software expired")
+            expireMessage.setWindowTitle("Alert")
+            expireMessage.exec()
+
+    def buildTab(self, index):
+        if self.tabsWidget.widget(index) is self.tab2:
+            self.buildCgtEventsTab()
+        elif self.tabsWidget.widget(index) is self.portfolioTab:
+            self.buildPortfolioTab()
+
+    def buildCgtEventsTab(self):
+        if self.cgtEventsTabBuilt:
+            return
+        self.cgtEventsTabBuilt = True
+        
+        # Events are shown from their column arrays, filters and sorting only change the proxy's index array
+        self.taxDisplay = FrameTableModel(pd.DataFrame(columns=taxableColumns))
+        self.taxRows = RowIndexProxyModel()
+        self.taxRows.setSourceModel(self.taxDisplay)
+
         # Create a layout for the second tab
         cgtEventsLayout = QHBoxLayout(self.tab2)
         cgtEventsLayout.setContentsMargins(0, 0, 0, 0)
 
         # Create a table view for second tab
         self.cgtEventsView = QTableView()
-        self.cgtEventsView.setModel(self.taxDisplay)
+        self.cgtEventsView.setModel(self.taxRows)
         self.cgtEventsView.setHorizontalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAlwaysOff)
-        self.cgtEventsView.setModel(self.taxDisplay)
+        self.cgtEventsView.horizontalHeader().setSortIndicator(-1, Qt.AscendingOrder) # type: ignore # Events stay in date order until a column is clicked
+        self.cgtEventsView.setSortingEnabled(True)
         self.cgtEventsView.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch) # type: ignore
         self.cgtEventsView.verticalHeader().setSectionResizeMode(QHeaderView.Fixed) # type: ignore
         self.cgtEventsView.verticalHeader().setFixedWidth(25)
@@ -385,7 +743,7 @@ class MainWindow(QMainWindow):
         
         # Create total stable
         cgtEventsTotalsView = QTableView()
-        self.cgtEventsTotalsModel = TotalsModel(self.taxDisplay)
+        self.cgtEventsTotalsModel = TotalsModel(self.taxRows)
         cgtEventsTotalsView.setModel(self.cgtEventsTotalsModel)
         cgtEventsTotalsView.setHorizontalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAlwaysOff)
         cgtEventsTotalsView.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch) # type: ignore
@@ -406,9 +764,6 @@ class MainWindow(QMainWindow):
         cgtEventsStackedTablesWidget = QWidget()
         cgtEventsStackedTablesWidget.setLayout(cgtEventsStackedTablesLayout)
         
-        # Connect calculate button to calculate function after second table has been instantiated
-        self.calculate_button.clicked.connect(self.calculate)
-        
         # Controls widet for second tab
         cgtEventsControls = QWidget()
         cgtEventsControlsLayout = QGridLayout(cgtEventsControls)
@@ -468,31 +823,69 @@ class MainWindow(QMainWindow):
         cgtEventsControlsLayout.addWidget(consolidationLevelSelectorLabel, 6, 0, 1, 1)
         cgtEventsControlsLayout.addWidget(self.consildationLevelSelector, 6, 1, 1, 9)
         
+        # Financial year range for multi-year export
+        financialYearRangeLabel = QLabel("Export financial years:")
+        self.firstFinancialYearSelector = QComboBox()
+        self.lastFinancialYearSelector = QComboBox()
+        for selector in (self.firstFinancialYearSelector, self.lastFinancialYearSelector):
+            selector.addItems([str(year) for year in range(QDate.currentDate().year(), 2010, -1)])
+        cgtEventsControlsLayout.addWidget(financialYearRangeLabel, 7, 0, 1, 1)
+        cgtEventsControlsLayout.addWidget(self.firstFinancialYearSelector, 7, 1, 1, 4)
+        cgtEventsControlsLayout.addWidget(QLabel("to"), 7, 5, 1, 1, Qt.AlignCenter) # type: ignore
+        cgtEventsControlsLayout.addWidget(self.lastFinancialYearSelector, 7, 6, 1, 4)
+
+        # Carried forward losses for the tax lot optimizer
+        carriedLossesLabel = QLabel("Carried forward losses:")
+        self.carriedLossesField = QLineEdit()
+        self.carriedLossesField.setText('0')
+        cgtEventsControlsLayout.addWidget(carriedLossesLabel, 8, 0, 1, 1)
+        cgtEventsControlsLayout.addWidget(self.carriedLossesField, 8, 1, 1, 9)
+
         # Spacer before export button
-        cgtEventsControlsLayout.addItem(spacerToBottom, 7, 0, 1, 9)
+        spacerToBottom = QSpacerItem(20, 40, QSizePolicy.Minimum, QSizePolicy.Expanding) # type: ignore
+        cgtEventsControlsLayout.addItem(spacerToBottom, 9, 0, 1, 9)
+        
+        # Tax lot optimizer button, reassigns the selected financial year's share sales
+        self.optimizeFinancialYearButton = QPushButton("Optimize Financial Year Sales")
+        self.optimizeFinancialYearButton.setFixedHeight(50)
+        cgtEventsControlsLayout.addWidget(self.optimizeFinancialYearButton, 10, 0, 1, 10)
+        self.optimizeFinancialYearButton.clicked.connect(self.optimizeFinancialYear)
+
+        # Multi-year export button
+        self.exportFinancialYearsButton = QPushButton("Export Financial Year Workpapers")
+        self.exportFinancialYearsButton.setFixedHeight(50)
+        cgtEventsControlsLayout.addWidget(self.exportFinancialYearsButton, 11, 0, 1, 10)
+        self.exportFinancialYearsButton.clicked.connect(self.exportFinancialYearWorkpapers)
         
         # Export button
         self.exportWorkpaperButton = QPushButton("Export Workpaper To Excel File")
         self.exportWorkpaperButton.setFixedHeight(50)
-        cgtEventsControlsLayout.addWidget(self.exportWorkpaperButton, 8, 0, 1, 10)
+        cgtEventsControlsLayout.addWidget(self.exportWorkpaperButton, 12, 0, 1, 10)
         self.exportWorkpaperButton.clicked.connect(self.exportWorkpaper)
         
         # Add filter button at bottom using spacer
         filterButton = QPushButton("Filter")
         filterButton.setFixedHeight(50)
-        cgtEventsControlsLayout.addWidget(filterButton, 9, 0, 1, 10)
+        cgtEventsControlsLayout.addWidget(filterButton, 13, 0, 1, 10)
         filterButton.clicked.connect(self.applyTaxFilter)
 
-        # Add the table view and the controls to the layout of the first tab
+        # Add the table view and the controls to the layout of the second tab
         cgtEventsLayout.addWidget(cgtEventsStackedTablesWidget)
         cgtEventsLayout.addWidget(cgtEventsControls)
+
+    def buildPortfolioTab(self):
+        if self.portfolioTabBuilt:
+            return
+        from saleScenarios import scenarioColumns
+        self.portfolioTabBuilt = True
         
-        # Create the third tab
-        self.portfolioTab = QWidget()
-        self.tabsWidget.addTab(self.portfolioTab, "Portfolio")
+        self.portfolioDisplay = CustomTableModel()
+        self.portfolioDisplay.setHorizontalHeaderLabels(['AssetIdentifier', 'AssetType', 'OptionID', 'PurchaseDate', 'Quantity', 'Value', 'Discountable'])
 
-        # Create vertical box for stacked tables
-        portfolioLayout = QVBoxLayout(self.portfolioTab)
+        # Create a layout for the third tab, tables on the left and what-if sale controls on the right
+        portfolioLayout = QHBoxLayout(self.portfolioTab)
+        portfolioLayout.setContentsMargins(0, 0, 0, 0)
+        portfolioStackedTablesLayout = QVBoxLayout()
 
         # Create a table view for third tab
         self.portfolioTableView = QTableView()
@@ -518,21 +911,89 @@ class MainWindow(QMainWindow):
         portfolioTotalsView.setVerticalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAlwaysOn)
         portfolioTotalsView.setEditTriggers(QAbstractItemView.NoEditTriggers) # type: ignore
         
-        # Add the table view to the layout of the third tab
-        portfolioLayout.addWidget(self.portfolioTableView)
-        portfolioLayout.addWidget(portfolioTotalsView)
-        
+        # Create what-if sale comparison table, one row per sale method
+        self.saleScenarioModel = CustomTableModel()
+        self.saleScenarioModel.setHorizontalHeaderLabels(scenarioColumns)
+        saleScenarioView = QTableView()
+        saleScenarioView.setModel(self.saleScenarioModel)
+        saleScenarioView.setHorizontalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAlwaysOff)
+        saleScenarioView.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch) # type: ignore
+        saleScenarioView.verticalHeader().setSectionResizeMode(QHeaderView.Fixed) # type: ignore
+        saleScenarioView.verticalHeader().setFixedWidth(25)
+        saleScenarioView.setFixedHeight(saleScenarioView.horizontalHeader().height() + 4 * 30)
+        saleScenarioView.setVerticalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAlwaysOn)
+        saleScenarioView.setEditTriggers(QAbstractItemView.NoEditTriggers) # type: ignore
+
+        # Add the table views to the stacked layout
+        portfolioStackedTablesLayout.addWidget(self.portfolioTableView)
+        portfolioStackedTablesLayout.addWidget(portfolioTotalsView)
+        portfolioStackedTablesLayout.addWidget(QLabel('What-if sale comparison'))
+        portfolioStackedTablesLayout.addWidget(saleScenarioView)
+        portfolioStackedTablesWidget = QWidget()
+        portfolioStackedTablesWidget.setLayout(portfolioStackedTablesLayout)
+
+        # Controls widget for third tab
+        portfolioControls = QWidget()
+        portfolioControlsLayout = QGridLayout(portfolioControls)
+        portfolioControlsLayout.setAlignment(Qt.AlignTop) # type: ignore
+        portfolioControls.setFixedWidth(400)
+
+        # Holdings as at a past date, such as the end of a prior financial year
+        portfolioControlsLayout.addWidget(QLabel('Show holdings as at date'), 0, 0, 1, 9)
+        self.holdingsDateCheckbox = QCheckBox()
+        self.holdingsDateCheckbox.toggled.connect(self.displayHoldings)
+        portfolioControlsLayout.addWidget(self.holdingsDateCheckbox, 0, 9, 1, 1, Qt.AlignRight) # type: ignore
+        self.holdingsDateField = CustomDateEdit()
+        self.holdingsDateField.setDisplayFormat("dd/MM/yyyy")
+        self.holdingsDateField.setDate(QDate(QDate.currentDate().year() - 1, 6, 30))
+        self.holdingsDateField.dateChanged.connect(self.displayHoldings)
+        portfolioControlsLayout.addWidget(QLabel('Holdings date'), 1, 0, 1, 1)
+        portfolioControlsLayout.addWidget(self.holdingsDateField, 1, 1, 1, 9)
+
+        # Market value from a local end of day price file, as at the holdings date or today
+        self.prices = None
+        self.priceFileField = QLineEdit()
+        self.priceFileField.editingFinished.connect(self.loadPrices)
+        portfolioControlsLayout.addWidget(QLabel('Price file'), 2, 0, 1, 1)
+        portfolioControlsLayout.addWidget(self.priceFileField, 2, 1, 1, 8)
+        priceFileButton = QPushButton()
+        priceFileButton.setIcon(self.style().standardIcon(QStyle.StandardPixmap.SP_DirIcon))
+        priceFileButton.clicked.connect(self.openPriceFileDialog)
+        portfolioControlsLayout.addWidget(priceFileButton, 2, 9)
+        portfolioControlsLayout.addWidget(QLabel('Show market value'), 3, 0, 1, 9)
+        self.marketValueCheckbox = QCheckBox()
+        self.marketValueCheckbox.toggled.connect(self.displayHoldings)
+        portfolioControlsLayout.addWidget(self.marketValueCheckbox, 3, 9, 1, 1, Qt.AlignRight) # type: ignore
+
+        # What-if sale inputs
+        portfolioControlsLayout.addWidget(QLabel('Compare a sale under each sale method'), 4, 0, 1, 10)
+        self.scenarioAssetSelector = QComboBox()
+        portfolioControlsLayout.addWidget(QLabel('Asset'), 5, 0, 1, 1)
+        portfolioControlsLayout.addWidget(self.scenarioAssetSelector, 5, 1, 1, 9)
+        self.scenarioQuantityField = QLineEdit()
+        portfolioControlsLayout.addWidget(QLabel('Quantity'), 6, 0, 1, 1)
+        portfolioControlsLayout.addWidget(self.scenarioQuantityField, 6, 1, 1, 9)
+        self.scenarioValueField = QLineEdit()
+        portfolioControlsLayout.addWidget(QLabel('Proceeds'), 7, 0, 1, 1)
+        portfolioControlsLayout.addWidget(self.scenarioValueField, 7, 1, 1, 9)
+        self.scenarioDateField = CustomDateEdit()
+        self.scenarioDateField.setDisplayFormat("dd/MM/yyyy")
+        self.scenarioDateField.setDate(QDate.currentDate())
+        portfolioControlsLayout.addWidget(QLabel('Sale date'), 8, 0, 1, 1)
+        portfolioControlsLayout.addWidget(self.scenarioDateField, 8, 1, 1, 9)
+
+        # Spacer before compare button
+        spacerToBottom = QSpacerItem(20, 40, QSizePolicy.Minimum, QSizePolicy.Expanding) # type: ignore
+        portfolioControlsLayout.addItem(spacerToBottom, 9, 0, 1, 9)
 
-        self.setCentralWidget(self.tabsWidget)
-        
-        if dt.date.today() > expiredate:
-            self.disableAll()
-            expireMessage = QMessageBox()
-            expireMessage.setIcon(QMessageBox.Warning) # type: ignore
-            expireMessage.setText("Software expired")
-            expireMessage.setWindowTitle("Alert")
-            expireMessage.exec()
-            
+        compareButton = QPushButton("Compare Sale Methods")
+        compareButton.setFixedHeight(50)
+        portfolioControlsLayout.addWidget(compareButton, 10, 0, 1, 10)
+        compareButton.clicked.connect(self.compareSaleMethods)
+
+        # Add the tables and the controls to the layout of the third tab
+        portfolioLayout.addWidget(portfolioStackedTablesWidget)
+        portfolioLayout.addWidget(portfolioControls)
 
     def openFileDialog(self):
         file_dialog = QFileDialog(self)
@@ -542,33 +1003,102 @@ class MainWindow(QMainWindow):
             self.filePathField.setText(file_path)
 
     def importTransactions(self):
-        self.transactionHistoryModel.setRowCount(0)
+        from memoryDiagnostics import memoryStage
+        from transactionStore import TransactionStore, isStoreFile
+        from editJournal import EditJournal
+        self.journal = None # Filling the table is not an edit
+        self.transactionHistoryModel.setFrame(self.transactionHistoryModel.frame.iloc[:0])
         self.transactionFilePath = self.filePathField.text()
         if not self.transactionFilePath:
             return
         self.transactionsFileName = os.path.basename(self.transactionFilePath)
+        journal = EditJournal(self.transactionFilePath) if not isStoreFile(self.transactionFilePath) else None
+        includeUnsaved = journal is not None and self.recoverUnsavedEdits(journal)
         
-        self.transactions = pd.read_csv(self.transactionFilePath)
-
-        self.transactionHistory.readData(self.transactions)
-        self.transactions = self.transactionHistory.transactions
-        for i in self.transactions.index:
-            for j in self.transactions.columns:
-                item = QStandardItem(str(self.transactions.at[i, j]))
-                self.transactionHistoryModel.setItem(i, self.transactions.columns.get_loc(j), item)
-
-        self.transactionHistoryView.setModel(self.transactionHistoryModel)
+        # Clients already open in the workspace are not read again, unless memory diagnostics is tracing the import
+        # They are looked up before the journal marks the table opened again, which changes the journal but not the transactions
+        client = self.workspace.get(self.transactionFilePath) if self.memoryProfile is None else None
+        if journal is not None:
+            journal.open()
+            self.workspace.refreshSignature(self.transactionFilePath)
+        if client is None and isStoreFile(self.transactionFilePath):
+            # SQLite stores hold decoded transactions, so there is no separate decode stage
+            with memoryStage(self.memoryProfile, 'import') as frames:
+                with TransactionStore(self.transactionFilePath) as store:
+                    self.transactionHistory.transactions = store.read()
+                frames['transactions'] = self.transactionHistory.transactions
+            client = self.workspace.add(self.transactionFilePath, self.transactionHistory.transactions)
+        elif client is None:
+            with memoryStage(self.memoryProfile, 'import') as frames:
+                if journal.isCurrent():
+                    self.transactions = journal.load(includeUnsaved)
+                else:
+                    self.transactions = pd.read_csv(self.transactionFilePath)
+                frames['raw'] = self.transactions
+
+            with memoryStage(self.memoryProfile, 'decode') as frames:
+                self.transactionHistory.readData(self.transactions)
+                frames['transactions'] = self.transactionHistory.transactions
+            client = self.workspace.add(self.transactionFilePath, self.transactionHistory.transactions)
+        self.transactionHistory.transactions = client.transactions
+        self.transactions = client.transactions
+        self.fillTransactionTable()
+        if client.portfolio is not None:
+            self.buildCgtEventsTab()
+            self.buildPortfolioTab()
+            self.portfolio, self.taxTransactions, self.assets = client.portfolio, client.taxTransactions, client.assets
+            self.displayPortfolio()
+        self.refreshOpenClients()
+        self.journal = journal
+
+    def fillTransactionTable(self):
+        if self.openLiveRecalculation is not None:
+            self.openLiveRecalculation.cancel() # A run still going is for the table being replaced
+        self.transactionHistoryModel.setFrame(self.transactions)
+
+    def recoverUnsavedEdits(self, journal: 'EditJournal') -> bool: # type: ignore
+        # Edits after the journal's last save were left by a crash or by closing without saving
+        saved, unsaved = journal.read()
+        edits = len([operation for operation in unsaved if operation['op'] != 'sort'])
+        if not edits:
+            return True
+        recoverMessage = QMessageBox()
+        recoverMessage.setIcon(QMessageBox.Question) # type: ignore
+        recoverMessage.setWindowTitle("Recover Edits")
+        recoverMessage.setText(f"{edits} unsaved edits to {os.path.basename(journal.path)} were found, restore them?")
+        recoverMessage.setStandardButtons(QMessageBox.Yes | QMessageBox.No) # type: ignore
+        if recoverMessage.exec() == QMessageBox.Yes: # type: ignore
+            return True
+        journal.discardUnsaved()
+        return False
+
+    def journalEdit(self, row: int, column: int, text: str):
+        if self.journal is not None:
+            self.journal.update(row, column, text)
+
+    def refreshOpenClients(self):
+        self.openClientSelector.clear()
+        self.openClientSelector.addItems(self.workspace.paths())
+
+    def switchClient(self, index):
+        self.filePathField.setText(self.openClientSelector.itemText(index))
+        self.importTransactions()
+
+    def updateWorkspaceLimit(self):
+        try:
+            self.workspace.byteLimit = int(float(self.workspaceLimitField.text().replace(',', '')) * 2**20)
+        except ValueError:
+            self.workspaceLimitField.setText(str(self.workspace.byteLimit // 2**20))
+            return
+        self.workspace.evict()
     
     def saveChanges(self):
-        df = pd.DataFrame()
-        for i in range(self.transactionHistoryModel.rowCount()):
-            for j in range(self.transactionHistoryModel.columnCount()):
-                index = self.transactionHistoryModel.index(i, j)
-                df.at[i, j] = self.transactionHistoryModel.data(index)
-        df.columns = self.transactions.columns.tolist()
+        df = self.transactionHistoryModel.textFrame()
         
         self.transactionHistory.readData(df)
         self.transactions = self.transactionHistory.transactions
+        if getattr(self, 'transactionFilePath', None):
+            self.workspace.update(self.transactionFilePath, self.transactions)
         self.saveChangesButton.setDisabled(True)
         self.calculate_button.setEnabled(True)
         
@@ -577,17 +1107,24 @@ class MainWindow(QMainWindow):
         self.calculate_button.setDisabled(True)
     
     def saveChangesToFile(self):
-        df = pd.DataFrame()
-        for i in range(self.transactionHistoryModel.rowCount()):
-            for j in range(self.transactionHistoryModel.columnCount()):
-                index = self.transactionHistoryModel.index(i, j)
-                df.at[i, j] = self.transactionHistoryModel.data(index)
+        from transactionStore import TransactionStore, isStoreFile
+        options = QFileDialog.Options() # type: ignore
+        fileName, _ = QFileDialog.getSaveFileName(self,"Save As...", getattr(self, 'transactionFilePath', ""),"CSV Files (*.csv);;SQLite Stores (*.sqlite *.db);;All Files (*)", options = options)
+        if not fileName:
+            return
+        if self.journal is not None and os.path.abspath(fileName) == os.path.abspath(self.journal.path):
+            # Saving over the imported CSV only commits the journalled edits, compaction folds them into the file once the journal grows
+            self.journal.commit()
+            return
 
-        df.columns = self.transactions.columns.tolist()
+        df = self.transactionHistoryModel.textFrame()
         
-        options = QFileDialog.Options() # type: ignore
-        fileName, _ = QFileDialog.getSaveFileName(self,"Save As...", "","CSV Files (*.csv);;All Files (*)", options = options)
-        if fileName:
+        if isStoreFile(fileName):
+            transactionHistory = TransactionHistory()
+            transactionHistory.readData(df)
+            with TransactionStore(fileName) as store:
+                store.replace(transactionHistory.transactions)
+        else:
             if '.csv' not in fileName:
                 fileName += '.csv'
             df.to_csv(fileName, index=False)
@@ -596,23 +1133,20 @@ class MainWindow(QMainWindow):
         #0: Date, 1: AssetType, 2: AssetID, 3: TransactionType, 4: Quantity, 5: Value, 6: OptionID, 7: OptionSplitID, 8: GrossGain, 9: Discountable
         row_count = self.transactionHistoryModel.rowCount()
         self.transactionHistoryModel.insertRow(row_count)
-        self.transactionHistoryModel.setItem(row_count, 0, QStandardItem(dt.date.today().isoformat()))
-        self.transactionHistoryModel.setItem(row_count, 1, QStandardItem('Share'))
-        self.transactionHistoryModel.setItem(row_count, 3, QStandardItem('Purchase'))
-        self.transactionHistoryModel.setItem(row_count, 4, QStandardItem('0.00'))
-        self.transactionHistoryModel.setItem(row_count, 5, QStandardItem('0.00'))
+        self.transactionHistoryModel.setRow(row_count, [dt.date.today().isoformat(), 'Share', '', 'Purchase', '0.00', '0.00', '', '']) # Journalled as one insert
+        if self.journal is not None:
+            self.journal.insert(row_count, self.transactionHistoryModel.rowValues(row_count))
 
-    def removeRow(self):
-        # Get current selection
-        current_selection = self.transactionHistoryView.currentIndex()
+    def currentTransactionRow(self) -> int:
+        # Row of the transaction table the cursor is on, -1 if none
+        return self.transactionRows.mapToSource(self.transactionHistoryView.currentIndex()).row()
 
+    def removeRow(self):
         # Check if a row is selected
-        if current_selection.row() >= 0:
-            # Remove the row
-            self.transactionHistoryModel.removeRow(current_selection.row())
-        else:
-            self.transactionHistoryModel.removeRow(self.transactionHistoryModel.rowCount() - 1)
-        self.transactionHistoryView.selectRow(self.transactionHistoryModel.rowCount() - 1)
+        row = self.currentTransactionRow() if self.currentTransactionRow() >= 0 else self.transactionHistoryModel.rowCount() - 1
+        if row >= 0 and self.transactionHistoryModel.removeRow(row) and self.journal is not None:
+            self.journal.delete(row)
+        self.transactionHistoryView.selectRow(self.transactionRows.reveal(self.transactionHistoryModel.rowCount() - 1).row())
 
     def appendRow(self):
         # End editing the current item
@@ -620,16 +1154,16 @@ class MainWindow(QMainWindow):
         # Append an empty row
         self.addRow()
         # Start editing the new item
-        self.transactionHistoryView.edit(self.transactionHistoryModel.index(self.transactionHistoryModel.rowCount() - 1, 0))
+        self.transactionHistoryView.edit(self.transactionRows.reveal(self.transactionHistoryModel.rowCount() - 1))
 
     def keyPressEvent(self, event):
-        if (event.key() == Qt.Key.Key_Return or event.key() == Qt.Key.Key_Enter) and self.transactionHistoryView.currentIndex().row() == self.transactionHistoryModel.rowCount() - 1:
+        if (event.key() == Qt.Key.Key_Return or event.key() == Qt.Key.Key_Enter) and self.currentTransactionRow() == self.transactionHistoryModel.rowCount() - 1:
             self.appendRow()
-            self.transactionHistoryView.setCurrentIndex(self.transactionHistoryModel.index(self.transactionHistoryModel.rowCount() - 1, 0))
+            self.transactionHistoryView.setCurrentIndex(self.transactionRows.reveal(self.transactionHistoryModel.rowCount() - 1))
 
-        elif event.key() == Qt.Key.Key_Tab and self.transactionHistoryView.currentIndex().row() == self.transactionHistoryModel.rowCount() - 1 and self.transactionHistoryView.currentIndex().column() == self.transactionHistoryModel.columnCount() - 1:
+        elif event.key() == Qt.Key.Key_Tab and self.currentTransactionRow() == self.transactionHistoryModel.rowCount() - 1 and self.transactionHistoryView.currentIndex().column() == self.transactionHistoryModel.columnCount() - 1:
             self.appendRow()
-            self.transactionHistoryView.setCurrentIndex(self.transactionHistoryModel.index(self.transactionHistoryModel.rowCount() - 1, 0))
+            self.transactionHistoryView.setCurrentIndex(self.transactionRows.reveal(self.transactionHistoryModel.rowCount() - 1))
         
         elif event.key() == Qt.Key.Key_Delete:
             self.removeRow()
@@ -641,35 +1175,218 @@ class MainWindow(QMainWindow):
             self.importTransactionsButton.setEnabled(False)
     
     def calculate(self):
-        self.portfolio = Portfolio() # Instantiate portfolio object
-        self.portfolio.readTransactions(self.transactions) # Read transactions into portfolio based on transaction history
-        self.taxTransactions = self.portfolio.taxableTransactions
-        self.taxDisplay.setRowCount(0)
-        for i in self.taxTransactions.index:
-            for j in self.taxTransactions.columns:
-                item = QStandardItem(str(self.taxTransactions.at[i, j]))
-                self.taxDisplay.setItem(i, self.taxTransactions.columns.get_loc(j), item)
+        from memoryDiagnostics import memoryStage
+        from transactionValidation import checkTransactions
+        from resultCache import transactionsKey
+        self.buildCgtEventsTab()
+        self.buildPortfolioTab()
+        try:
+            checkTransactions(self.transactions) # Problems are found before the replay rather than part way through it
+        except Exception as error:
+            validationMessage = QMessageBox()
+            validationMessage.setIcon(QMessageBox.Warning) # type: ignore
+            validationMessage.setWindowTitle("Transaction Check")
+            validationMessage.setText(str(error))
+            validationMessage.exec()
+            return
+        # Results already calculated for the same transactions are not calculated again, unless memory diagnostics is tracing the replay
+        resultKey = transactionsKey(self.transactions)
+        cached = self.resultCache.get(resultKey) if self.memoryProfile is None else None
+        if cached is not None:
+            self.portfolio, self.taxTransactions, self.assets = cached
+        else:
+            with memoryStage(self.memoryProfile, 'replay') as frames:
+                self.portfolio = Portfolio() # Instantiate portfolio object
+                self.portfolio.readTransactions(self.transactions) # Read transactions into portfolio based on transaction history
+                self.taxTransactions = self.portfolio.taxableTransactions
+                frames['holdings'] = self.portfolio.parcelTable()
+                frames['taxableTransactions'] = self.taxTransactions
+            with memoryStage(self.memoryProfile, 'consolidation') as frames:
+                self.assets = self.portfolio.consolidatePortfolio()
+                frames['consolidatedPortfolio'] = self.assets
+            self.resultCache.put(resultKey, self.portfolio, self.taxTransactions, self.assets)
+        if getattr(self, 'transactionFilePath', None):
+            self.workspace.store(self.transactionFilePath, self.portfolio, self.taxTransactions, self.assets)
+        self.displayPortfolio()
+        self.tabsWidget.setCurrentIndex(1) # Sets CGT event display as current tab view
 
-        self.cgtEventsView.setModel(self.taxDisplay) # Updates CGT event display
+    def toggleLiveRecalculation(self, checked):
+        if checked:
+            self.scheduleLiveRecalculation()
+        else:
+            self.liveTimer.stop()
+            self.liveRecalculation.reset()
+            self.liveStatusLabel.clear()
+
+    def scheduleLiveRecalculation(self):
+        # Restarting the timer on every edit coalesces a burst of typing into one run
+        if self.liveRecalculationCheckbox.isChecked():
+            self.liveTimer.start()
+
+    def recalculateLive(self):
+        # The table is copied here, the background run decodes, checks and replays it and supersedes any run still going
+        self.liveRecalculation.submit(self.transactionHistoryModel.textFrame())
+        self.liveStatusLabel.setText('Recalculating...')
+
+    def showLiveResult(self, generation: int, result):
+        if not self.liveRecalculation.current(generation) or not self.liveRecalculationCheckbox.isChecked():
+            return # An edit was made while the result was queued
+        if isinstance(result, Exception):
+            self.liveStatusLabel.setText(str(result))
+            return
+        self.buildCgtEventsTab()
+        self.buildPortfolioTab()
+        self.transactionHistory, self.portfolio, self.taxTransactions, self.assets, start = result
+        self.transactions = self.transactionHistory.transactions
+        if getattr(self, 'transactionFilePath', None):
+            self.workspace.update(self.transactionFilePath, self.transactions)
+            self.workspace.store(self.transactionFilePath, self.portfolio, self.taxTransactions, self.assets)
+        self.saveChangesButton.setDisabled(True)
+        self.displayPortfolio()
+        self.liveStatusLabel.setText(f'Recalculated {len(self.transactions) - start} of {len(self.transactions)} transactions')
+
+    def closeEvent(self, event):
+        if self.openLiveRecalculation is not None:
+            self.openLiveRecalculation.cancel() # So the app does not wait for a run to finish before exiting
+        super().closeEvent(event)
+
+    def clearResultCache(self):
+        cacheMessage = QMessageBox()
+        cacheMessage.setWindowTitle("Result Cache")
+        cacheMessage.setText(f"{self.resultCache.clear()} cached results removed")
+        cacheMessage.exec()
+
+    def toggleWatchFile(self, checked):
+        from transactionStore import isStoreFile
+        from transactionWatcher import TransactionWatcher
+        self.watchTimer.stop()
+        self.watcher = None
+        if checked and self.filePathField.text() and not isStoreFile(self.filePathField.text()):
+            self.transactionFilePath = self.filePathField.text()
+            self.watcher = TransactionWatcher(self.transactionFilePath)
+            self.watcher.start()
+            self.showWatchedTransactions()
+            self.watchTimer.start()
+
+    def pollWatcher(self):
+        if self.watcher is not None and self.watcher.poll():
+            self.showWatchedTransactions()
+
+    def showWatchedTransactions(self):
+        self.buildCgtEventsTab()
+        self.buildPortfolioTab()
+        self.transactionHistory = self.watcher.transactionHistory # type: ignore
+        self.transactions = self.watcher.transactions # type: ignore
+        journal, self.journal = self.journal, None # Rows read from the file are not edits
+        self.fillTransactionTable()
+        self.journal = journal
+        self.portfolio = self.watcher.portfolio # type: ignore
+        self.taxTransactions = self.portfolio.taxableTransactions
+        self.assets = self.portfolio.consolidatePortfolio()
+        self.workspace.add(self.transactionFilePath, self.transactions)
+        self.workspace.store(self.transactionFilePath, self.portfolio, self.taxTransactions, self.assets)
+        self.refreshOpenClients()
+        self.displayPortfolio()
+
+    def displayPortfolio(self):
+        # Refreshes the CGT event and portfolio tabs from self.taxTransactions and self.assets
+        self.taxDisplay.setFrame(self.taxTransactions)
+        self.applyTaxFilter() # Keeps any date or consolidation filter over the new events
         self.calculate_button.setEnabled(False) # Disables calculate button once data has been calculated, until changes are saved ahain
-        self.tabsWidget.setCurrentIndex(1) # Sets CGT event display as current tab view
         
-        #Emit changes to Totals Model on CGT tab
-        top_left_index = self.taxDisplay.index(0, 0)
-        bottom_right_index = self.taxDisplay.index(self.taxDisplay.rowCount() - 1, self.taxDisplay.columnCount() - 1)
-        self.taxDisplay.dataChanged.emit(top_left_index, bottom_right_index)
+        self.displayHoldings()
+
+        self.scenarioAssetSelector.clear()
+        self.scenarioAssetSelector.addItems(sorted(str(asset) for asset in self.assets[self.assets['AssetType'] == AssetType.Share]['AssetIdentifier'].unique()))
         
-        self.assets = self.portfolio.consolidatePortfolio()
-        self.portfolioDisplay.setHorizontalHeaderLabels(self.assets.columns.tolist())
+    def displayHoldings(self):
+        # Current holdings, or holdings as at the chosen date
+        if getattr(self, 'portfolio', None) is None or getattr(self, 'assets', None) is None:
+            return
+        holdings, date = self.assets, dt.date.today()
+        if self.holdingsDateCheckbox.isChecked():
+            holdingsDate = self.holdingsDateField.date()
+            date = dt.date(holdingsDate.year(), holdingsDate.month(), holdingsDate.day())
+            holdings = self.portfolio.holdingsAsOf(date)
+        if self.marketValueCheckbox.isChecked() and self.prices is not None:
+            from markToMarket import markToMarket
+            holdings = markToMarket(holdings, self.prices, date)
+        self.portfolioDisplay.setColumnCount(len(holdings.columns)) # Valuation columns are dropped again once prices are off
+        self.portfolioDisplay.setHorizontalHeaderLabels(holdings.columns.tolist())
 
         self.portfolioDisplay.setRowCount(0)
-        for i in self.assets.index:
-            for j in self.assets.columns:
-                item = QStandardItem(str(self.assets.at[i, j]))
-                self.portfolioDisplay.setItem(i, self.assets.columns.get_loc(j), item)
+        for i in holdings.index:
+            for j in holdings.columns:
+                item = QStandardItem(displayValue(holdings.at[i, j]))
+                self.portfolioDisplay.setItem(i, holdings.columns.get_loc(j), item)
 
         self.portfolioTableView.setModel(self.portfolioDisplay)
         
+    def openPriceFileDialog(self):
+        options = QFileDialog.Options() # type: ignore
+        fileName, _ = QFileDialog.getOpenFileName(self,"Open Price File", "","Price Files (*.csv *.parquet);;All Files (*)", options=options)
+        if fileName:
+            self.priceFileField.setText(fileName)
+            self.loadPrices()
+
+    def loadPrices(self):
+        # Prices are read once per file, changing the holdings date only repeats the as-of join
+        from markToMarket import readPrices
+        self.prices = None
+        if self.priceFileField.text():
+            try:
+                self.prices = readPrices(self.priceFileField.text())
+            except Exception as error:
+                priceMessage = QMessageBox()
+                priceMessage.setIcon(QMessageBox.Warning) # type: ignore
+                priceMessage.setWindowTitle("Price File")
+                priceMessage.setText(str(error))
+                priceMessage.exec()
+        self.displayHoldings()
+
+    def optimizeFinancialYear(self):
+        from taxLotOptimizer import optimizeFinancialYear
+        self.buildCgtEventsTab()
+        self.buildPortfolioTab()
+        try:
+            self.portfolio, summary = optimizeFinancialYear(self.transactions, int(self.financialYearSelector.currentText()), float(self.carriedLossesField.text().replace(',', '') or 0))
+        except Exception as error:
+            optimizerMessage = QMessageBox()
+            optimizerMessage.setIcon(QMessageBox.Warning) # type: ignore
+            optimizerMessage.setWindowTitle("Tax Lot Optimizer")
+            optimizerMessage.setText(str(error))
+            optimizerMessage.exec()
+            return
+        self.taxTransactions = self.portfolio.taxableTransactions
+        self.assets = self.portfolio.consolidatePortfolio()
+        self.displayPortfolio()
+        optimizerMessage = QMessageBox()
+        optimizerMessage.setWindowTitle("Tax Lot Optimizer")
+        optimizerMessage.setText(f"FY{summary['Year']}: {summary['Sales']} sales assigned across {summary['Parcels']} parcels in {summary['Seconds']:.2f}s\n"
+                                 f"Net capital gain {summary['NetGain']:,.2f} (as entered {summary['AsEnteredNetGain']:,.2f})")
+        optimizerMessage.exec()
+
+    def compareSaleMethods(self):
+        from saleScenarios import compareSaleMethods
+        qdate = self.scenarioDateField.date()
+        try:
+            if not hasattr(self, 'portfolio'):
+                raise Exception('Calculate the portfolio before comparing sales')
+            scenarios = compareSaleMethods(self.portfolio, self.scenarioAssetSelector.currentText(), dt.date(qdate.year(), qdate.month(), qdate.day()),
+                                           float(self.scenarioValueField.text().replace(',', '')), float(self.scenarioQuantityField.text().replace(',', '')))
+        except Exception as error:
+            scenarioMessage = QMessageBox()
+            scenarioMessage.setIcon(QMessageBox.Warning) # type: ignore
+            scenarioMessage.setWindowTitle("Sale Comparison")
+            scenarioMessage.setText(str(error))
+            scenarioMessage.exec()
+            return
+        self.saleScenarioModel.setRowCount(0)
+        for i in scenarios.index:
+            for j in scenarios.columns:
+                item = QStandardItem(displayValue(scenarios.at[i, j]))
+                self.saleScenarioModel.setItem(i, scenarios.columns.get_loc(j), item)
+
     def update_financial_year(self, index):
         year = int(self.financialYearSelector.itemText(index))
         self.taxPeriodStartField.setDate(QDate(year-1, 7, 1))
@@ -693,36 +1410,62 @@ class MainWindow(QMainWindow):
         else:
             consolidationLevel = None
         
-        if (not self.dateFilterCheckbox.isChecked()) and (not self.consolidationFilterCheckbox.isChecked()):
-            self.taxDisplay.clear()
-            self.taxDisplay.setHorizontalHeaderLabels(self.taxTransactions.columns.tolist())
-            for i in self.taxTransactions.index:
-                for j in self.taxTransactions.columns:
-                    item = QStandardItem(str(self.taxTransactions.at[i, j]))
-                    self.taxDisplay.setItem(i, self.taxTransactions.columns.get_loc(j), item)
-            self.calculate()
+        if getattr(self, 'taxTransactions', None) is None:
             return
-        
-        self.filteredTaxTransactions = self.taxTransactions # instantiate filteredTaxTransactions before it hits other code
-        
-        self.filteredTaxTransactions.columns = self.taxTransactions.columns.tolist()
-        self.filteredTaxTransactions = self.portfolio.filterTaxTransactions(self.taxTransactions, startDate, endDate, consolidationLevel)
-        
-        self.taxDisplay.clear()
-        self.taxDisplay.setHorizontalHeaderLabels(self.filteredTaxTransactions.columns.tolist())
-        for i in self.filteredTaxTransactions.index:
-            for j in self.filteredTaxTransactions.columns:
-                item = QStandardItem(str(self.filteredTaxTransactions.at[i, j]))
-                self.taxDisplay.setItem(i, self.filteredTaxTransactions.columns.get_loc(j), item)
 
-        self.cgtEventsView.setModel(self.taxDisplay)
-        
-        #Emit changes to the totals table on CGT Events tab
-        top_left_index = self.taxDisplay.index(0, 0)
-        bottom_right_index = self.taxDisplay.index(self.taxDisplay.rowCount() - 1, self.taxDisplay.columnCount() - 1)
-        self.taxDisplay.dataChanged.emit(top_left_index, bottom_right_index)
+        if consolidationLevel:
+            # Consolidated events are new rows, so the model is given the grouped frame
+            self.filteredTaxTransactions = self.portfolio.filterTaxTransactions(self.taxTransactions, startDate, endDate, consolidationLevel)
+            self.taxDisplay.setFrame(self.filteredTaxTransactions)
+            self.taxRows.setRowFilter(None)
+            return
+
+        # A date filter only narrows the rows shown, found by binary search of the event dates
+        if self.taxDisplay.frame is not self.taxTransactions:
+            self.taxDisplay.setFrame(self.taxTransactions)
+        if startDate and endDate:
+            self.taxRows.setRowFilter(lambda model: model.rowsBetween('Date', toDay(startDate), toDay(endDate)))
+        else:
+            self.taxRows.setRowFilter(None)
+
+    @property
+    def workspace(self) -> 'ClientWorkspace': # type: ignore
+        if self.openWorkspace is None:
+            from clientWorkspace import ClientWorkspace
+            self.openWorkspace = ClientWorkspace()
+            self.updateWorkspaceLimit() # A limit entered before the first client applies to it
+        return self.openWorkspace
+
+    @property
+    def resultCache(self) -> 'ResultCache': # type: ignore
+        if self.openResultCache is None:
+            from resultCache import ResultCache
+            self.openResultCache = ResultCache()
+        return self.openResultCache
+
+    @property
+    def liveRecalculation(self) -> 'LiveRecalculation': # type: ignore
+        if self.openLiveRecalculation is None:
+            from liveRecalculation import LiveRecalculation
+            self.openLiveRecalculation = LiveRecalculation(self.liveResult.emit)
+        return self.openLiveRecalculation
+
+    def requireCalculation(self, title: str) -> bool:
+        # Warns and returns False until there are calculated CGT events to work from
+        if getattr(self, 'taxTransactions', None) is not None:
+            return True
+        calculationMessage = QMessageBox()
+        calculationMessage.setIcon(QMessageBox.Warning) # type: ignore
+        calculationMessage.setWindowTitle(title)
+        calculationMessage.setText("Calculate the portfolio before exporting")
+        calculationMessage.exec()
+        return False
 
     def exportWorkpaper(self):
+        from memoryDiagnostics import memoryStage
+        from workpaperExport import writeWorkpaper
+        if not self.requireCalculation("Export"):
+            return
         startDate = None
         endDate = None
         if self.dateFilterCheckbox.isChecked():
@@ -734,70 +1477,90 @@ class MainWindow(QMainWindow):
             startDate = None
             endDate = None
         
-        tab1 = TransactionHistory.filterByDate(self.transactionHistory, self.transactions, startDate, endDate)
-        tab2 = self.portfolio.filterTaxTransactions(self.taxTransactions, startDate, endDate)
-        tab3 = self.portfolio.filterTaxTransactions(self.taxTransactions, startDate, endDate, 1)
-        tab4 = self.portfolio.filterTaxTransactions(self.taxTransactions, startDate, endDate, 2)
-        
         options = QFileDialog.Options() # type: ignore
         fileName, _ = QFileDialog.getSaveFileName(self,"Save As...", "","XLSX Files (*.xlsx);;All Files (*)", options = options)
-        if fileName:
-            if '.xlsx' not in fileName:
-                fileName += '.xlsx'
-        
-        with pd.ExcelWriter(fileName) as writer:
-            tab1.to_excel(writer, sheet_name = 'Transaction_Listing')
-            tab2.to_excel(writer, sheet_name = 'CGT_Transactions')
-            tab3.to_excel(writer, sheet_name = 'CGT_Consol_Date')
-            tab4.to_excel(writer, sheet_name = 'CGT_Consol_Asset')
-    
-        wb = px.load_workbook(fileName)
-        self.formatWorkpaper(wb)
-        wb.save(fileName)
-        
-    def formatWorkpaper(self, workbook):
-        for sheet in workbook.worksheets:
-            headers = [cell.value for cell in sheet[1]]
-            number_format_rules = {
-                'Value': '#,##0.00',
-                'Proceeds' : '#,##0.00',
-                'CostBase' : '#,##0.00',
-                'GrossValue' : '#,##0.00',
-                'Date' : 'DD/MM/YYYY',
-                'AcquisitionDate' : 'DD/MM/YYYY',
-            }
-            alignment_rules = {
-                'Discountable' : Alignment(horizontal="left"),
-            }
-            for i, column_cells in enumerate(sheet.columns, start=1):
-                column_letter = get_column_letter(i)
-                for cell in column_cells:
-                    # Apply number format if column is in number_format_rules
-                    if headers[i-1] in number_format_rules:
-                        cell.number_format = number_format_rules[headers[i-1]]
-                    # Apply alignment if column is in alignment_rules
-                    if headers[i-1] in alignment_rules:
-                        cell.alignment = alignment_rules[headers[i-1]]
-                
-                max_length = 0
-                for cell in column_cells:
-                    try:
-                        if len(str(cell.value)) > max_length:
-                            max_length = len(cell.value)
-                    except:
-                        pass
-                adjusted_width = (max_length + 7)
-                sheet.column_dimensions[column_letter].width = adjusted_width
+        if not fileName:
+            return
+        if '.xlsx' not in fileName:
+            fileName += '.xlsx'
+        
+        with memoryStage(self.memoryProfile, 'export'):
+            writeWorkpaper(fileName, self.transactions, self.taxTransactions, startDate, endDate)
+
+    def exportFinancialYearWorkpapers(self):
+        if not self.requireCalculation("Export"):
+            return
+        firstYear = int(self.firstFinancialYearSelector.currentText())
+        lastYear = int(self.lastFinancialYearSelector.currentText())
+        
+        directory = QFileDialog.getExistingDirectory(self, "Select Export Folder")
+        if not directory:
+            return
+        baseName = os.path.splitext(self.transactionsFileName)[0] if hasattr(self, 'transactionsFileName') else 'Workpaper'
+        
+        # Workbooks are written in worker processes driven from a background thread, so the window stays responsive
+        from concurrent.futures import ThreadPoolExecutor
+        from workpaperExport import exportFinancialYears
+        if getattr(self, 'exportExecutor', None) is None:
+            self.exportExecutor = ThreadPoolExecutor(max_workers = 1)
+            self.exportFinished.connect(self.showFinancialYearExport)
+        self.exportFinancialYearsButton.setEnabled(False)
+        future = self.exportExecutor.submit(exportFinancialYears, directory, baseName, self.transactions, self.taxTransactions, firstYear, lastYear)
+        future.add_done_callback(self.exportFinished.emit)
+
+    def showFinancialYearExport(self, future):
+        self.exportFinancialYearsButton.setEnabled(True)
+        try:
+            totalTime, yearTimes = future.result()
+        except Exception as error:
+            exportMessage = QMessageBox()
+            exportMessage.setIcon(QMessageBox.Warning) # type: ignore
+            exportMessage.setWindowTitle("Export Failed")
+            exportMessage.setText(str(error))
+            exportMessage.exec()
+            return
+        
+        exportMessage = QMessageBox()
+        exportMessage.setIcon(QMessageBox.Information) # type: ignore
+        exportMessage.setWindowTitle("Export Complete")
+        exportMessage.setText(f"Exported {len(yearTimes)} financial years in {totalTime:.2f}s\n\n" 
+                              + "\n".join(f"FY{year}: {seconds:.2f}s" for year, seconds in yearTimes.items()))
+        exportMessage.exec()
     
+    def toggleMemoryDiagnostics(self, checked):
+        from memoryDiagnostics import MemoryProfile
+        if checked:
+            self.memoryProfile = MemoryProfile()
+        elif self.memoryProfile is not None:
+            self.memoryProfile.stop()
+            self.memoryProfile = None
+        self.memoryReportButton.setEnabled(checked)
+
+    def showMemoryReport(self):
+        if self.memoryProfile is None:
+            return
+        report = self.memoryProfile.report()
+        reportMessage = QMessageBox()
+        reportMessage.setIcon(QMessageBox.Information) # type: ignore
+        reportMessage.setWindowTitle("Memory Report")
+        if report.empty:
+            reportMessage.setText("No stages recorded yet, import and calculate with diagnostics mode on")
+        else:
+            reportMessage.setText("\n".join(f"{row.Stage}: peak {row.PeakMB:,.2f}MB, retained {row.RetainedMB:,.2f}MB, frames {row.FramesMB:,.2f}MB" for row in report.itertuples()))
+        reportMessage.exec()
+
     def disableAll(self):
         self.transactionHistoryTab.setDisabled(True)
         self.tab2.setDisabled(True)
 
-app = QApplication(sys.argv)
-app.setStyle('Fusion')
-app.setWindowIcon(QIcon('C:/Users/mattt/Desktop/Programming/CostBaseApp/MoneySquare.png'))
+if __name__ == '__main__':
+    multiprocessing.freeze_support() # Export workers re-import this module when frozen
+    sys.argv += ['-platform', 'windows:darkmode=2']
+    app = QApplication(sys.argv)
+    app.setStyle('Fusion')
+    app.setWindowIcon(QIcon('C:/Users/mattt/Desktop/Programming/CostBaseApp/MoneySquare.png'))
 
-window = MainWindow()
-window.show()
+    window = MainWindow()
+    window.show()
 
-app.exec()
\ No newline at end of file
+    app.exec()
\ No newline at end of file
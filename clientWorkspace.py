@@ -0,0 +1,188 @@
+from pandasCGcalc import TransactionHistory, Portfolio, TaxEvent
+from transactionStore import TransactionStore, isStoreFile
+from editJournal import EditJournal, journalSuffix
+from collections import OrderedDict
+import pandas as pd
+import hashlib
+import os
+import pickle
+import sys
+
+defaultCacheDirectory = os.path.join(os.path.expanduser('~'), '.cgtapp', 'cache')
+defaultByteLimit = 512 * 2**20
+defaultCacheByteLimit = 1024 * 2**20
+cacheSuffix = '.client'
+
+def fileSignature(path: str) -> tuple:
+    # Modification times and sizes of the file and its edit journal, a spilled client is only reloaded while both are unchanged
+    stat = os.stat(path)
+    journal = os.stat(path + journalSuffix) if os.path.exists(path + journalSuffix) else None
+    return stat.st_mtime_ns, stat.st_size, journal.st_mtime_ns if journal else 0, journal.st_size if journal else 0
+
+def readTransactionFile(path: str) -> pd.DataFrame:
+    if isStoreFile(path):
+        with TransactionStore(path) as store:
+            return store.read()
+    transactionHistory = TransactionHistory()
+    journal = EditJournal(path)
+    transactionHistory.readData(journal.load() if journal.isCurrent() else pd.read_csv(path))
+    return transactionHistory.transactions
+
+def frameBytes(frame: pd.DataFrame | None) -> int:
+    return int(frame.memory_usage(index=True, deep=True).sum()) if frame is not None else 0
+
+def portfolioBytes(portfolio: Portfolio | None) -> int:
+    # Parcel arrays plus an estimate for the recorded CGT events, which are slotted objects rather than arrays
+    if portfolio is None:
+        return 0
+    parcels = sum(array.nbytes for book in portfolio.holdings.values() for array in (book.purchaseDates, book.quantities, book.cents, book.optionIDs, book.sequences))
+    return parcels + len(portfolio.taxEvents) * (sys.getsizeof(TaxEvent.__new__(TaxEvent)) + 8 * len(TaxEvent.__slots__))
+
+class ClientState:
+    # One open client file: decoded transactions, and the replayed portfolio and its aggregates once calculated
+    def __init__(self, path: str, signature: tuple, transactions: pd.DataFrame):
+        self.path = path
+        self.signature = signature
+        self.transactions = transactions
+        self.portfolio = None
+        self.taxTransactions = None
+        self.assets = None
+        self.measuredBytes = None
+
+    def calculate(self):
+        if self.portfolio is None:
+            self.portfolio = Portfolio()
+            self.portfolio.readTransactions(self.transactions)
+            self.taxTransactions = self.portfolio.taxableTransactions
+            self.assets = self.portfolio.consolidatePortfolio()
+            self.measuredBytes = None
+
+    def sizeBytes(self) -> int:
+        # Deep frame sizes are slow to take, so the size is kept until the client changes
+        if self.measuredBytes is None:
+            self.measuredBytes = frameBytes(self.transactions) + portfolioBytes(self.portfolio) + frameBytes(self.taxTransactions) + frameBytes(self.assets)
+        return self.measuredBytes
+
+class ClientWorkspace:
+    # Several client files open at once, most recently used last
+    # Clients are held in memory while their total size is within byteLimit, least recently used clients are spilled to the cache
+    # directory beyond that and read back from there when reopened, the current client always stays in memory
+    # Spill files are removed once read back or out of date, and the directory is kept within cacheByteLimit, oldest files first,
+    # so files left by earlier sessions do not build up
+    def __init__(self, byteLimit: int = defaultByteLimit, cacheDirectory: str = defaultCacheDirectory, cacheByteLimit: int = defaultCacheByteLimit):
+        self.byteLimit = byteLimit
+        self.cacheDirectory = cacheDirectory
+        self.cacheByteLimit = cacheByteLimit
+        self.clients = OrderedDict()
+        self.spilled = {}
+        self.trimCache()
+
+    def __contains__(self, path: str) -> bool:
+        return os.path.abspath(path) in self.clients or os.path.abspath(path) in self.spilled
+
+    def paths(self) -> list:
+        # Open clients, most recently used first
+        return list(reversed(self.clients)) + [path for path in self.spilled if path not in self.clients]
+
+    def memoryBytes(self) -> int:
+        return sum(client.sizeBytes() for client in self.clients.values())
+
+    def cacheFile(self, path: str, signature: tuple) -> str:
+        key = hashlib.sha1('|'.join(map(str, (path, *signature))).encode()).hexdigest()
+        return os.path.join(self.cacheDirectory, key + cacheSuffix)
+
+    def cacheFiles(self) -> list:
+        # Spill files and their sizes, least recently written first
+        if not os.path.isdir(self.cacheDirectory):
+            return []
+        files = [os.path.join(self.cacheDirectory, name) for name in os.listdir(self.cacheDirectory) if name.endswith(cacheSuffix)]
+        stats = [(path, os.stat(path)) for path in files if os.path.exists(path)]
+        return [(path, stat.st_size) for path, stat in sorted(stats, key=lambda item: item[1].st_mtime_ns)]
+
+    def trimCache(self):
+        # Removes spill files until the directory is within cacheByteLimit, files this workspace does not know of go first
+        files = self.cacheFiles()
+        total = sum(size for path, size in files)
+        current = {self.cacheFile(path, signature) for path, signature in self.spilled.items()}
+        for path, size in sorted(files, key=lambda item: item[0] in current):
+            if total <= self.cacheByteLimit:
+                break
+            os.remove(path)
+            total -= size
+
+    def removeSpill(self, path: str):
+        signature = self.spilled.pop(path, None)
+        if signature is not None and os.path.exists(self.cacheFile(path, signature)):
+            os.remove(self.cacheFile(path, signature))
+
+    def get(self, path: str) -> ClientState | None:
+        # Open client for path, from memory or the cache, None if it is not open or its file has changed since
+        path = os.path.abspath(path)
+        signature = fileSignature(path)
+        client = self.clients.pop(path, None)
+        if client is None and self.spilled.get(path) == signature and os.path.exists(self.cacheFile(path, signature)):
+            with open(self.cacheFile(path, signature), 'rb') as cacheFile:
+                client = pickle.load(cacheFile)
+        self.removeSpill(path) # Read back into memory, or out of date
+        if client is None or client.signature != signature:
+            return None
+        self.clients[path] = client
+        self.evict()
+        return client
+
+    def refreshSignature(self, path: str):
+        # For a file changed without changing its transactions, such as a journal marking the table opened again
+        client = self.clients.get(os.path.abspath(path))
+        if client is not None:
+            client.signature = fileSignature(client.path)
+
+    def add(self, path: str, transactions: pd.DataFrame) -> ClientState:
+        path = os.path.abspath(path)
+        client = ClientState(path, fileSignature(path), transactions)
+        self.clients.pop(path, None)
+        self.clients[path] = client
+        self.evict()
+        return client
+
+    def open(self, path: str) -> ClientState:
+        return self.get(path) or self.add(path, readTransactionFile(path))
+
+    def update(self, path: str, transactions: pd.DataFrame) -> ClientState:
+        # Edited transactions replace the decoded ones, anything calculated from the old ones is dropped
+        client = self.get(path) or self.add(path, transactions)
+        client.transactions = transactions
+        client.portfolio, client.taxTransactions, client.assets, client.measuredBytes = None, None, None, None
+        self.evict()
+        return client
+
+    def store(self, path: str, portfolio: Portfolio, taxTransactions: pd.DataFrame, assets: pd.DataFrame) -> ClientState | None:
+        # Keeps results calculated outside the workspace with the client they came from
+        client = self.get(path)
+        if client is not None:
+            client.portfolio, client.taxTransactions, client.assets, client.measuredBytes = portfolio, taxTransactions, assets, None
+            self.evict()
+        return client
+
+    def calculate(self, path: str) -> ClientState:
+        client = self.get(path) or self.open(path)
+        client.calculate()
+        self.evict()
+        return client
+
+    def evict(self):
+        while len(self.clients) > 1 and self.memoryBytes() > self.byteLimit:
+            path, client = self.clients.popitem(last=False)
+            self.spill(client)
+
+    def spill(self, client: ClientState):
+        os.makedirs(self.cacheDirectory, exist_ok=True)
+        self.removeSpill(client.path) # An earlier spill of the client may be from before its file changed
+        with open(self.cacheFile(client.path, client.signature), 'wb') as cacheFile:
+            pickle.dump(client, cacheFile, protocol=pickle.HIGHEST_PROTOCOL)
+        self.spilled[client.path] = client.signature
+        self.trimCache()
+
+    def close(self, path: str):
+        path = os.path.abspath(path)
+        self.clients.pop(path, None)
+        self.removeSpill(path)
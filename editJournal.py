@@ -0,0 +1,151 @@
+from pandasCGcalc import TransactionHistory
+import pandas as pd
+import json
+import os
+
+journalSuffix = '.journal'
+
+def baseSignature(path: str) -> list:
+    stat = os.stat(path)
+    return [stat.st_mtime_ns, stat.st_size]
+
+def tableOrder(transactions: pd.DataFrame) -> pd.DataFrame:
+    # Raw rows in the order the transaction table shows them once decoded, which is the order edits address them in
+    if transactions.empty:
+        return transactions
+    decoded = transactions.copy()
+    decoded['Row'] = range(len(decoded))
+    transactionHistory = TransactionHistory()
+    transactionHistory.readData(decoded)
+    return transactions.iloc[transactionHistory.transactions['Row'].to_numpy()].reset_index(drop=True)
+
+def applyEdits(transactions: pd.DataFrame, operations: list) -> pd.DataFrame:
+    # Replays row level edits over raw transactions, rows are addressed by position as they were when each edit was made
+    # A sort line marks the table being opened again, which shows the rows edited so far in date order
+    rows = transactions.values.tolist()
+    for operation in operations:
+        if operation['op'] == 'insert':
+            rows.insert(operation['row'], operation['values'])
+        elif operation['op'] == 'update':
+            rows[operation['row']][operation['column']] = operation['value']
+        elif operation['op'] == 'delete':
+            del rows[operation['row']]
+        elif operation['op'] == 'sort':
+            rows = tableOrder(pd.DataFrame(rows, columns=transactions.columns)).values.tolist()
+    return pd.DataFrame(rows, columns=transactions.columns)
+
+class EditJournal:
+    # Append-only journal of row level edits to a transaction history CSV, as JSON lines in a file next to it
+    # Edits are appended as they are made and are saved once a commit line follows them, so a save only writes the commit. Edits after
+    # the last commit are what a crash left unsaved. The first line records the CSV the journal applies to and whether its rows are in
+    # table order already, compaction folds the saved edits into a new CSV and a journal left over from a crash part way through
+    # compacting no longer matches it and is dropped
+    def __init__(self, path: str, compactBytes: int = 2**20):
+        self.path = path
+        self.journalPath = path + journalSuffix
+        self.compactBytes = compactBytes
+
+    def append(self, operation: dict):
+        if not self.isCurrent():
+            self.write([], sort=True)
+        with open(self.journalPath, 'rb+') as journal:
+            # A line torn by a crash is cut off, so the edit is not appended to it
+            tail = journal.seek(0, os.SEEK_END)
+            while tail > 0:
+                journal.seek(tail - 1)
+                if journal.read(1) == b'\n':
+                    break
+                tail -= 1
+            journal.truncate(tail)
+            journal.seek(tail)
+            journal.write((json.dumps(operation) + '\n').encode('utf-8'))
+
+    def insert(self, row: int, values: list):
+        self.append({'op': 'insert', 'row': row, 'values': values})
+
+    def update(self, row: int, column: int, value: str):
+        self.append({'op': 'update', 'row': row, 'column': column, 'value': value})
+
+    def delete(self, row: int):
+        self.append({'op': 'delete', 'row': row})
+
+    def open(self):
+        # Edits made after the table is opened again address the edited rows in date order
+        operations = sum(self.read(), [])
+        if operations and operations[-1]['op'] != 'sort':
+            self.append({'op': 'sort'})
+
+    def commit(self):
+        self.append({'op': 'commit'})
+        with open(self.journalPath, 'a', encoding='utf-8') as journal:
+            os.fsync(journal.fileno())
+        if os.path.getsize(self.journalPath) > max(self.compactBytes, os.path.getsize(self.path) // 4):
+            self.compact()
+
+    def header(self) -> dict | None:
+        if not os.path.exists(self.journalPath):
+            return None
+        with open(self.journalPath, encoding='utf-8') as journal:
+            try:
+                header = json.loads(journal.readline())
+            except json.JSONDecodeError:
+                return None
+        return header if header.get('base') == baseSignature(self.path) else None
+
+    def isCurrent(self) -> bool:
+        return self.header() is not None
+
+    def read(self) -> tuple[list, list]:
+        # Saved edits and edits since the last commit
+        saved, unsaved = [], []
+        if not self.isCurrent():
+            return saved, unsaved
+        with open(self.journalPath, encoding='utf-8') as journal:
+            journal.readline()
+            for line in journal:
+                try:
+                    operation = json.loads(line)
+                except json.JSONDecodeError:
+                    break # Last line torn by a crash part way through writing it
+                if operation['op'] == 'commit':
+                    saved.extend(unsaved)
+                    unsaved = []
+                else:
+                    unsaved.append(operation)
+        return saved, unsaved
+
+    def write(self, operations: list, sort: bool):
+        # Starts a journal for the CSV as it is now, with operations already saved
+        temporary = self.journalPath + '.tmp'
+        with open(temporary, 'w', encoding='utf-8') as journal:
+            journal.write(json.dumps({'base': baseSignature(self.path), 'sort': sort}) + '\n')
+            for operation in operations:
+                journal.write(json.dumps(operation) + '\n')
+            if operations:
+                journal.write(json.dumps({'op': 'commit'}) + '\n')
+        os.replace(temporary, self.journalPath)
+
+    def discardUnsaved(self):
+        saved, unsaved = self.read()
+        if unsaved:
+            self.write(saved, self.header()['sort'])
+
+    def readBase(self) -> pd.DataFrame:
+        # Raw text as in the file, journalled edits are text from the transaction table and decode the same way
+        transactions = pd.read_csv(self.path, dtype=str, keep_default_na=False)
+        header = self.header()
+        return tableOrder(transactions) if header is not None and header['sort'] else transactions
+
+    def load(self, includeUnsaved: bool = False) -> pd.DataFrame:
+        saved, unsaved = self.read()
+        return applyEdits(self.readBase(), saved + unsaved if includeUnsaved else saved)
+
+    def compact(self):
+        # Writes the saved edits into the CSV, carrying any unsaved edits over to a new journal
+        saved, unsaved = self.read()
+        temporary = self.path + '.compacting'
+        applyEdits(self.readBase(), saved).to_csv(temporary, index=False)
+        os.replace(temporary, self.path)
+        self.write([], sort=False) # Written in the order the unsaved edits address
+        for operation in unsaved:
+            self.append(operation)
@@ -0,0 +1,248 @@
+from pandasCGcalc import TransactionHistory, Portfolio, TransactionType, EngineProfile, saleMethods
+from workpaperExport import writeWorkpaper
+from memoryDiagnostics import runMemoryDiagnostics
+import datetime as dt
+import pandas as pd
+import argparse
+import json
+import numpy as np
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+def generateHistory(rows: int, tickers: int = 50, seed: int = 0, startDate: dt.date = dt.date(2010, 7, 1)) -> pd.DataFrame:
+    # Seeded synthetic transaction history in the same layout as the input CSV files
+    # Mix of regular purchases, DRP micro-purchases, share sales, splits and merges, and option purchase/sale/exercise/expire chains
+    # Share holdings are tracked as a lower bound (merges can round down per parcel) so sales never exceed what is held
+    # Random draws are made in bulk and prices, values, dates and text columns are built as arrays, only the holdings and open options
+    # that decide each row are followed row by row, over plain integers, so 10^7 rows generate in well under a minute
+    rng = np.random.default_rng(seed)
+    codes = np.array([f'T{i:03d}' for i in range(tickers)], dtype=object)
+    initialPrices = rng.uniform(1.0, 200.0, tickers)
+    # Row kinds as (AssetType, TransactionType, value per unit as a multiple of the price)
+    kindColumns = [('Share', 'Purchase', 1.0), ('Share', 'Sale', 1.0), ('Share', 'Split', 0.0), ('Share', 'Merge', 0.0), ('Option', 'Purchase', 0.1),
+                   ('Option', 'Sale', 0.1), ('Option', 'Exercise', 0.0), ('Share', 'Exercise', 1.0), ('Option', 'Expire', 0.0)]
+    purchase, sale, split, merge, optionPurchase, optionSale, optionExercise, shareExercise, expire = range(len(kindColumns))
+    held = [0] * tickers
+    parcels = [0] * tickers
+    options = [] # [option number, ticker, quantity, candidate priced at], removed by swapping with the last
+    kinds, rowTickers, quantities, optionNumbers, priced = [], [], [], [], [] # priced is the candidate whose price values the row
+    candidateTickers, priceSteps = [np.zeros(0, dtype=np.int64)], [np.zeros(0)]
+    candidates = 0
+    optionCount = 0
+
+    def add(kind: int, ticker: int, quantity: int, candidate: int, optionNumber: int = 0):
+        kinds.append(kind)
+        rowTickers.append(ticker)
+        quantities.append(quantity)
+        priced.append(candidate)
+        optionNumbers.append(optionNumber)
+
+    while len(kinds) < rows:
+        # Each candidate event adds up to two rows, or none when there is nothing held to sell, so batches are drawn until full
+        batch = max(rows - len(kinds), 1000)
+        tickerDraws = rng.integers(tickers, size = batch)
+        candidateTickers.append(tickerDraws)
+        priceSteps.append(np.log(rng.uniform(0.98, 1.025, batch)))
+        draws = zip(tickerDraws.tolist(), rng.random(batch).tolist(), rng.random(batch).tolist(), rng.random(batch).tolist(), rng.random(batch).tolist(),
+                    rng.integers(10, 501, batch).tolist(), rng.integers(1, 13, batch).tolist(), rng.integers(2, 201, batch).tolist())
+        for candidate, (ticker, event, chain, pick, fraction, purchaseQuantity, drpQuantity, optionQuantity) in enumerate(draws, candidates):
+            remaining = rows - len(kinds)
+            if remaining <= 0:
+                break
+            if event < 0.30 or remaining < 2:
+                add(purchase, ticker, purchaseQuantity, candidate)
+                held[ticker] += purchaseQuantity
+                parcels[ticker] += 1
+            elif event < 0.55:
+                # DRP micro-purchase
+                add(purchase, ticker, drpQuantity, candidate)
+                held[ticker] += drpQuantity
+                parcels[ticker] += 1
+            elif event < 0.80:
+                if held[ticker] < 2:
+                    continue
+                quantity = 1 + int(fraction * (held[ticker] // 2))
+                add(sale, ticker, quantity, candidate)
+                held[ticker] -= quantity
+            elif event < 0.82:
+                if held[ticker] == 0:
+                    continue
+                add(split, ticker, 2, candidate)
+                held[ticker] *= 2
+            elif event < 0.84:
+                if held[ticker] == 0:
+                    continue
+                add(merge, ticker, 2, candidate)
+                held[ticker] = max(0, held[ticker] // 2 - parcels[ticker])
+            elif event < 0.90:
+                optionCount += 1
+                options.append([optionCount, ticker, optionQuantity, candidate])
+                add(optionPurchase, ticker, optionQuantity, candidate, optionCount)
+            elif options:
+                index = int(pick * len(options))
+                optionNumber, optionTicker, quantity, strikeCandidate = options[index]
+                if chain < 0.35 and quantity > 1:
+                    sold = 1 + int(fraction * (quantity - 1))
+                    add(optionSale, optionTicker, sold, candidate, optionNumber)
+                    options[index][2] -= sold
+                    continue
+                if chain < 0.70:
+                    # Option and share sides of an exercise are always generated together, and in full, at the price the option was bought at
+                    add(optionExercise, optionTicker, quantity, candidate, optionNumber)
+                    add(shareExercise, optionTicker, quantity, strikeCandidate, optionNumber)
+                    held[optionTicker] += quantity
+                    parcels[optionTicker] += 1
+                else:
+                    add(expire, optionTicker, quantity, candidate, optionNumber)
+                options[index] = options[-1]
+                options.pop()
+        candidates += batch
+
+    # Prices follow a random walk per ticker, halving on a split and doubling on a merge
+    kinds, rowTickers, quantities, optionNumbers, priced = (np.array(column, dtype=np.int64) for column in (kinds, rowTickers, quantities, optionNumbers, priced))
+    candidateTickers = np.concatenate(candidateTickers)
+    priceSteps = np.concatenate(priceSteps)
+    priceSteps[priced[kinds == split]] -= np.log(2)
+    priceSteps[priced[kinds == merge]] += np.log(2)
+    prices = initialPrices[candidateTickers] * np.exp(pd.Series(priceSteps).groupby(candidateTickers).cumsum().to_numpy())
+    valueMultiples = np.array([multiple for assetType, transactionType, multiple in kindColumns])
+
+    rowsPerDay = max(1, rows // 5000)
+    days = np.arange(rows) // rowsPerDay + 1
+    dates = np.array([(startDate + dt.timedelta(days = day)).strftime('%d/%m/%Y') for day in range(int(days[-1]) + 1 if rows else 0)], dtype=object)
+    optionIDs = pd.Series(optionNumbers).map(lambda number: f'OPT{number:07d}' if number else '').to_numpy(dtype=object)
+    return pd.DataFrame({
+        'Date': dates[days],
+        'AssetType': np.array([assetType for assetType, transactionType, multiple in kindColumns], dtype=object)[kinds],
+        'AssetID': codes[rowTickers],
+        'TransactionType': np.array([transactionType for assetType, transactionType, multiple in kindColumns], dtype=object)[kinds],
+        'Quantity': quantities.astype(float),
+        'Value': np.round(quantities * prices[priced] * valueMultiples[kinds], 2),
+        'OptionID': optionIDs,
+        'OptionSplitID': np.full(rows, '', dtype=object),
+    })
+
+def timeCall(function, *args, **kwargs):
+    start = time.perf_counter()
+    result = function(*args, **kwargs)
+    return time.perf_counter() - start, result
+
+def gitRevision() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd = os.path.dirname(os.path.abspath(__file__)),
+                              capture_output = True, text = True).stdout.strip()
+    except OSError:
+        return ''
+
+def benchmarkHistory(rows: int, seed: int = 0, tickers: int = 50, methods: list | None = None, export: bool = True, memory: bool = False) -> dict:
+    raw = generateHistory(rows, tickers, seed)
+    timings = {}
+
+    transactionHistory = TransactionHistory()
+    timings['readData'], _ = timeCall(transactionHistory.readData, raw.copy())
+    transactions = transactionHistory.transactions
+
+    reportPortfolio = None
+    for method in methods or list(saleMethods):
+        methodTransactions = transactions.copy()
+        methodTransactions['TransactionType'] = methodTransactions['TransactionType'].map(
+            lambda x: saleMethods[method] if x == TransactionType.FIFO_Sale else x)
+        portfolio = Portfolio()
+        timings[f'readTransactions_{method}'], _ = timeCall(portfolio.readTransactions, methodTransactions)
+        if reportPortfolio is None or method == 'FIFO':
+            reportPortfolio = portfolio
+
+    portfolio = reportPortfolio
+    taxTransactions = portfolio.taxableTransactions
+    startDate, endDate = dt.date(2012, 7, 1), dt.date(2013, 6, 30)
+    timings['filterTaxTransactions'], _ = timeCall(portfolio.filterTaxTransactions, taxTransactions, startDate, endDate)
+    timings['filterTaxTransactions_Date'], _ = timeCall(portfolio.filterTaxTransactions, taxTransactions, startDate, endDate, 1)
+    timings['filterTaxTransactions_Asset'], _ = timeCall(portfolio.filterTaxTransactions, taxTransactions, startDate, endDate, 2)
+    timings['consolidatePortfolio'], _ = timeCall(portfolio.consolidatePortfolio)
+
+    if export:
+        with tempfile.TemporaryDirectory() as directory:
+            timings['export'], _ = timeCall(writeWorkpaper, os.path.join(directory, 'benchmark.xlsx'), transactions, taxTransactions, startDate, endDate)
+
+    result = {'rows': rows, 'seed': seed, 'tickers': tickers, 'taxableEvents': len(taxTransactions), 'seconds': timings}
+    if memory:
+        # Separate traced run, tracemalloc overhead would distort the timings above
+        profile = runMemoryDiagnostics(raw)
+        result['peakBytes'] = {stage: stats['peakBytes'] for stage, stats in profile.stages.items()}
+    return result
+
+def runBenchmarks(sizes: list, seed: int = 0, tickers: int = 50, methods: list | None = None, export: bool = True, memory: bool = False) -> dict:
+    return {
+        'revision': gitRevision(),
+        'timestamp': dt.datetime.now().isoformat(timespec = 'seconds'),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'results': [benchmarkHistory(rows, seed, tickers, methods, export, memory) for rows in sizes],
+    }
+
+def compareResults(baseline: dict, current: dict, tolerance: float = 0.25, measure: str = 'seconds') -> list:
+    # Returns (rows, stage, baseline, current) for every stage more than tolerance above the baseline
+    # measure is 'seconds' for timings or 'peakBytes' for memory
+    regressions = []
+    baselineResults = {(result['rows'], result['seed'], result['tickers']): result.get(measure, {}) for result in baseline['results']}
+    for result in current['results']:
+        previous = baselineResults.get((result['rows'], result['seed'], result['tickers']), {})
+        for stage, amount in result.get(measure, {}).items():
+            if stage in previous and amount > previous[stage] * (1 + tolerance):
+                regressions.append((result['rows'], stage, previous[stage], amount))
+    return regressions
+
+def memoryBudgetExceeded(results: dict, maxPeakMB: float) -> list:
+    return [(result['rows'], stage, peak) for result in results['results'] for stage, peak in result.get('peakBytes', {}).items() if peak > maxPeakMB * 2**20]
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'Times the capital gains engine against synthetic transaction histories')
+    parser.add_argument('--rows', type = int, nargs = '+', default = [1000, 10000], help = 'history sizes to time, 10^3 to 10^7 rows, replays of 10^6 rows and over take minutes per sale method')
+    parser.add_argument('--seed', type = int, default = 0)
+    parser.add_argument('--tickers', type = int, default = 50)
+    parser.add_argument('--methods', nargs = '+', choices = list(saleMethods), default = list(saleMethods))
+    parser.add_argument('--no-export', action = 'store_true')
+    parser.add_argument('--output', default = 'bench_results.json')
+    parser.add_argument('--compare', help = 'previous results file, exits non-zero on regressions')
+    parser.add_argument('--tolerance', type = float, default = 0.25)
+    parser.add_argument('--memory', action = 'store_true', help = 'also record peak memory per pipeline stage')
+    parser.add_argument('--max-peak-mb', type = float, help = 'exits non-zero if any stage peaks above this, implies --memory')
+    parser.add_argument('--trace', help = 'write a chrome trace of decoding and a FIFO replay of the smallest history to this file')
+    args = parser.parse_args()
+
+    if args.trace:
+        profile = EngineProfile()
+        transactionHistory = TransactionHistory(profile)
+        transactionHistory.readData(generateHistory(min(args.rows), args.tickers, args.seed))
+        Portfolio(profile).readTransactions(transactionHistory.transactions)
+        profile.saveChromeTrace(args.trace)
+        print(profile.report().to_string(index = False))
+
+    results = runBenchmarks(args.rows, args.seed, args.tickers, args.methods, not args.no_export, args.memory or args.max_peak_mb is not None)
+    with open(args.output, 'w') as file:
+        json.dump(results, file, indent = 4)
+    for result in results['results']:
+        print(f"{result['rows']:>10} rows  " + '  '.join(f'{stage} {seconds:.3f}s' for stage, seconds in result['seconds'].items()))
+        if 'peakBytes' in result:
+            print(f"{result['rows']:>10} rows  " + '  '.join(f'{stage} {peak / 2**20:,.2f}MB' for stage, peak in result['peakBytes'].items()))
+
+    failed = False
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)
+        for rows, stage, before, after in compareResults(baseline, results, args.tolerance):
+            print(f'REGRESSION {rows} rows {stage}: {before:.3f}s -> {after:.3f}s')
+            failed = True
+        for rows, stage, before, after in compareResults(baseline, results, args.tolerance, 'peakBytes'):
+            print(f'MEMORY REGRESSION {rows} rows {stage}: {before / 2**20:,.2f}MB -> {after / 2**20:,.2f}MB')
+            failed = True
+    if args.max_peak_mb is not None:
+        for rows, stage, peak in memoryBudgetExceeded(results, args.max_peak_mb):
+            print(f'MEMORY BUDGET {rows} rows {stage}: {peak / 2**20:,.2f}MB > {args.max_peak_mb:,.2f}MB')
+            failed = True
+    if failed:
+        sys.exit(1)
@@ -0,0 +1,68 @@
+from pandasCGcalc import Portfolio, TaxEvent, taxableColumns, toDate
+from transactionStore import TransactionStore, isStoreFile
+from clientWorkspace import readTransactionFile
+from typing import Callable, Iterable, Iterator
+import pandas as pd
+import argparse
+import csv
+
+def chunks(transactions: pd.DataFrame, chunkSize: int = 10000) -> Iterator[pd.DataFrame]:
+    for start in range(0, len(transactions), chunkSize):
+        yield transactions.iloc[start:start + chunkSize]
+
+def readChunks(path: str, chunkSize: int = 10000) -> Iterator[pd.DataFrame]:
+    # Decoded transactions in date order, SQLite stores are streamed through a cursor and CSVs are decoded whole as they may be unsorted
+    if isStoreFile(path):
+        with TransactionStore(path, chunkSize) as store:
+            yield from store.query()
+    else:
+        yield from chunks(readTransactionFile(path), chunkSize)
+
+def withProgress(frames: Iterable[pd.DataFrame], progress: Callable[[int], None]) -> Iterator[pd.DataFrame]:
+    # Passes frames through, calling progress with the number of transactions replayed once each frame is done
+    count = 0
+    for frame in frames:
+        yield frame
+        count += len(frame)
+        progress(count)
+
+def taxEvents(events: Iterable) -> Iterator[TaxEvent]:
+    return (event for event in events if isinstance(event, TaxEvent))
+
+def writeEvents(events: Iterable, path: str) -> int:
+    # Writes CGT events as they arrive, in taxableTransactions columns, returns the number written
+    count = 0
+    with open(path, 'w', newline='') as file:
+        writer = csv.DictWriter(file, fieldnames=taxableColumns)
+        writer.writeheader()
+        for event in taxEvents(events):
+            writer.writerow(event.toDict())
+            count += 1
+    return count
+
+def financialYearTotals(events: Iterable) -> pd.DataFrame:
+    # Gross gains per financial year, running totals in cents so only one row per year is held
+    totals = {}
+    for event in taxEvents(events):
+        date = toDate(event.date)
+        year = date.year + (date.month >= 7) # FY2023 runs 1/7/2022 - 30/6/2023
+        yearTotals = totals.setdefault(year, [0, 0, 0, 0])
+        category = 0 if event.discountable == True else 2 if event.discountable == 'Loss' else 1
+        yearTotals[category] += event.grossValue
+        yearTotals[3] += 1
+    return pd.DataFrame([[year, discountable / 100, other / 100, losses / 100, count] for year, (discountable, other, losses, count) in sorted(totals.items())],
+                        columns=['Year', 'Discountable', 'NonDiscountable', 'Losses', 'Events'])
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'Streams CGT events from a transaction history CSV or SQLite store without building the full result')
+    parser.add_argument('file', help = 'transaction history CSV or SQLite store')
+    parser.add_argument('--csv', help = 'write the CGT events to this CSV instead of totalling them by financial year')
+    parser.add_argument('--chunk', type = int, default = 10000, help = 'transactions replayed per chunk')
+    args = parser.parse_args()
+
+    frames = withProgress(readChunks(args.file, args.chunk), lambda count: print(f'{count} transactions replayed', flush = True))
+    events = Portfolio().streamEvents(frames, record = False)
+    if args.csv:
+        print(f'{writeEvents(events, args.csv)} CGT events written to {args.csv}')
+    else:
+        print(financialYearTotals(events).to_string(index = False))
@@ -0,0 +1,120 @@
+from concurrent.futures import ThreadPoolExecutor
+from pandasCGcalc import TransactionHistory, Portfolio
+from transactionValidation import checkTransactions
+from typing import Callable
+import bisect
+import numpy as np
+import pandas as pd
+import argparse
+import time
+
+def firstChange(previous: pd.DataFrame, transactions: pd.DataFrame) -> int:
+    # Position of the first decoded transaction that differs in replay order, the shorter length if one frame extends the other
+    length = min(len(previous), len(transactions))
+    if length == 0 or previous.columns.tolist() != transactions.columns.tolist():
+        return 0
+    previousHashes = pd.util.hash_pandas_object(previous.iloc[:length], index=False).to_numpy()
+    hashes = pd.util.hash_pandas_object(transactions.iloc[:length], index=False).to_numpy()
+    changed = np.flatnonzero(previousHashes != hashes)
+    return int(changed[0]) if len(changed) else length
+
+class CheckpointedReplay:
+    # Replays decoded transactions keeping a fork of the portfolio every interval transactions, so after an edit only the
+    # transactions from the last checkpoint before the first change are replayed. Forks share holdings and events, so a
+    # checkpoint costs little more than the books changed since the one before it
+    interval = 1000
+
+    def __init__(self, interval: int | None = None):
+        self.interval = interval or self.interval
+        self.transactions = pd.DataFrame()
+        self.positions = [0]
+        self.checkpoints = [Portfolio()]
+        self.start = 0 # Position the last replay started from
+
+    def replay(self, transactions: pd.DataFrame, cancelled: Callable[[], bool] = lambda: False) -> Portfolio | None:
+        # Portfolio after every transaction, None if cancelled part way, in which case the checkpoints are left as they were
+        keep = bisect.bisect_right(self.positions, firstChange(self.transactions, transactions))
+        positions, checkpoints = self.positions[:keep], self.checkpoints[:keep]
+        self.start = positions[-1]
+        portfolio = checkpoints[-1].fork()
+        for start in range(self.start, len(transactions), self.interval):
+            if cancelled():
+                return None
+            end = min(start + self.interval, len(transactions))
+            portfolio.readTransactions(transactions.iloc[start:end])
+            positions.append(end)
+            checkpoints.append(portfolio.fork())
+        self.transactions, self.positions, self.checkpoints = transactions, positions, checkpoints
+        return portfolio
+
+class LiveRecalculation:
+    # Recalculates edited transaction tables on one background thread, each submit supersedes the runs before it
+    # A superseded run stops at its next checkpoint and its result is never delivered, so finished is only called with the
+    # latest table's result, or with the Exception that stopped it. finished is called on the background thread
+    def __init__(self, finished: Callable[[int, object], None], interval: int | None = None):
+        self.finished = finished
+        self.replay = CheckpointedReplay(interval)
+        self.generation = 0
+        self.executor = ThreadPoolExecutor(max_workers = 1) # Runs share the checkpoints, so only one runs at a time
+
+    def submit(self, table: pd.DataFrame) -> int:
+        # table is the transaction table as readData takes it, returns the run's generation
+        self.generation += 1
+        self.executor.submit(self.run, self.generation, table)
+        return self.generation
+
+    def cancel(self):
+        self.generation += 1
+
+    def reset(self):
+        # Drops the checkpoints once no more edits are expected
+        self.cancel()
+        self.executor.submit(self.clearCheckpoints)
+
+    def clearCheckpoints(self):
+        self.replay = CheckpointedReplay(self.replay.interval)
+
+    def current(self, generation: int) -> bool:
+        return generation == self.generation
+
+    def run(self, generation: int, table: pd.DataFrame):
+        if not self.current(generation):
+            return
+        try:
+            result = self.calculate(table, lambda: not self.current(generation))
+        except Exception as error:
+            result = error
+        if result is not None and self.current(generation):
+            self.finished(generation, result)
+
+    def calculate(self, table: pd.DataFrame, cancelled: Callable[[], bool]) -> tuple[TransactionHistory, Portfolio, pd.DataFrame, pd.DataFrame, int] | None:
+        # Decoded transactions, portfolio, CGT events, consolidated holdings and the position the replay started from
+        transactionHistory = TransactionHistory()
+        transactionHistory.readData(table)
+        checkTransactions(transactionHistory.transactions)
+        portfolio = self.replay.replay(transactionHistory.transactions, cancelled)
+        if portfolio is None:
+            return None
+        return transactionHistory, portfolio, portfolio.taxableTransactions, portfolio.consolidatePortfolio(), self.replay.start
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'Times recalculation of a transaction history CSV after an edit, in full and from the last checkpoint')
+    parser.add_argument('file', help = 'transaction history CSV')
+    parser.add_argument('--row', type = int, help = 'row whose quantity is edited, the last row by default')
+    parser.add_argument('--interval', type = int, default = CheckpointedReplay.interval, help = 'transactions between checkpoints')
+    args = parser.parse_args()
+
+    transactionHistory = TransactionHistory()
+    transactionHistory.readData(pd.read_csv(args.file))
+    transactions = transactionHistory.transactions
+    replay = CheckpointedReplay(args.interval)
+    start = time.perf_counter()
+    replay.replay(transactions)
+    print(f'{len(transactions)} transactions replayed in {time.perf_counter() - start:.3f}s')
+
+    row = len(transactions) - 1 if args.row is None else args.row
+    edited = transactions.copy()
+    edited.loc[row, 'Quantity'] += 1
+    start = time.perf_counter()
+    portfolio = replay.replay(edited)
+    print(f'Row {row} edited, replayed from transaction {replay.start} in {time.perf_counter() - start:.3f}s, {len(portfolio.taxEvents)} CGT events') # type: ignore
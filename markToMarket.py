@@ -0,0 +1,77 @@
+from pandasCGcalc import TransactionHistory, Portfolio
+import datetime as dt
+import numpy as np
+import pandas as pd
+import argparse
+
+valuationColumns = ['Price', 'PriceDate', 'MarketValue', 'UnrealizedGain', 'DiscountedGain']
+assetColumnNames = ['AssetIdentifier', 'AssetID', 'Ticker', 'Symbol']
+priceColumnNames = ['Price', 'Close', 'AdjClose', 'Adj Close']
+
+def readPrices(path: str) -> pd.DataFrame:
+    # End of day prices from a CSV or Parquet file as Date, AssetIdentifier, OptionID and Price, sorted by date for as-of joins
+    # Option prices are matched on OptionID when the file has that column, rows without one price shares
+    if path.lower().endswith(('.parquet', '.pq')):
+        try:
+            prices = pd.read_parquet(path)
+        except ImportError:
+            raise Exception('Reading Parquet price files needs pyarrow, install it with "pip install pyarrow"')
+    else:
+        prices = pd.read_csv(path, dtype={'OptionID': str})
+    assetColumn = next((column for column in assetColumnNames if column in prices.columns), None)
+    priceColumn = next((column for column in priceColumnNames if column in prices.columns), None)
+    if assetColumn is None or priceColumn is None or 'Date' not in prices.columns:
+        raise Exception(f'Price file needs Date, one of {", ".join(assetColumnNames)} and one of {", ".join(priceColumnNames)} columns')
+    dates = prices['Date']
+    if not pd.api.types.is_datetime64_any_dtype(dates):
+        # Same date formats as transaction histories, each distinct date decoded once
+        transactionHistory = TransactionHistory()
+        dates = dates.astype(str).map({date: transactionHistory.decodeDate(date) for date in dates.astype(str).unique()})
+    prices = pd.DataFrame({
+        'Date': np.array(dates.tolist(), dtype='datetime64[D]').astype('datetime64[s]'),
+        'AssetIdentifier': prices[assetColumn].astype(str).to_numpy(),
+        'OptionID': prices['OptionID'].fillna('').astype(str).to_numpy() if 'OptionID' in prices.columns else '',
+        'Price': pd.to_numeric(prices[priceColumn].astype(str).str.replace(',', '', regex=False), errors='coerce').to_numpy(),
+    })
+    return prices.dropna(subset=['Price']).sort_values('Date', kind='stable', ignore_index=True)
+
+def markToMarket(holdings: pd.DataFrame, prices: pd.DataFrame, date: dt.date, discount: float = 0.5) -> pd.DataFrame:
+    # Values consolidated holdings at the last price on or before date, as one as-of join of all holdings against the price table
+    # Unpriced holdings are left as NaN, gains on holdings marked Discountable are reduced by the CGT discount
+    holdings = holdings.copy()
+    if holdings.empty:
+        for column in valuationColumns:
+            holdings[column] = pd.Series(dtype='datetime64[s]' if column == 'PriceDate' else float)
+        return holdings
+    keys = pd.DataFrame({
+        'Row': np.arange(len(holdings)),
+        'Date': np.full(len(holdings), np.datetime64(date, 's')),
+        'AssetIdentifier': holdings['AssetIdentifier'].astype(str).to_numpy(),
+        'OptionID': holdings['OptionID'].astype(str).to_numpy(),
+    })
+    priced = pd.merge_asof(keys, prices.rename(columns={'Date': 'PriceDate'}), left_on='Date', right_on='PriceDate', by=['AssetIdentifier', 'OptionID'], direction='backward')
+    priced = priced.sort_values('Row')
+    price = priced['Price'].to_numpy(dtype=float)
+    marketValue = holdings['Quantity'].to_numpy() * price
+    unrealized = marketValue - holdings['Value'].to_numpy()
+    holdings['Price'] = price
+    holdings['PriceDate'] = priced['PriceDate'].to_numpy()
+    holdings['MarketValue'] = marketValue
+    holdings['UnrealizedGain'] = unrealized
+    holdings['DiscountedGain'] = np.where(holdings['Discountable'].to_numpy(dtype=bool) & (unrealized > 0), unrealized * (1 - discount), unrealized)
+    return holdings
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'Values the holdings from a transaction history against a local end of day price file')
+    parser.add_argument('transactions', help = 'transaction history CSV')
+    parser.add_argument('prices', help = 'price CSV or Parquet file with Date, AssetID and Close columns')
+    parser.add_argument('--date', type = dt.date.fromisoformat, default = dt.date.today(), help = 'valuation date, YYYY-MM-DD')
+    args = parser.parse_args()
+
+    transactionHistory = TransactionHistory()
+    transactionHistory.readData(pd.read_csv(args.transactions))
+    portfolio = Portfolio()
+    portfolio.readTransactions(transactionHistory.transactions)
+    valued = markToMarket(portfolio.holdingsAsOf(args.date), readPrices(args.prices), args.date)
+    print(valued.to_string(index = False))
+    print(f"Market value {valued['MarketValue'].sum():,.2f}, unrealized gain {valued['UnrealizedGain'].sum():,.2f}, after discount {valued['DiscountedGain'].sum():,.2f}")
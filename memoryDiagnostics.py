@@ -0,0 +1,99 @@
+from pandasCGcalc import TransactionHistory, Portfolio
+from workpaperExport import writeWorkpaper
+from contextlib import contextmanager, nullcontext
+import pandas as pd
+import argparse
+import json
+import os
+import tempfile
+import tracemalloc
+
+pipelineStages = ['import', 'decode', 'replay', 'consolidation', 'export']
+
+class MemoryProfile:
+    # Peak and retained traced memory per pipeline stage, plus deep DataFrame sizes of what each stage produced
+    # tracemalloc is started by the first stage and runs until stop()
+    def __init__(self):
+        self.stages = {}
+
+    @contextmanager
+    def stage(self, name: str):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+        before, _ = tracemalloc.get_traced_memory()
+        frames = {}
+        try:
+            yield frames
+        finally:
+            after, peak = tracemalloc.get_traced_memory()
+            # Sized after the stage so memory_usage's own allocations are not counted against it
+            frameBytes = {frameName: int(frame.memory_usage(index=True, deep=True).sum()) for frameName, frame in frames.items()}
+            self.stages[name] = {'peakBytes': peak - before, 'retainedBytes': after - before, 'frameBytes': frameBytes}
+
+    def stop(self):
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+    def peakBytes(self) -> int:
+        return max((stats['peakBytes'] for stats in self.stages.values()), default=0)
+
+    def report(self) -> pd.DataFrame:
+        rows = []
+        for name, stats in self.stages.items():
+            rows.append({'Stage': name,
+                         'PeakMB': stats['peakBytes'] / 2**20,
+                         'RetainedMB': stats['retainedBytes'] / 2**20,
+                         'FramesMB': sum(stats['frameBytes'].values()) / 2**20,
+                         'Frames': ', '.join(f'{frameName} {size / 2**20:,.2f}MB' for frameName, size in stats['frameBytes'].items())})
+        return pd.DataFrame(rows, columns=['Stage', 'PeakMB', 'RetainedMB', 'FramesMB', 'Frames'])
+
+    def toDict(self) -> dict:
+        return {name: dict(stats) for name, stats in self.stages.items()}
+
+def memoryStage(profile: MemoryProfile | None, name: str):
+    return profile.stage(name) if profile is not None else nullcontext({})
+
+def runMemoryDiagnostics(source: str | pd.DataFrame, exportFile: str | None = None) -> MemoryProfile:
+    # Runs the full import, decode, replay, consolidation and export pipeline over a CSV file or raw transactions frame
+    profile = MemoryProfile()
+    try:
+        with profile.stage('import') as frames:
+            raw = pd.read_csv(source) if isinstance(source, str) else source.copy()
+            frames['raw'] = raw
+        with profile.stage('decode') as frames:
+            transactionHistory = TransactionHistory()
+            transactionHistory.readData(raw)
+            frames['transactions'] = transactionHistory.transactions
+        del raw
+        with profile.stage('replay') as frames:
+            portfolio = Portfolio()
+            portfolio.readTransactions(transactionHistory.transactions)
+            frames['holdings'] = portfolio.parcelTable()
+            frames['taxableTransactions'] = portfolio.taxableTransactions
+        with profile.stage('consolidation') as frames:
+            frames['consolidatedPortfolio'] = portfolio.consolidatePortfolio()
+            frames['consolidatedByDate'] = portfolio.filterTaxTransactions(portfolio.taxableTransactions, consolidationLevel = 1)
+            frames['consolidatedByAsset'] = portfolio.filterTaxTransactions(portfolio.taxableTransactions, consolidationLevel = 2)
+        with profile.stage('export'):
+            if exportFile:
+                writeWorkpaper(exportFile, transactionHistory.transactions, portfolio.taxableTransactions)
+            else:
+                with tempfile.TemporaryDirectory() as directory:
+                    writeWorkpaper(os.path.join(directory, 'diagnostics.xlsx'), transactionHistory.transactions, portfolio.taxableTransactions)
+    finally:
+        profile.stop()
+    return profile
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'Reports peak and retained memory for each stage of the capital gains pipeline')
+    parser.add_argument('file', help = 'transaction history CSV')
+    parser.add_argument('--export', help = 'workpaper file to write, a temporary file is used otherwise')
+    parser.add_argument('--json', help = 'write the stage figures to this file')
+    args = parser.parse_args()
+
+    profile = runMemoryDiagnostics(args.file, args.export)
+    print(profile.report().to_string(index = False))
+    if args.json:
+        with open(args.json, 'w') as file:
+            json.dump(profile.toDict(), file, indent = 4)
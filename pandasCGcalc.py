@@ -1,11 +1,16 @@
 import datetime as dt
-from dateutil.relativedelta import relativedelta
+import bisect
+from contextlib import contextmanager, nullcontext
+from typing import Iterable, Iterator
 from enum import Enum
-import xlrd
 import pandas as pd
+import numpy as np
+import json
 import re
+import time
 
 pd.options.display.float_format = '{:,.2f}'.format
+engineVersion = 1 # Raise whenever replay gives different results for the same transactions, cached results from other versions are not used
 
 class TransactionType(Enum):
     Purchase = 1
@@ -18,21 +23,10 @@ class TransactionType(Enum):
     LIFO_Sale = 8
     HighestGain_Sale = 9
     LowestGain_Sale = 10
+    Optimized_Sale = 11
 
     def __lt__(self, other):
-        custom_order = {
-            TransactionType.Purchase: 1,
-            TransactionType.FIFO_Sale: 2,
-            TransactionType.Option_Sale: 3,
-            TransactionType.Split: 4,
-            TransactionType.Merge: 5,
-            TransactionType.Exercise: 6,
-            TransactionType.Expire: 7,
-            TransactionType.LIFO_Sale: 8,
-            TransactionType.HighestGain_Sale: 9,
-            TransactionType.LowestGain_Sale: 10,
-        }
-        return custom_order[self] < custom_order[other]
+        return self.value < other.value # Members are numbered in sort order
 
     def __str__(self):
         return self.name
@@ -42,34 +36,115 @@ class AssetType(Enum):
     Share = 2
     
     def __lt__(self, other):
-        custom_order = {
-            AssetType.Option: 1,
-            AssetType.Share: 2,
-        }
-        return custom_order[self] < custom_order[other]
+        return self.value < other.value
     
     def __str__(self):
         return self.name
 
-class TransactionHistory():
+# Enum columns are stored as ordered categoricals, sorting and grouping compare the integer codes rather than calling __lt__
+transactionTypeCategories = pd.CategoricalDtype(list(TransactionType), ordered=True)
+assetTypeCategories = pd.CategoricalDtype(list(AssetType), ordered=True)
+identifierColumns = ['AssetID', 'OptionID', 'OptionSplitID']
+
+class EngineProfile:
+    # Call counts, cumulative wall time and peak holdings per transaction handler and decode stage
+    # Pass an instance to TransactionHistory or Portfolio to enable, engines without one skip all timing
     def __init__(self):
+        self.handlers = {}
+        self.stages = {}
+        self.traceEvents = []
+        self.origin = time.perf_counter()
+
+    def recordHandler(self, name: str, start: float, end: float, holdings: int):
+        stats = self.handlers.setdefault(name, {'calls': 0, 'seconds': 0.0, 'peakHoldings': 0})
+        stats['calls'] += 1
+        stats['seconds'] += end - start
+        stats['peakHoldings'] = max(stats['peakHoldings'], holdings)
+        self.addTraceEvent(name, 'readTransactions', start, end, {'holdings': holdings})
+
+    @contextmanager
+    def stage(self, name: str, category: str = 'readData'):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            end = time.perf_counter()
+            stats = self.stages.setdefault(name, {'calls': 0, 'seconds': 0.0})
+            stats['calls'] += 1
+            stats['seconds'] += end - start
+            self.addTraceEvent(name, category, start, end)
+
+    def addTraceEvent(self, name: str, category: str, start: float, end: float, args: dict | None = None):
+        self.traceEvents.append((name, category, start, end, args))
+
+    def report(self) -> pd.DataFrame:
+        rows = [{'Category': 'Handler', 'Name': name, **stats} for name, stats in self.handlers.items()]
+        rows += [{'Category': 'Stage', 'Name': name, **stats, 'peakHoldings': None} for name, stats in self.stages.items()]
+        return pd.DataFrame(rows, columns=['Category', 'Name', 'calls', 'seconds', 'peakHoldings'])
+
+    def toChromeTrace(self) -> dict:
+        # Trace event format, loads in chrome://tracing and Perfetto
+        events = []
+        for name, category, start, end, args in self.traceEvents:
+            timestamp = (start - self.origin) * 1e6
+            events.append({'name': name, 'cat': category, 'ph': 'X', 'ts': timestamp, 'dur': (end - start) * 1e6, 'pid': 1, 'tid': 1, 'args': args or {}})
+            if args and 'holdings' in args:
+                events.append({'name': 'holdings', 'ph': 'C', 'ts': timestamp, 'pid': 1, 'tid': 1, 'args': {'parcels': args['holdings']}})
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+    def saveChromeTrace(self, fileName: str):
+        with open(fileName, 'w') as file:
+            json.dump(self.toChromeTrace(), file)
+
+def profileStage(profile: EngineProfile | None, name: str, category: str = 'readData'):
+    return profile.stage(name, category) if profile is not None else nullcontext()
+
+class TransactionHistory():
+    def __init__(self, profile: EngineProfile | None = None):
         self.transactions = pd.DataFrame(columns=['Date', 'AssetType', 'AssetID', 'TransactionType', 'Quantity', 'Value', 'OptionID', 'OptionSplitID'])
+        self.profile = profile
     
     def readData(self, transactions: pd.DataFrame):
         self.transactions = transactions
-        self.transactions['AssetType'] = self.transactions['AssetType'].map(self.decodeAssetType)
-        self.transactions['TransactionType'] = self.transactions.apply(lambda row: self.decodeTransactionType(row['TransactionType'], row['AssetType']), axis=1)
-        self.transactions['Date'] = self.transactions['Date'].map(self.decodeDate)
-        if type(self.transactions['Quantity'][0]) == str:
-            self.transactions['Quantity'] = self.transactions['Quantity'].str.replace(',', '', regex=True).astype('float')
-        else:
-            self.transactions['Quantity'] = self.transactions['Quantity'].astype('float')
-        if type(self.transactions['Value'][0]) == str:
-            self.transactions['Value'] = self.transactions['Value'].str.replace(',', '', regex=True).astype('float')
-        else:
-            self.transactions['Value'] = self.transactions['Value'].astype('float')
-        self.transactions.fillna('', inplace = True)
-        self.transactions = self.sortByDate(self.transactions)
+        with profileStage(self.profile, 'decodeAssetType'):
+            # Each distinct spelling is decoded once, then mapped across the column
+            assetTypes = self.transactions['AssetType']
+            self.transactions['AssetType'] = assetTypes.map({type: self.decodeAssetType(type) for type in assetTypes.unique()}).astype(assetTypeCategories)
+        with profileStage(self.profile, 'decodeTransactionType'):
+            typePairs = pd.Series(list(zip(self.transactions['TransactionType'], self.transactions['AssetType'])), index=self.transactions.index)
+            decoded = {pair: self.decodeTransactionType(*pair)[0] for pair in typePairs.unique()}
+            self.transactions['TransactionType'] = typePairs.map(decoded).astype(transactionTypeCategories)
+        with profileStage(self.profile, 'decodeDate'):
+            dates = self.transactions['Date']
+            decoded = dates.map({date: self.decodeDate(date) for date in dates.unique()})
+            self.transactions['Date'] = np.array(decoded.tolist(), dtype='datetime64[D]')
+        with profileStage(self.profile, 'decodeNumbers'):
+            if type(self.transactions['Quantity'][0]) == str:
+                self.transactions['Quantity'] = self.transactions['Quantity'].str.replace(',', '', regex=True).astype('float')
+            else:
+                self.transactions['Quantity'] = self.transactions['Quantity'].astype('float')
+            if type(self.transactions['Value'][0]) == str:
+                self.transactions['Value'] = self.transactions['Value'].str.replace(',', '', regex=True).astype('float')
+            else:
+                self.transactions['Value'] = self.transactions['Value'].astype('float')
+            for column in identifierColumns:
+                # An identifier column left empty throughout reads in as float, which cannot hold ''
+                self.transactions[column] = self.transactions[column].astype(object).fillna('').astype('category')
+        with profileStage(self.profile, 'sortByDate'):
+            self.transactions = self.sortByDate(self.transactions)
+    
+    def appendData(self, transactions: pd.DataFrame) -> pd.DataFrame:
+        # Decodes rows read after the existing transactions and adds them, returns just the decoded rows
+        existing = self.transactions
+        self.readData(transactions)
+        appended = self.transactions
+        self.transactions = pd.concat([existing, appended], ignore_index=True) if len(existing) else appended
+        for column in identifierColumns:
+            # Frames with different categories concatenate to plain values
+            self.transactions[column] = self.transactions[column].astype(object).astype('category')
+        if len(existing) and len(appended) and sortKey(appended.iloc[0]) < sortKey(existing.iloc[-1]):
+            self.transactions = self.sortByDate(self.transactions)
+        return appended
     
     def decodeAssetType(self, type: str) -> AssetType:
         type = type.lower()
@@ -132,6 +207,7 @@ class TransactionHistory():
                 year, month, day = re.split('/|-', date)
                 return dt.date(int(year), int(month), int(day))
             except:
+                import xlrd # Only needed for excel serial dates, so not imported at startup
                 year, month, day, *rest = xlrd.xldate_as_tuple(int(float(date)), 0)
                 return dt.date(year, month, day)
         except:
@@ -146,311 +222,674 @@ class TransactionHistory():
     def filterByDate(self, transactions: pd.DataFrame, startDate: dt.date | None = None, endDate: dt.date | None = None):
         filteredTransactions = transactions
         if (startDate) and (endDate):
-            filteredTransactions = transactions[(transactions['Date'] >= startDate) & (transactions['Date'] <= endDate)]
+            filteredTransactions = transactions[(transactions['Date'] >= toDay(startDate)) & (transactions['Date'] <= toDay(endDate))]
         return filteredTransactions
     
-class Portfolio:
+taxableColumns = ['Date', 'AssetID', 'AssetType', 'TransactionType', 'Quantity', 'AcquisitionDate', 'Proceeds', 'CostBase', 'GrossValue', 'Discountable']
+moneyColumns = ['Proceeds', 'CostBase', 'GrossValue']
+shareSaleTypes = [TransactionType.FIFO_Sale, TransactionType.LIFO_Sale, TransactionType.HighestGain_Sale, TransactionType.LowestGain_Sale]
+saleMethods = {
+    'FIFO': TransactionType.FIFO_Sale,
+    'LIFO': TransactionType.LIFO_Sale,
+    'HighestGain': TransactionType.HighestGain_Sale,
+    'LowestGain': TransactionType.LowestGain_Sale,
+}
+
+def sortKey(transaction: pd.Series) -> tuple:
+    # Position of a decoded transaction in TransactionHistory.sortByDate order
+    return toDay(transaction['Date']), transaction['AssetType'].value
+
+def toDay(date) -> np.datetime64:
+    # Engine dates are datetime64[D], frames hold them as datetime64[s] as pandas has no day resolution
+    return np.datetime64(date, 'D')
+
+def toDate(day: np.datetime64 | None) -> dt.date | None:
+    return None if day is None else day.astype(object)
+
+def shiftYears(days: np.ndarray | np.datetime64, years: int) -> np.ndarray:
+    # Calendar year shift clipped to the end of the month, 29/2 less a year is 28/2 as with relativedelta
+    days = np.asarray(days, dtype='datetime64[D]')
+    months = days.astype('datetime64[M]') + 12 * years
+    monthDays = (months + 1).astype('datetime64[D]') - months.astype('datetime64[D]')
+    dayOfMonth = days - days.astype('datetime64[M]').astype('datetime64[D]')
+    return months.astype('datetime64[D]') + np.minimum(dayOfMonth, monthDays - 1)
+
+def toCents(value: float) -> int:
+    return int(round(value * 100))
+
+def seriesToCents(values: pd.Series) -> pd.Series:
+    return pd.Series(np.rint(values.astype('float') * 100).astype(np.int64), index=values.index)
+
+def netCapitalGain(discountableCents: int, otherCents: int, lossCents: int, discount: float = 0.5) -> int:
+    # Losses (negative) are offset against non-discountable gains first, then discountable gains, before the discount applies
+    # A negative result is the loss left to carry forward
+    losses = -lossCents
+    otherOffset = min(losses, otherCents)
+    discountableOffset = min(losses - otherOffset, discountableCents)
+    remainingLoss = losses - otherOffset - discountableOffset
+    return (otherCents - otherOffset) + round((discountableCents - discountableOffset) * (1 - discount)) - remainingLoss
+
+def eventTotals(events: list) -> tuple[int, int, int]:
+    # Discountable gains, other gains and losses (negative) in cents
+    discountable = sum(event.grossValue for event in events if event.discountable == True)
+    losses = sum(event.grossValue for event in events if event.discountable == 'Loss')
+    return discountable, sum(event.grossValue for event in events) - discountable - losses, losses
+
+def eventsNetGain(events: list, carriedLossCents: int = 0) -> int:
+    # Net capital gain in cents of a set of CGT events, after applying carried forward losses
+    discountable, other, losses = eventTotals(events)
+    return netCapitalGain(discountable, other, losses - carriedLossCents)
+
+def allocateCents(cents: int, part: float, whole: float) -> int:
+    # Exact share of a cent amount for part of a parcel, rounded half up, remaining parcel keeps the rest so nothing drifts
+    if part == whole:
+        return cents
+    if part == int(part) and whole == int(whole):
+        return (2 * cents * int(part) + int(whole)) // (2 * int(whole))
+    return int(round(cents * part / whole))
+
+class ParcelBook:
+    # Parcels held for one asset in acquisition order, cost bases in int64 cents
+    # Arrays are replaced rather than written in place, so forked books can share them safely
+    # Books written through Portfolio.book carry the portfolio's HoldingsSummary and their key, and record each change to it
+    summary = None
+    key = None
+
     def __init__(self):
-        self.assets = pd.DataFrame(columns=['AssetType', 'AssetIdentifier', 'PurchaseDate', 'Value', 'OptionID'])
-        self.taxableTransactions = pd.DataFrame(columns=['Date', 'AssetID', 'AssetType', 'TransactionType', 'Quantity', 'AcquisitionDate', 'Proceeds', 'CostBase', 'GrossValue', 'Discountable'])
+        self.purchaseDates = np.empty(0, dtype='datetime64[D]')
+        self.quantities = np.empty(0, dtype=np.int64)
+        self.cents = np.empty(0, dtype=np.int64)
+        self.optionIDs = np.empty(0, dtype=object)
+        self.sequences = np.empty(0, dtype=np.int64)
+
+    def __len__(self):
+        return len(self.quantities)
+
+    def fork(self) -> 'ParcelBook':
+        forked = ParcelBook.__new__(ParcelBook)
+        forked.purchaseDates, forked.quantities, forked.cents, forked.optionIDs, forked.sequences = self.purchaseDates, self.quantities, self.cents, self.optionIDs, self.sequences
+        return forked
+
+    def append(self, purchaseDates: list, quantities: list, cents: list, optionIDs: list, sequences: list):
+        self.purchaseDates = np.concatenate([self.purchaseDates, np.array(purchaseDates, dtype='datetime64[D]')])
+        self.quantities = np.concatenate([self.quantities, np.array(quantities, dtype=np.int64)])
+        self.cents = np.concatenate([self.cents, np.array(cents, dtype=np.int64)])
+        self.optionIDs = np.concatenate([self.optionIDs, np.array(optionIDs, dtype=object)])
+        self.sequences = np.concatenate([self.sequences, np.array(sequences, dtype=np.int64)])
+        if self.summary is not None:
+            self.summary.adjust(self.key, optionIDs, purchaseDates, quantities, cents)
+
+    def keep(self, mask: np.ndarray):
+        self.purchaseDates = self.purchaseDates[mask]
+        self.quantities = self.quantities[mask]
+        self.cents = self.cents[mask]
+        self.optionIDs = self.optionIDs[mask]
+        self.sequences = self.sequences[mask]
+
+    def select(self, optionID: str | None = None) -> np.ndarray:
+        if optionID is None:
+            return np.arange(len(self))
+        return np.flatnonzero(self.optionIDs == optionID)
+
+    def consume(self, order: np.ndarray, quantity: int) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        # Takes up to quantity units from parcels in the given order, a partly consumed parcel gives up its exact proportional cost base
+        # Returns purchase dates, units and cents taken from each parcel used
+        available = self.quantities[order]
+        before = np.cumsum(available) - available
+        taken = np.clip(quantity - before, 0, available)
+        used = taken > 0
+        return self.take(order[used], taken[used])
+
+    def take(self, order: np.ndarray, taken: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        # Takes the given number of units from each parcel listed
+        available = self.quantities[order]
+        takenCents = self.cents[order].copy()
+        for i in np.flatnonzero(taken < available):
+            takenCents[i] = allocateCents(int(takenCents[i]), int(taken[i]), int(available[i]))
+        purchaseDates = self.purchaseDates[order]
+        self.quantities = self.quantities.copy()
+        self.cents = self.cents.copy()
+        self.quantities[order] -= taken
+        self.cents[order] -= takenCents
+        if self.summary is not None:
+            self.summary.adjust(self.key, self.optionIDs[order], purchaseDates, (-taken).tolist(), (-takenCents).tolist())
+        if (self.quantities[order] == 0).any():
+            self.keep(self.quantities > 0)
+        return purchaseDates, taken, takenCents
+
+    def remove(self, indices: np.ndarray):
+        if self.summary is not None:
+            self.summary.adjust(self.key, self.optionIDs[indices], self.purchaseDates[indices], (-self.quantities[indices]).tolist(), (-self.cents[indices]).tolist())
+        mask = np.ones(len(self), dtype=bool)
+        mask[indices] = False
+        self.keep(mask)
+
+class Holdings:
+    # Persistent map of (AssetType, identifier) to ParcelBook with O(1) snapshots
+    # A snapshot freezes the current layer and shares it, books found in a frozen layer are forked on first write,
+    # so a fork only costs memory for the books it changes, and within those only for the arrays replaced
+    maxDepth = 16
+
+    def __init__(self, parent: 'Holdings | None' = None):
+        self.layer = {}
+        self.parent = parent
+        self.depth = parent.depth + 1 if parent is not None else 0
+
+    def find(self, key: tuple) -> ParcelBook | None:
+        holdings = self
+        while holdings is not None:
+            if key in holdings.layer:
+                return holdings.layer[key]
+            holdings = holdings.parent
+        return None
+
+    def get(self, key: tuple) -> ParcelBook | None:
+        # Read only, the book returned must not be changed
+        return self.find(key)
+
+    def __contains__(self, key: tuple) -> bool:
+        return self.find(key) is not None
+
+    def bookForWrite(self, key: tuple) -> ParcelBook:
+        if key not in self.layer:
+            book = self.find(key)
+            self.layer[key] = book.fork() if book is not None else ParcelBook()
+        return self.layer[key]
+
+    def items(self) -> list:
+        layers = []
+        holdings = self
+        while holdings is not None:
+            layers.append(holdings.layer)
+            holdings = holdings.parent
+        merged = {}
+        for layer in reversed(layers):
+            merged.update(layer)
+        return list(merged.items())
+
+    def values(self) -> list:
+        return [book for key, book in self.items()]
+
+    def snapshot(self) -> 'Holdings':
+        # Both this map and the one returned carry on from the same frozen contents
+        frozen = Holdings.__new__(Holdings)
+        frozen.layer, frozen.parent, frozen.depth = self.layer, self.parent, self.depth
+        if frozen.depth >= self.maxDepth:
+            # Flatten long chains so lookups stay short, the flattened layer is still shared and frozen
+            frozen.layer, frozen.parent, frozen.depth = dict(self.items()), None, 0
+        self.layer, self.parent, self.depth = {}, frozen, frozen.depth + 1
+        return type(self)(frozen)
+
+class HoldingsSummary(Holdings):
+    # Units and cents held per (AssetIdentifier, AssetType, OptionID, PurchaseDate), kept up to date by the parcel books as they change
+    # Layered like Holdings so a forked portfolio shares it, groups sold out are held as None until the layers are flattened
+    cached = None
+    log = None # Changes are also appended here as (group, units, cents) while a HoldingsHistory is recording them
+
+    def adjust(self, key: tuple, optionIDs: Iterable, purchaseDates: Iterable, quantities: list, cents: list):
+        # Purchase dates are datetime64[D], units and cents python ints
+        assetType, assetIdentifier = key
+        layer = self.layer
+        for optionID, purchaseDate, quantity, groupCents in zip(optionIDs, purchaseDates, quantities, cents):
+            group = (assetIdentifier, assetType, optionID, purchaseDate)
+            held = layer[group] if group in layer else self.find(group)
+            if held is None:
+                layer[group] = (quantity, groupCents)
+            else:
+                layer[group] = (held[0] + quantity, held[1] + groupCents) if held[0] + quantity else None
+            if self.log is not None:
+                self.log.append((group, quantity, groupCents))
+        self.cached = None
+
+    def apply(self, changes: list):
+        for group, quantity, groupCents in changes:
+            held = self.find(group)
+            if held is None:
+                self.layer[group] = (quantity, groupCents)
+            else:
+                self.layer[group] = (held[0] + quantity, held[1] + groupCents) if held[0] + quantity else None
+        self.cached = None
+
+    def items(self) -> list:
+        return [(group, held) for group, held in super().items() if held is not None]
+
+    def frame(self) -> pd.DataFrame:
+        # One row per group, in the order a groupby over the parcels would give
+        if self.cached is None:
+            items = self.items()
+            self.cached = pd.DataFrame({
+                'AssetIdentifier': pd.Categorical([group[0] for group, held in items]),
+                'AssetType': pd.Categorical([group[1] for group, held in items], dtype=assetTypeCategories),
+                'OptionID': pd.Series([group[2] for group, held in items], dtype=str),
+                'PurchaseDate': np.array([group[3] for group, held in items], dtype='datetime64[D]').astype('datetime64[s]'),
+                'Quantity': np.array([held[0] for group, held in items], dtype=np.int64),
+                'Cents': np.array([held[1] for group, held in items], dtype=np.int64),
+            }).sort_values(['AssetIdentifier', 'AssetType', 'OptionID', 'PurchaseDate'], ignore_index=True)
+        return self.cached.copy()
+
+class HoldingsHistory:
+    # Date indexed log of a portfolio's holdings summary, for holdings as at past dates
+    # The log is split into blocks of about interval changes, each starting with an O(1) snapshot of the summary taken at the start
+    # of a day, so holdings at any date are the snapshot before it plus at most one block of changes
+    interval = 256
+
+    def __init__(self):
+        self.days = [] # First day of each block
+        self.bases = [] # Summary before the block's first change
+        self.logs = [] # Changes in each block as (group, units, cents)
+        self.logDays = [] # Days with changes in each block, and where each day's changes start in the block's log
+        self.logStarts = []
+
+    def record(self, day: np.datetime64, summary: HoldingsSummary):
+        # Called before each transaction is applied, transactions are applied in date order
+        if not self.days or (day != self.logDays[-1][-1] and len(self.logs[-1]) >= self.interval):
+            self.days.append(day)
+            self.bases.append(summary.snapshot())
+            self.logs.append([])
+            self.logDays.append([])
+            self.logStarts.append([])
+            summary.log = self.logs[-1]
+        if not self.logDays[-1] or self.logDays[-1][-1] != day:
+            self.logDays[-1].append(day)
+            self.logStarts[-1].append(len(self.logs[-1]))
+
+    def fork(self, summary: HoldingsSummary) -> 'HoldingsHistory':
+        # History for a forked portfolio carrying on with summary, earlier blocks are shared and the current one is copied
+        forked = HoldingsHistory()
+        forked.days, forked.bases, forked.logs, forked.logDays, forked.logStarts = list(self.days), list(self.bases), list(self.logs), list(self.logDays), list(self.logStarts)
+        if self.days:
+            forked.logs[-1], forked.logDays[-1], forked.logStarts[-1] = list(self.logs[-1]), list(self.logDays[-1]), list(self.logStarts[-1])
+            summary.log = forked.logs[-1]
+        return forked
+
+    def asOf(self, day: np.datetime64) -> HoldingsSummary:
+        # Summary at the end of day
+        block = bisect.bisect_right(self.days, day) - 1
+        if block < 0:
+            return HoldingsSummary()
+        summary = HoldingsSummary(self.bases[block])
+        end = bisect.bisect_right(self.logDays[block], day)
+        summary.apply(self.logs[block][:self.logStarts[block][end]] if end < len(self.logStarts[block]) else self.logs[block])
+        return summary
+
+def groupByPurchaseDate(purchaseDates: np.ndarray, quantities: np.ndarray, cents: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    # Vectorised integer sums of units and cents per purchase date, dates ascending
+    dates, inverse = np.unique(purchaseDates, return_inverse=True)
+    groupQuantities = np.zeros(len(dates), dtype=np.int64)
+    groupCents = np.zeros(len(dates), dtype=np.int64)
+    np.add.at(groupQuantities, inverse, quantities)
+    np.add.at(groupCents, inverse, cents)
+    return dates, groupQuantities, groupCents
+
+class TaxEvent:
+    # One CGT event, slotted so sale-heavy histories don't build a ten key dict per event, money in cents
+    __slots__ = ('date', 'assetID', 'assetType', 'transactionType', 'quantity', 'acquisitionDate', 'proceeds', 'costBase', 'grossValue', 'discountable')
+
+    def __init__(self, date: np.datetime64, assetID: str, assetType: AssetType, transactionType: TransactionType, quantity: float, acquisitionDate: np.datetime64 | None, proceeds: int, costBase: int, discountable: bool | str):
+        self.date = date
+        self.assetID = assetID
+        self.assetType = assetType
+        self.transactionType = transactionType
+        self.quantity = quantity
+        self.acquisitionDate = acquisitionDate
+        self.proceeds = proceeds
+        self.costBase = costBase
+        self.grossValue = proceeds - costBase
+        self.discountable = discountable
+
+    def toDict(self) -> dict:
+        # Display boundary for single events, dollars keyed by taxable column
+        return {
+            'Date': toDate(self.date),
+            'AssetID': self.assetID,
+            'AssetType': self.assetType,
+            'TransactionType': self.transactionType,
+            'Quantity': self.quantity,
+            'AcquisitionDate': toDate(self.acquisitionDate),
+            'Proceeds': self.proceeds / 100,
+            'CostBase': self.costBase / 100,
+            'GrossValue': self.grossValue / 100,
+            'Discountable': self.discountable
+        }
+
+class HoldingsDelta:
+    # Change to one holding made by a transaction, units and cost base in cents
+    __slots__ = ('date', 'assetID', 'assetType', 'quantity', 'cents')
+
+    def __init__(self, date: np.datetime64, assetID: str, assetType: AssetType, quantity: int, cents: int):
+        self.date = date
+        self.assetID = assetID
+        self.assetType = assetType
+        self.quantity = quantity
+        self.cents = cents
+
+    def toDict(self) -> dict:
+        return {'Date': toDate(self.date), 'AssetID': self.assetID, 'AssetType': self.assetType, 'Quantity': self.quantity, 'Value': self.cents / 100}
+
+class TaxEventColumns:
+    # Columnar builder for recorded events, the taxable transactions frame is built from it in one step
+    # Event lists are append-only, a fork keeps (list, length) references to its parent's events instead of copying them
+    def __init__(self):
+        self.shared = []
+        self.events = []
+
+    def __len__(self):
+        return sum(length for events, length in self.shared) + len(self.events)
+
+    def extend(self, events: list):
+        self.events.extend(events)
+
+    def fork(self) -> 'TaxEventColumns':
+        forked = TaxEventColumns()
+        forked.shared = self.shared + [(self.events, len(self.events))]
+        return forked
+
+    def recorded(self) -> list:
+        return [event for events, length in self.shared for event in events[:length]] + self.events
+
+    def toFrame(self) -> pd.DataFrame:
+        events = self.recorded()
+        columns = {}
+        for column, attribute in zip(taxableColumns, TaxEvent.__slots__):
+            if column in moneyColumns:
+                columns[column] = np.fromiter((getattr(event, attribute) for event in events), dtype=np.int64, count=len(events)) / 100
+            elif column in ['Date', 'AcquisitionDate']:
+                columns[column] = np.array([getattr(event, attribute) for event in events], dtype='datetime64[D]')
+            else:
+                columns[column] = [getattr(event, attribute) for event in events]
+        frame = pd.DataFrame(columns, columns=taxableColumns)
+        frame['AssetID'] = frame['AssetID'].astype('category')
+        frame['AssetType'] = frame['AssetType'].astype(assetTypeCategories)
+        frame['TransactionType'] = frame['TransactionType'].astype(transactionTypeCategories)
+        return frame
+
+class Portfolio:
+    def __init__(self, profile: EngineProfile | None = None):
+        self.holdings = Holdings()
+        self.summary = HoldingsSummary()
+        self.history = HoldingsHistory()
+        self.taxEvents = TaxEventColumns()
+        self.taxableCache = None
         self.optionExercises = {}
+        self.nextSequence = 0
+        self.profile = profile
+
+    @property
+    def taxableTransactions(self) -> pd.DataFrame:
+        # Display boundary, taxable events are held in cents and converted to dollars here
+        if self.taxableCache is None:
+            self.taxableCache = self.taxEvents.toFrame()
+        return self.taxableCache
+
+    @property
+    def assets(self) -> pd.DataFrame:
+        # One row per unit held, each parcel's cents are spread over its units so the rows sum exactly to the cost base
+        parcels = self.parcelTable()
+        quantities = parcels['Quantity'].to_numpy()
+        cents = parcels['Cents'].to_numpy()
+        starts = np.cumsum(quantities) - quantities
+        unitIndex = np.arange(quantities.sum()) - np.repeat(starts, quantities)
+        unitCents = np.repeat(cents // np.maximum(quantities, 1), quantities) + (unitIndex < np.repeat(cents % np.maximum(quantities, 1), quantities))
+        units = parcels.loc[parcels.index.repeat(quantities), ['AssetType', 'AssetIdentifier', 'PurchaseDate', 'OptionID']].reset_index(drop=True)
+        units.insert(3, 'Value', unitCents / 100)
+        units['PurchaseDate'] = units['PurchaseDate'].dt.date # Per-unit view is for display, dates as dt.date
+        return units
+
+    def parcelTable(self) -> pd.DataFrame:
+        books = [(key, book) for key, book in self.holdings.items() if len(book)]
+        if not books:
+            return pd.DataFrame({'AssetType': pd.Series(dtype=object), 'AssetIdentifier': pd.Series(dtype=object), 'PurchaseDate': pd.Series(dtype='datetime64[s]'),
+                                 'Quantity': pd.Series(dtype=np.int64), 'Cents': pd.Series(dtype=np.int64), 'OptionID': pd.Series(dtype=object), 'Sequence': pd.Series(dtype=np.int64)})
+        parcels = pd.DataFrame({
+            'AssetType': pd.Categorical(np.concatenate([np.full(len(book), key[0], dtype=object) for key, book in books]), dtype=assetTypeCategories),
+            'AssetIdentifier': pd.Categorical(np.concatenate([np.full(len(book), key[1], dtype=object) for key, book in books])),
+            'PurchaseDate': np.concatenate([book.purchaseDates for key, book in books]),
+            'Quantity': np.concatenate([book.quantities for key, book in books]),
+            'Cents': np.concatenate([book.cents for key, book in books]),
+            'OptionID': np.concatenate([book.optionIDs for key, book in books]),
+            'Sequence': np.concatenate([book.sequences for key, book in books]),
+        })
+        return parcels.sort_values('Sequence', ignore_index=True)
+
+    def fork(self) -> 'Portfolio':
+        # Alternative timeline sharing this portfolio's holdings and events, changes on either side do not affect the other
+        forked = Portfolio()
+        forked.holdings = self.holdings.snapshot()
+        forked.summary = self.summary.snapshot()
+        forked.history = self.history.fork(forked.summary)
+        forked.taxEvents = self.taxEvents.fork()
+        forked.taxableCache = self.taxableCache
+        forked.optionExercises = dict(self.optionExercises)
+        forked.nextSequence = self.nextSequence
+        return forked
+
+    def holdingsSize(self) -> int:
+        return sum(len(book) for book in self.holdings.values())
+
+    def book(self, assetType: AssetType, assetIdentifier: str) -> ParcelBook:
+        book = self.holdings.bookForWrite((assetType, assetIdentifier))
+        book.summary, book.key = self.summary, (assetType, assetIdentifier)
+        return book
+
+    def recordEvents(self, events: list):
+        self.taxEvents.extend(events)
+        self.taxableCache = None
         
     def readTransactions(self, transactions: pd.DataFrame):
+        if self.profile is not None:
+            return self.readTransactionsProfiled(transactions)
         for index, transaction in transactions.iterrows():
-            transactionType = transaction['TransactionType']
-            if transactionType == TransactionType.Purchase:
-                self.purchase(transaction['AssetType'], transaction['AssetID'], transaction['Date'], transaction['Value'], transaction['Quantity'], transaction['OptionID'])
-                
-            elif transactionType == TransactionType.FIFO_Sale:
-                new_row = pd.DataFrame(self.fifoSale(transaction['AssetType'], transaction['AssetID'], transaction['Date'], transaction['Value'], transaction['Quantity']))
-                self.taxableTransactions = pd.concat(
-                    [self.taxableTransactions, new_row], ignore_index = True)
-            
-            elif transactionType == TransactionType.LIFO_Sale:
-                new_row = pd.DataFrame(self.lifoSale(transaction['AssetType'], transaction['AssetID'], transaction['Date'], transaction['Value'], transaction['Quantity']))
-                self.taxableTransactions = pd.concat(
-                    [self.taxableTransactions, new_row], ignore_index = True)
-                        
-            elif transactionType == TransactionType.Option_Sale:
-                new_row = pd.DataFrame(self.optionSale(transaction['AssetType'], transaction['AssetID'], transaction['Date'], transaction['Value'], transaction['Quantity'], optionID = transaction['OptionID']))
-                self.taxableTransactions = pd.concat(
-                    [self.taxableTransactions, new_row], ignore_index = True)
+            self.applyTransaction(transaction)
+
+    def streamEvents(self, transactions: pd.DataFrame | Iterable[pd.DataFrame], holdingsDeltas: bool = False, record: bool = True) -> Iterator[TaxEvent | HoldingsDelta]:
+        # Replays transactions lazily, yielding each CGT event as it happens and with holdingsDeltas a HoldingsDelta for each transaction
+        # that changes a holding. Transactions are a frame or decoded frames in date order, such as TransactionStore.query gives
+        # Without record events are only yielded, so taxableTransactions stays as it was and the events are not held
+        for frame in [transactions] if isinstance(transactions, pd.DataFrame) else transactions:
+            for index, transaction in frame.iterrows():
+                recorded = len(self.taxEvents.events)
+                book = self.holdings.get((transaction['AssetType'], transaction['AssetID'])) if holdingsDeltas else None
+                before = (int(book.quantities.sum()), int(book.cents.sum())) if book is not None else (0, 0)
+                self.applyTransaction(transaction)
+                yield from self.taxEvents.events[recorded:]
+                if not record and len(self.taxEvents.events) > recorded:
+                    del self.taxEvents.events[recorded:]
+                if holdingsDeltas:
+                    book = self.holdings.get((transaction['AssetType'], transaction['AssetID']))
+                    after = (int(book.quantities.sum()), int(book.cents.sum())) if book is not None else (0, 0)
+                    if after != before:
+                        yield HoldingsDelta(toDay(transaction['Date']), transaction['AssetID'], transaction['AssetType'], after[0] - before[0], after[1] - before[1])
+
+    def readTransactionsProfiled(self, transactions: pd.DataFrame):
+        for index, transaction in transactions.iterrows():
+            start = time.perf_counter()
+            self.applyTransaction(transaction)
+            self.profile.recordHandler(str(transaction['TransactionType']), start, time.perf_counter(), self.holdingsSize()) # type: ignore
+
+    def recordDate(self, date):
+        # Changes made from here on are logged under date, for holdingsAsOf
+        self.history.record(toDay(date), self.summary)
+
+    def applyTransaction(self, transaction: pd.Series):
+        self.recordDate(transaction['Date'])
+        transactionType = transaction['TransactionType']
+        if transactionType == TransactionType.Purchase:
+            self.purchase(transaction['AssetType'], transaction['AssetID'], transaction['Date'], transaction['Value'], transaction['Quantity'], transaction['OptionID'])
             
-            elif transactionType == TransactionType.Split:
-                self.split(transaction['AssetType'], transaction['AssetID'], transaction['Date'], transaction['Value'] / transaction['Quantity'], transaction['Quantity'], transaction['OptionID'], transaction['OptionSplitID'] )
+        elif transactionType in shareSaleTypes:
+            self.recordEvents(self.sellShares(transactionType, transaction['AssetType'], transaction['AssetID'], transaction['Date'], toCents(transaction['Value']), transaction['Quantity']))
+                    
+        elif transactionType == TransactionType.Option_Sale:
+            self.recordEvents(self.sellOptions(transaction['AssetType'], transaction['AssetID'], transaction['Date'], toCents(transaction['Value']), transaction['Quantity'], transaction['OptionID']))
         
-            elif transactionType == TransactionType.Merge:
-                self.merge(transaction['AssetType'], transaction['AssetID'], transaction['Date'], transaction['Value'] / transaction['Quantity'], transaction['Quantity'], transaction['OptionID'], transaction['OptionSplitID'] )
-        
-            elif transactionType == TransactionType.Exercise:
-                self.exercise(transaction['AssetType'], transaction['AssetID'], transaction['Date'], transaction['Value'] / transaction['Quantity'], transaction['Quantity'], transaction['OptionID'])
-
-            elif transactionType == TransactionType.Expire:
-                new_row = pd.DataFrame(self.expire(transaction['AssetType'], transaction['AssetID'], transaction['Date'], transaction['Value'] / transaction['Quantity'], transaction['Quantity'], transaction['OptionID']))
-                self.taxableTransactions = pd.concat(
-                    [self.taxableTransactions, new_row], ignore_index = True)
-                
-            elif transactionType == TransactionType.HighestGain_Sale:
-                self.highestGainSale(transaction['AssetType'], transaction['AssetID'], transaction['Date'], transaction['Value'], transaction['Quantity'])
+        elif transactionType == TransactionType.Split:
+            self.split(transaction['AssetType'], transaction['AssetID'], transaction['Date'], transaction['Value'] / transaction['Quantity'], transaction['Quantity'], transaction['OptionID'], transaction['OptionSplitID'] )
+    
+        elif transactionType == TransactionType.Merge:
+            self.merge(transaction['AssetType'], transaction['AssetID'], transaction['Date'], transaction['Value'] / transaction['Quantity'], transaction['Quantity'], transaction['OptionID'], transaction['OptionSplitID'] )
+    
+        elif transactionType == TransactionType.Exercise:
+            self.exercise(transaction['AssetType'], transaction['AssetID'], transaction['Date'], transaction['Value'] / transaction['Quantity'], transaction['Quantity'], transaction['OptionID'])
 
-            elif transactionType == TransactionType.LowestGain_Sale:
-                self.lowestGainSale(transaction['AssetType'], transaction['AssetID'], transaction['Date'], transaction['Value'], transaction['Quantity'])
+        elif transactionType == TransactionType.Expire:
+            self.recordEvents(self.expireOptions(transaction['AssetType'], transaction['AssetID'], transaction['Date'], toCents(transaction['Value'] / transaction['Quantity']), transaction['Quantity'], transaction['OptionID']))
 
-            #else: raise Exception(f"{transaction['Date']} Transaction type error, please check transaction type")
+        #else: raise Exception(f"{transaction['Date']} Transaction type error, please check transaction type")
 
     def purchase(self, assetType: AssetType, assetIdentifier: str, purchaseDate: dt.date, value: float, quantity: float, optionID: str | None = None):
-        shares = []
-        for _ in range(int(quantity)):
-            shares.append({'AssetType': assetType,
-            'AssetIdentifier': assetIdentifier,
-            'PurchaseDate': purchaseDate,
-            'Value': value / quantity,
-            'OptionID' : optionID
-            })
-        new_rows = pd.DataFrame(shares)
-        self.assets = pd.concat([self.assets, new_rows], ignore_index=True)
-        self.assets.fillna('', inplace = True)
-    
-    def fifoSale(self, assetType: AssetType, assetIdentifier: str, date: dt.date, value: float, quantity: float) -> list:
-        assert assetType == AssetType.Share, "FIFO sale transaction type called on option, options can only be sold specifically by ID - please check transaction types for validity"
-        saleShares = self.assets[(self.assets['AssetType'] == assetType) & (self.assets['AssetIdentifier'] == assetIdentifier)].head(int(quantity))
-        groups = saleShares.groupby('PurchaseDate')
+        self.addParcel(assetType, assetIdentifier, purchaseDate, toCents(value), quantity, optionID)
+
+    def addParcel(self, assetType: AssetType, assetIdentifier: str, purchaseDate: dt.date, cents: int, quantity: float, optionID: str | None = None):
+        # Only whole units are held, cost base of any fractional unit is dropped
+        units = int(quantity)
+        if units <= 0:
+            return
+        if optionID is None or optionID != optionID:
+            optionID = ''
+        self.book(assetType, assetIdentifier).append([toDay(purchaseDate)], [units], [allocateCents(cents, units, quantity)], [optionID], [self.nextSequence])
+        self.nextSequence += 1
+
+    def discountable(self, date: np.datetime64, acquisitionDate: np.datetime64, grossCents: int) -> bool | str:
+        discountable = False
+        if (shiftYears(date, -1) > acquisitionDate) & (grossCents > 0) : discountable = True
+        if grossCents < 0: discountable = 'Loss'
+        return discountable
+
+    def saleOrder(self, transactionType: TransactionType, book: ParcelBook, date: np.datetime64, valueCents: int, quantity: float) -> np.ndarray:
+        if transactionType == TransactionType.LIFO_Sale:
+            return np.arange(len(book))[::-1]
+        unitCents = book.cents / np.maximum(book.quantities, 1)
+        if transactionType == TransactionType.HighestGain_Sale:
+            return np.argsort(unitCents, kind='stable')
+        if transactionType == TransactionType.LowestGain_Sale:
+            netGain = valueCents / quantity - unitCents
+            heldOverYear = (date - book.purchaseDates).astype(np.int64) > 365
+            return np.argsort(np.where(heldOverYear, netGain / 2, netGain), kind='stable')
+        return np.arange(len(book))
+
+    def sellShares(self, transactionType: TransactionType, assetType: AssetType, assetIdentifier: str, date: dt.date, valueCents: int, quantity: float) -> list:
+        # Share sales differ only in which parcels are sold first, one taxable event per purchase date sold from
+        date = toDay(date)
+        book = self.book(assetType, assetIdentifier)
+        purchaseDates, taken, takenCents = book.consume(self.saleOrder(transactionType, book, date, valueCents, quantity), int(quantity))
+        return self.shareSaleEvents(transactionType, assetType, assetIdentifier, date, valueCents, quantity, purchaseDates, taken, takenCents)
+
+    def sellAssigned(self, assetType: AssetType, assetIdentifier: str, date: dt.date, valueCents: int, quantity: float, sequences: np.ndarray, units: np.ndarray) -> list:
+        # Sale with the units taken from each parcel chosen by the caller, parcels identified by sequence number
+        date = toDay(date)
+        book = self.book(assetType, assetIdentifier)
+        purchaseDates, taken, takenCents = book.take(np.searchsorted(book.sequences, sequences), np.asarray(units, dtype=np.int64))
+        return self.shareSaleEvents(TransactionType.Optimized_Sale, assetType, assetIdentifier, date, valueCents, quantity, purchaseDates, taken, takenCents)
+
+    def shareSaleEvents(self, transactionType: TransactionType, assetType: AssetType, assetIdentifier: str, date: np.datetime64, valueCents: int, quantity: float, purchaseDates: np.ndarray, taken: np.ndarray, takenCents: np.ndarray) -> list:
+        dates, groupQuantities, groupCents = groupByPurchaseDate(purchaseDates, taken, takenCents)
+        # Proceeds split by units sold so the groups sum exactly to the sale value
+        cumulativeProceeds = [allocateCents(valueCents, units, quantity) for units in np.cumsum(groupQuantities)]
+        groupProceeds = np.diff(cumulativeProceeds, prepend=0)
         transactions = []
-        for purchaseDate, group in groups:
-            groupQuantity = len(group)
-            groupCostBase = group['Value'].sum()
-            groupProceeds = (value / quantity) * groupQuantity
-            groupGrossValue = groupProceeds - groupCostBase
-            acquisitionDate = group['PurchaseDate'].max()
-            discountable = False
-            if (date - relativedelta(years=1) > acquisitionDate) & (groupGrossValue > 0) : discountable = True
-            if groupGrossValue < 0: discountable = 'Loss'
-            transactions.append({
-                'Date': date, 
-                'AssetID': assetIdentifier, 
-                'AssetType': assetType,
-                'TransactionType': TransactionType.FIFO_Sale, 
-                'Quantity': groupQuantity, 
-                'AcquisitionDate': acquisitionDate, 
-                'Proceeds': groupProceeds, 
-                'CostBase': groupCostBase, 
-                'GrossValue': groupGrossValue, 
-                'Discountable': discountable
-            })
-        self.assets.drop(saleShares.index, inplace=True)
-        self.assets.reset_index(drop=True, inplace=True)
+        for acquisitionDate, groupQuantity, groupCostBase, proceeds in zip(dates, groupQuantities, groupCents, groupProceeds):
+            grossValue = int(proceeds) - int(groupCostBase)
+            transactions.append(TaxEvent(date, assetIdentifier, assetType, transactionType, int(groupQuantity), acquisitionDate, int(proceeds), int(groupCostBase), self.discountable(date, acquisitionDate, grossValue)))
         return transactions
+
+    def sellOptions(self, assetType: AssetType, assetIdentifier: str, date: dt.date, valueCents: int, quantity: float, optionID: str) -> list:
+        date = toDay(date)
+        book = self.book(assetType, assetIdentifier)
+        purchaseDates, taken, takenCents = book.consume(book.select(optionID), int(quantity))
+        costBase = int(takenCents.sum())
+        grossValue = valueCents - costBase
+        acquisitionDate = purchaseDates.max() if len(purchaseDates) else None
+        return [TaxEvent(date, assetIdentifier, assetType, TransactionType.Option_Sale, quantity, acquisitionDate, valueCents, costBase,
+                         self.discountable(date, acquisitionDate, grossValue) if acquisitionDate is not None else ('Loss' if grossValue < 0 else False))]
+
+    def expireOptions(self, assetType: AssetType, assetIdentifier: str, date: dt.date, valueCents: int, quantity: float, optionID: str) -> list:
+        date = toDay(date)
+        book = self.book(assetType, assetIdentifier)
+        expired = book.select(optionID)
+        costBase = int(book.cents[expired].sum())
+        acquisitionDate = book.purchaseDates[expired].max() if len(expired) else None
+        book.remove(expired)
+        return [TaxEvent(date, assetIdentifier, assetType, TransactionType.Expire, quantity, acquisitionDate, valueCents, costBase, 'Loss')]
+
+    def fifoSale(self, assetType: AssetType, assetIdentifier: str, date: dt.date, value: float, quantity: float) -> list:
+        assert assetType == AssetType.Share, "FIFO sale transaction type called on option, options can only be sold specifically by ID - please check transaction types for validity"
+        return [event.toDict() for event in self.sellShares(TransactionType.FIFO_Sale, assetType, assetIdentifier, date, toCents(value), quantity)]
             
     def optionSale(self, assetType: AssetType, assetIdentifier: str, date: dt.date, value: float, quantity: float, optionID: str):
         assert assetType == AssetType.Option, "Option sale transaction type called on share, please check transaction types for validity"
-        saleOptions = self.assets[(self.assets['AssetType'] == assetType) 
-                & (self.assets['AssetIdentifier'] == assetIdentifier) 
-                & (self.assets['OptionID'] == optionID)].head(int(quantity))
-        costBase = saleOptions['Value'].sum()
-        grossValue = value - costBase
-        acquisitionDate = saleOptions['PurchaseDate'].max()
-        discountable = False
-        if (date - relativedelta(years=1) > acquisitionDate) & (grossValue > 0) : discountable = True
-        if grossValue < 0: discountable = 'Loss'
-        transaction = [{
-                'Date': date, 
-                'AssetID': assetIdentifier,
-                'AssetType': assetType,
-                'TransactionType': TransactionType.Option_Sale, 
-                'Quantity': quantity, 
-                'AcquisitionDate': acquisitionDate, 
-                'Proceeds': value, 
-                'CostBase': costBase, 
-                'GrossValue': grossValue, 
-                'Discountable': discountable
-            }]
-        self.assets.drop(saleOptions.index, inplace=True)
-        self.assets.reset_index(drop=True, inplace=True)
-        return transaction
+        return [event.toDict() for event in self.sellOptions(assetType, assetIdentifier, date, toCents(value), quantity, optionID)]
             
     def split(self, assetType: AssetType, assetIdentifier: str, date: dt.date, value: float, splitRatio: float, optionID: str | None = None, splitOptionID: str | None = None):
+        self.reorganise(assetType, assetIdentifier, splitRatio, optionID, splitOptionID)
+
+    def merge(self, assetType: AssetType, assetIdentifier: str, date: dt.date, value: float, mergeRatio: float, optionID: str | None = None, splitOptionID: str | None = None):
+        self.reorganise(assetType, assetIdentifier, 1 / mergeRatio, optionID, splitOptionID)
+
+    def reorganise(self, assetType: AssetType, assetIdentifier: str, ratio: float, optionID: str | None = None, splitOptionID: str | None = None):
+        # Splits and merges keep each parcel's cost base, shares are re-issued per purchase date and options under the new option ID
+        book = self.book(assetType, assetIdentifier)
         if assetType == AssetType.Share:
-            splitShares = self.assets[(self.assets['AssetType'] == assetType) & (self.assets['AssetIdentifier'] == assetIdentifier)]
-            groups = splitShares.groupby('PurchaseDate')
-            for purchaseDate, group in groups:
-                groupQuantity = len(group)
-                groupValue = group['Value'].sum()
-                acquisitionDate = group['PurchaseDate'].max()
-                self.purchase(assetType, assetIdentifier, acquisitionDate, groupValue, groupQuantity * splitRatio)
-            self.assets.drop(splitShares.index, inplace=True)
-            self.assets.reset_index(drop=True, inplace=True)
+            parcels = book.select()
+            dates, groupQuantities, groupCents = groupByPurchaseDate(book.purchaseDates[parcels], book.quantities[parcels], book.cents[parcels])
+            book.remove(parcels)
+            for acquisitionDate, groupQuantity, groupValue in zip(dates, groupQuantities, groupCents):
+                self.addParcel(assetType, assetIdentifier, acquisitionDate, int(groupValue), groupQuantity * ratio)
         
         if assetType == AssetType.Option:
-            splitOptions = self.assets[(self.assets['AssetType'] == assetType) & (self.assets['AssetIdentifier'] == assetIdentifier) & (self.assets['OptionID'] == optionID)]
-            quantity = len(splitOptions)
-            value = splitOptions['Value'].sum()
-            acquisitionDate = splitOptions['PurchaseDate'].max()
-            self.purchase(assetType, assetIdentifier, acquisitionDate, value, quantity * splitRatio, splitOptionID)
-            self.assets.drop(splitOptions.index, inplace=True)
-            self.assets.reset_index(drop=True, inplace=True)
+            parcels = book.select(optionID)
+            if not len(parcels):
+                return
+            quantity = int(book.quantities[parcels].sum())
+            value = int(book.cents[parcels].sum())
+            acquisitionDate = book.purchaseDates[parcels].max()
+            book.remove(parcels)
+            self.addParcel(assetType, assetIdentifier, acquisitionDate, value, quantity * ratio, splitOptionID)
 
     def exercise(self, assetType: AssetType, assetIdentifier: str, date: dt.date, value: float, quantity: float, optionID: str):
         if assetType == AssetType.Option:
-            exercisedOptions = self.assets[(self.assets['AssetType'] == assetType) 
-                                & (self.assets['AssetIdentifier'] == assetIdentifier) 
-                                & (self.assets['OptionID'] == optionID)].head(int(quantity))
-            acquisitionDate = exercisedOptions['PurchaseDate'].min()
-            value = exercisedOptions['Value'].sum()
-            self.optionExercises.update({optionID : (value, acquisitionDate)})
-            self.assets.drop(exercisedOptions.index, inplace=True)
-            self.assets.reset_index(drop=True, inplace=True)
+            book = self.book(assetType, assetIdentifier)
+            purchaseDates, taken, takenCents = book.consume(book.select(optionID), int(quantity))
+            acquisitionDate = purchaseDates.min() if len(purchaseDates) else None
+            self.optionExercises.update({optionID : (int(takenCents.sum()) / 100, acquisitionDate)})
         if assetType == AssetType.Share:
-            value = self.optionExercises[optionID][0] + value
+            cents = toCents(self.optionExercises[optionID][0]) + toCents(value)
             acquisitionDate = self.optionExercises[optionID][1]
             del self.optionExercises[optionID]
-            self.purchase(assetType, assetIdentifier, acquisitionDate, value, quantity)
+            self.addParcel(assetType, assetIdentifier, acquisitionDate, cents, quantity)
             
     def expire(self, assetType: AssetType, assetIdentifier: str, date: dt.date, value: float, quantity: float, optionID: str):
         assert assetType == AssetType.Option, f"{date} Share listed with Expire transaction type, please check transaction types"
-        expiredOptions = self.assets[(self.assets['AssetType'] == assetType) & (self.assets['AssetIdentifier'] == assetIdentifier) & (self.assets['OptionID'] == optionID)]
-        costBase = expiredOptions['Value'].sum()
-        acquisitionDate = expiredOptions['PurchaseDate'].max()
-        grossValue = value - costBase
-        discountable = 'Loss'
-        transaction = [{
-                'Date': date, 
-                'AssetID': assetIdentifier,
-                'AssetType': assetType,
-                'TransactionType': TransactionType.Expire, 
-                'Quantity': quantity, 
-                'AcquisitionDate': acquisitionDate, 
-                'Proceeds': value, 
-                'CostBase': costBase, 
-                'GrossValue': grossValue, 
-                'Discountable': discountable
-            }]
-        self.assets.drop(expiredOptions.index, inplace=True)
-        self.assets.reset_index(drop=True, inplace=True)
-        return transaction
-    
-    def merge(self, assetType: AssetType, assetIdentifier: str, date: dt.date, value: float, mergeRatio: float, optionID: str | None = None, splitOptionID: str | None = None):
-        if assetType == AssetType.Share:
-            mergeShares = self.assets[(self.assets['AssetType'] == assetType) & (self.assets['AssetIdentifier'] == assetIdentifier)]
-            groups = mergeShares.groupby('PurchaseDate')
-            for purchaseDate, group in groups:
-                groupQuantity = len(group)
-                groupValue = group['Value'].sum()
-                acquisitionDate = group['PurchaseDate'].max()
-                self.purchase(assetType, assetIdentifier, acquisitionDate, groupValue, groupQuantity / mergeRatio)
-            self.assets.drop(mergeShares.index, inplace=True)
-            self.assets.reset_index(drop=True, inplace=True)
-        
-        if assetType == AssetType.Option:
-            mergeOptions = self.assets[(self.assets['AssetType'] == assetType) & (self.assets['AssetIdentifier'] == assetIdentifier) & (self.assets['OptionID'] == optionID)]
-            quantity = len(mergeOptions)
-            value = mergeOptions['Value'].sum()
-            acquisitionDate = mergeOptions['PurchaseDate'].max()
-            self.purchase(assetType, assetIdentifier, acquisitionDate, value, quantity / mergeRatio, splitOptionID)
-            self.assets.drop(mergeOptions.index, inplace=True)
-            self.assets.reset_index(drop=True, inplace=True)
+        return [event.toDict() for event in self.expireOptions(assetType, assetIdentifier, date, toCents(value), quantity, optionID)]
             
     def lifoSale(self, assetType: AssetType, assetIdentifier: str, date: dt.date, value: float, quantity: float) -> list:
         assert assetType == AssetType.Share, "FIFO sale transaction type called on option, options can only be sold specifically by ID - please check transaction types for validity"
-        saleShares = self.assets[(self.assets['AssetType'] == assetType) & (self.assets['AssetIdentifier'] == assetIdentifier)].tail(int(quantity))
-        groups = saleShares.groupby('PurchaseDate')
-        transactions = []
-        for purchaseDate, group in groups:
-            groupQuantity = len(group)
-            groupCostBase = group['Value'].sum()
-            groupProceeds = (value / quantity) * groupQuantity
-            groupGrossValue = groupProceeds - groupCostBase
-            acquisitionDate = group['PurchaseDate'].max()
-            discountable = False
-            if (date - relativedelta(years=1) > acquisitionDate) & (groupGrossValue > 0) : discountable = True
-            if groupGrossValue < 0: discountable = 'Loss'
-            transactions.append({
-                'Date': date, 
-                'AssetID': assetIdentifier, 
-                'AssetType': assetType,
-                'TransactionType': TransactionType.LIFO_Sale, 
-                'Quantity': groupQuantity, 
-                'AcquisitionDate': acquisitionDate, 
-                'Proceeds': groupProceeds, 
-                'CostBase': groupCostBase, 
-                'GrossValue': groupGrossValue, 
-                'Discountable': discountable
-            })
-        self.assets.drop(saleShares.index, inplace=True)
-        self.assets.reset_index(drop=True, inplace=True)
-        return transactions
+        return [event.toDict() for event in self.sellShares(TransactionType.LIFO_Sale, assetType, assetIdentifier, date, toCents(value), quantity)]
     
     def highestGainSale(self, assetType: AssetType, assetIdentifier: str, date: dt.date, value: float, quantity: float):
         assert assetType == AssetType.Share, "Highest gain sale transaction type called on option, options can only be sold specifically by ID - please check transaction types for validity"
-        saleShares = self.assets[(self.assets['AssetType'] == assetType) & (self.assets['AssetIdentifier'] == assetIdentifier)].sort_values(['Value']).head(int(quantity))
-        groups = saleShares.groupby('PurchaseDate')
-        transactions = []
-        for purchaseDate, group in groups:
-            groupQuantity = len(group)
-            groupCostBase = group['Value'].sum()
-            groupProceeds = (value / quantity) * groupQuantity
-            groupGrossValue = groupProceeds - groupCostBase
-            acquisitionDate = group['PurchaseDate'].max()
-            discountable = False
-            if (date - relativedelta(years=1) > acquisitionDate) & (groupGrossValue > 0) : discountable = True
-            if groupGrossValue < 0: discountable = 'Loss'
-            transactions.append({
-                'Date': date, 
-                'AssetID': assetIdentifier, 
-                'AssetType': assetType,
-                'TransactionType': TransactionType.HighestGain_Sale, 
-                'Quantity': groupQuantity, 
-                'AcquisitionDate': acquisitionDate, 
-                'Proceeds': groupProceeds, 
-                'CostBase': groupCostBase, 
-                'GrossValue': groupGrossValue, 
-                'Discountable': discountable
-            })
-        self.assets.drop(saleShares.index, inplace=True)
-        self.assets.reset_index(drop=True, inplace=True)
-        return transactions
+        return [event.toDict() for event in self.sellShares(TransactionType.HighestGain_Sale, assetType, assetIdentifier, date, toCents(value), quantity)]
 
     def lowestGainSale(self, assetType: AssetType, assetIdentifier: str, date: dt.date, value: float, quantity: float):
         assert assetType == AssetType.Share, "Lowest gain sale transaction type called on option, options can only be sold specifically by ID - please check transaction types for validity"
-        calcPortfolio = self.assets[(self.assets['AssetType'] == assetType) & (self.assets['AssetIdentifier'] == assetIdentifier)]
-        proceedsPerShare = value / quantity
-        calcPortfolio['NetGain'] = proceedsPerShare - calcPortfolio['Value']
-        calcPortfolio['NetGain'] = calcPortfolio.apply(
-            lambda row: row['NetGain'] / 2 if (date - row['PurchaseDate']).days > 365 else row['NetGain'],
-            axis=1
-        )
-        saleShares = calcPortfolio.sort_values(by=['NetGain']).head(int(quantity))
-        groups = saleShares.groupby('PurchaseDate')
-        transactions = []
-        for purchaseDate, group in groups:
-            groupQuantity = len(group)
-            groupCostBase = group['Value'].sum()
-            groupProceeds = (value / quantity) * groupQuantity
-            groupGrossValue = groupProceeds - groupCostBase
-            acquisitionDate = group['PurchaseDate'].max()
-            discountable = False
-            if (date - relativedelta(years=1) > acquisitionDate) & (groupGrossValue > 0) : discountable = True
-            if groupGrossValue < 0: discountable = 'Loss'
-            transactions.append({
-                'Date': date, 
-                'AssetID': assetIdentifier, 
-                'AssetType': assetType,
-                'TransactionType': TransactionType.LowestGain_Sale, 
-                'Quantity': groupQuantity, 
-                'AcquisitionDate': acquisitionDate, 
-                'Proceeds': groupProceeds, 
-                'CostBase': groupCostBase, 
-                'GrossValue': groupGrossValue, 
-                'Discountable': discountable
-            })
-        self.assets.drop(saleShares.index, inplace=True)
-        self.assets.reset_index(drop=True, inplace=True)
-        return transactions
+        return [event.toDict() for event in self.sellShares(TransactionType.LowestGain_Sale, assetType, assetIdentifier, date, toCents(value), quantity)]
 
     def clearAssets(self):
-        self.assets = pd.DataFrame(columns=['AssetType', 'AssetIdentifier', 'PurchaseDate', 'Value', 'OptionID'])
+        # The summary and history follow the holdings, so they are cleared with them
+        self.holdings = Holdings()
+        self.summary = HoldingsSummary()
+        self.history = HoldingsHistory()
     
     def clearTaxabaleTransactions(self):
-        self.taxableTransactions = pd.DataFrame(columns=['Date', 'AssetID', 'AssetType', 'TransactionType', 'Quantity', 'AcquisitionDate', 'Proceeds', 'CostBase', 'GrossValue', 'Discountable'])
+        self.taxEvents = TaxEventColumns()
+        self.taxableCache = None
+
+    def aggregateTaxTransactions(self, taxTransactions: pd.DataFrame, consolidation: list) -> pd.DataFrame:
+        # Money columns are summed as integer cents so consolidated totals match the sum of the displayed events exactly
+        centTransactions = taxTransactions.assign(**{column: seriesToCents(taxTransactions[column]) for column in moneyColumns})
+        aggregated = centTransactions.groupby(consolidation).aggregate({'Quantity' : 'sum', 'Proceeds': 'sum', 'CostBase': 'sum', 'GrossValue' : 'sum'})
+        for column in moneyColumns:
+            aggregated[column] = aggregated[column] / 100
+        return aggregated
       
     def filterTaxTransactions(self, taxTransactions: pd.DataFrame, startDate: dt.date | None = None, endDate: dt.date | None = None, consolidationLevel: int | None = None) -> pd.DataFrame:
         if consolidationLevel == 1:
@@ -461,12 +900,12 @@ class Portfolio:
             consolidation = []
 
         if startDate and endDate and consolidationLevel:
-            filteredTransactions = taxTransactions[(taxTransactions['Date'] >= startDate) & (taxTransactions['Date'] <= endDate)]
-            filteredTransactions = filteredTransactions.groupby(consolidation).aggregate({'Quantity' : 'sum', 'Proceeds': 'sum', 'CostBase': 'sum', 'GrossValue' : 'sum'})
+            filteredTransactions = taxTransactions[(taxTransactions['Date'] >= toDay(startDate)) & (taxTransactions['Date'] <= toDay(endDate))]
+            filteredTransactions = self.aggregateTaxTransactions(filteredTransactions, consolidation)
         elif (startDate and endDate) and not consolidationLevel:
-            filteredTransactions = taxTransactions[(taxTransactions['Date'] >= startDate) & (taxTransactions['Date'] <= endDate)]
+            filteredTransactions = taxTransactions[(taxTransactions['Date'] >= toDay(startDate)) & (taxTransactions['Date'] <= toDay(endDate))]
         elif consolidationLevel and (not startDate or not endDate):
-            filteredTransactions = taxTransactions.groupby(consolidation).aggregate({'Quantity' : 'sum', 'Proceeds': 'sum', 'CostBase': 'sum', 'GrossValue' : 'sum'})
+            filteredTransactions = self.aggregateTaxTransactions(taxTransactions, consolidation)
         else: 
             return taxTransactions
                 
@@ -478,22 +917,19 @@ class Portfolio:
         return filteredTransactions
     
     def consolidatePortfolio(self):
-        df = self.assets.groupby(['AssetIdentifier', 'AssetType',  'OptionID', 'PurchaseDate']).agg({'Value' : 'sum'}).reset_index()
+        return self.consolidate(self.summary, dt.date.today())
 
-        quantity_series = self.assets.groupby(['AssetIdentifier', 'AssetType',  'OptionID', 'PurchaseDate']).size()
-        df.insert(4, 'Quantity', quantity_series.values) # type: ignore
+    def holdingsAsOf(self, date: dt.date) -> pd.DataFrame:
+        # Consolidated holdings at the end of date, from the snapshot before it and at most one block of logged changes
+        return self.consolidate(self.history.asOf(toDay(date)), date)
 
-        df['PurchaseDate'] = pd.to_datetime(df['PurchaseDate']).dt.date
-
-        current_date = dt.date.today()
-        
-        df['date_difference'] = ((current_date.year - df['PurchaseDate'].map(lambda x: x.year)) * 12 + 
-                                (current_date.month - df['PurchaseDate'].map(lambda x: x.month)))
-        
-        
-        df['Discountable'] = df['date_difference'] > 12
+    def consolidate(self, summary: HoldingsSummary, date: dt.date) -> pd.DataFrame:
+        df = summary.frame()
+        df['Value'] = df.pop('Cents') / 100 # Integer cents summed per group, dollars only for display
 
-        df = df.drop(columns='date_difference')
+        # Held for more than 12 calendar months as at date
+        monthsHeld = (np.datetime64(date, 'M') - df['PurchaseDate'].to_numpy().astype('datetime64[M]')).astype(np.int64)
+        df['Discountable'] = monthsHeld > 12
 
         df.insert(6, 'Discountable', df.pop('Discountable'))
 
@@ -0,0 +1,111 @@
+from pandasCGcalc import TransactionHistory, Portfolio, engineVersion
+import datetime as dt
+import pandas as pd
+import argparse
+import hashlib
+import os
+import pickle
+
+defaultResultDirectory = os.path.join(os.path.expanduser('~'), '.cgtapp', 'results')
+defaultByteLimit = 256 * 2**20
+resultSuffix = '.result'
+
+def transactionsKey(transactions: pd.DataFrame) -> str:
+    # Hash of the decoded transactions in replay order and the engine version, so an edit to any row or a new engine gives a new key
+    digest = hashlib.blake2b(digest_size=20)
+    digest.update(f'{engineVersion}|{"|".join(transactions.columns)}|{len(transactions)}'.encode())
+    digest.update(pd.util.hash_pandas_object(transactions, index=False).to_numpy().tobytes())
+    return digest.hexdigest()
+
+class ResultCache:
+    # Calculated portfolios on disk by transactionsKey, so identical transactions are not replayed again
+    # A result holds the replayed portfolio, which keeps pending option exercises and holdings history, with its CGT events and
+    # consolidated holdings. Results read least recently are removed once the directory is over byteLimit
+    def __init__(self, byteLimit: int = defaultByteLimit, directory: str = defaultResultDirectory):
+        self.byteLimit = byteLimit
+        self.directory = directory
+
+    def resultFile(self, key: str) -> str:
+        return os.path.join(self.directory, key + resultSuffix)
+
+    def resultFiles(self) -> list:
+        # Result files and their sizes, least recently used first
+        if not os.path.isdir(self.directory):
+            return []
+        files = [os.path.join(self.directory, name) for name in os.listdir(self.directory) if name.endswith(resultSuffix)]
+        stats = [(path, os.stat(path)) for path in files if os.path.exists(path)]
+        return [(path, stat.st_size) for path, stat in sorted(stats, key=lambda item: item[1].st_mtime_ns)]
+
+    def sizeBytes(self) -> int:
+        return sum(size for path, size in self.resultFiles())
+
+    def get(self, key: str) -> tuple[Portfolio, pd.DataFrame, pd.DataFrame] | None:
+        path = self.resultFile(key)
+        try:
+            with open(path, 'rb') as resultFile:
+                result = pickle.load(resultFile)
+        except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ImportError):
+            return None # Missing, or written by a version of the app that no longer reads
+        os.utime(path) # Marks the result as recently used
+        portfolio, assets = result['portfolio'], result['assets']
+        if result['date'] != dt.date.today():
+            assets = portfolio.consolidatePortfolio() # Discountable holdings are as at today
+        return portfolio, result['taxTransactions'], assets
+
+    def put(self, key: str, portfolio: Portfolio, taxTransactions: pd.DataFrame, assets: pd.DataFrame):
+        os.makedirs(self.directory, exist_ok=True)
+        temporary = self.resultFile(key) + '.tmp'
+        with open(temporary, 'wb') as resultFile:
+            pickle.dump({'portfolio': portfolio, 'taxTransactions': taxTransactions, 'assets': assets, 'date': dt.date.today()}, resultFile, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temporary, self.resultFile(key))
+        self.evict(keep=self.resultFile(key))
+
+    def evict(self, keep: str | None = None):
+        files = self.resultFiles()
+        total = sum(size for path, size in files)
+        for path, size in files:
+            if total <= self.byteLimit:
+                break
+            if path != keep:
+                os.remove(path)
+                total -= size
+
+    def clear(self) -> int:
+        # Removes every cached result, returns the number removed
+        files = self.resultFiles()
+        for path, size in files:
+            os.remove(path)
+        return len(files)
+
+    def calculate(self, transactions: pd.DataFrame) -> tuple[Portfolio, pd.DataFrame, pd.DataFrame]:
+        key = transactionsKey(transactions)
+        result = self.get(key)
+        if result is None:
+            portfolio = Portfolio()
+            portfolio.readTransactions(transactions)
+            result = portfolio, portfolio.taxableTransactions, portfolio.consolidatePortfolio()
+            self.put(key, *result)
+        return result
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'Calculates a transaction history CSV through the result cache, or clears the cache')
+    parser.add_argument('file', nargs = '?', help = 'transaction history CSV')
+    parser.add_argument('--clear', action = 'store_true', help = 'remove every cached result')
+    parser.add_argument('--directory', default = defaultResultDirectory, help = 'cache directory')
+    parser.add_argument('--limit', type = int, default = defaultByteLimit // 2**20, help = 'cache size limit in MB')
+    args = parser.parse_args()
+
+    resultCache = ResultCache(args.limit * 2**20, args.directory)
+    if args.clear:
+        print(f'{resultCache.clear()} cached results removed from {args.directory}')
+    if args.file:
+        transactionHistory = TransactionHistory()
+        transactionHistory.readData(pd.read_csv(args.file))
+        result = resultCache.get(transactionsKey(transactionHistory.transactions))
+        cached = result is not None
+        portfolio, taxTransactions, assets = result or resultCache.calculate(transactionHistory.transactions)
+        print(taxTransactions.to_string(index = False))
+        print(assets.to_string(index = False))
+        print(f'{"Read from" if cached else "Calculated and stored in"} the cache, {resultCache.sizeBytes() / 2**20:.1f} MB cached')
+    elif not args.clear:
+        parser.print_usage()
@@ -0,0 +1,35 @@
+from concurrent.futures import ThreadPoolExecutor
+from pandasCGcalc import Portfolio, AssetType, saleMethods, toCents, eventTotals, eventsNetGain
+import datetime as dt
+import pandas as pd
+
+scenarioColumns = ['Method', 'Quantity', 'Proceeds', 'CostBase', 'GrossValue', 'DiscountableGain', 'OtherGain', 'Loss', 'NetGain']
+
+def evaluateSale(portfolio: Portfolio, method: str, assetIdentifier: str, date: dt.date, value: float, quantity: float) -> dict:
+    # Sells from the portfolio passed in, callers pass a fork so their portfolio is left as it was
+    events = portfolio.sellShares(saleMethods[method], AssetType.Share, assetIdentifier, date, toCents(value), quantity)
+    discountable, other, losses = eventTotals(events)
+    return {
+        'Method': method,
+        'Quantity': sum(event.quantity for event in events),
+        'Proceeds': sum(event.proceeds for event in events) / 100,
+        'CostBase': sum(event.costBase for event in events) / 100,
+        'GrossValue': sum(event.grossValue for event in events) / 100,
+        'DiscountableGain': discountable / 100,
+        'OtherGain': other / 100,
+        'Loss': losses / 100,
+        'NetGain': eventsNetGain(events) / 100
+    }
+
+def compareSaleMethods(portfolio: Portfolio, assetIdentifier: str, date: dt.date, value: float, quantity: float, methods: list | None = None, maxWorkers: int | None = None) -> pd.DataFrame:
+    # What-if sale of quantity units for value under each sale method, one row per method, evaluated concurrently on forks
+    book = portfolio.holdings.get((AssetType.Share, assetIdentifier))
+    held = int(book.quantities.sum()) if book is not None else 0
+    if int(quantity) > held:
+        raise Exception(f'Sale of {int(quantity)} units of {assetIdentifier} exceeds the {held} units held')
+    methods = methods or list(saleMethods)
+    with ThreadPoolExecutor(max_workers = maxWorkers) as executor:
+        # Snapshots are taken here rather than in the workers, forking updates the parent's holdings map
+        futures = [executor.submit(evaluateSale, portfolio.fork(), method, assetIdentifier, date, value, quantity) for method in methods]
+        rows = [future.result() for future in futures]
+    return pd.DataFrame(rows, columns = scenarioColumns)
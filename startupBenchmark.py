@@ -0,0 +1,85 @@
+import subprocess
+import json
+import os
+import sys
+import time
+
+# Budget checked by the test suite, time to first window includes interpreter start
+startupBudget = {
+    'firstWindowSeconds': 5.0,
+    # Feature modules are imported by the actions that use them
+    'deferredModules': ['openpyxl', 'xlrd', 'workpaperExport', 'memoryDiagnostics', 'saleScenarios', 'taxLotOptimizer', 'clientWorkspace',
+                        'transactionStore', 'editJournal', 'transactionWatcher', 'markToMarket', 'transactionValidation', 'resultCache', 'liveRecalculation'],
+}
+
+appDirectory = os.path.dirname(os.path.abspath(__file__))
+
+firstWindowScript = """
+import datetime as dt
+import sys
+from PySide6.QtWidgets import QApplication
+import CapitalGainUiNew
+CapitalGainUiNew.expiredate = dt.date.max # Skip the expiry prompt, only the window itself is being measured
+app = QApplication(sys.argv)
+window = CapitalGainUiNew.MainWindow()
+window.show()
+app.processEvents()
+print('shown', ','.join(sorted(name for name in sys.modules if '.' not in name)), flush=True)
+"""
+
+def benchmarkEnvironment() -> dict:
+    environment = dict(os.environ)
+    if sys.platform.startswith('linux') and not environment.get('DISPLAY') and not environment.get('WAYLAND_DISPLAY'):
+        environment.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    return environment
+
+def measureImportTimes(module: str = 'CapitalGainUiNew') -> dict:
+    # Uses -X importtime, returns cumulative import seconds for each top-level import made by the module
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                            cwd = appDirectory, env = benchmarkEnvironment(), capture_output = True, text = True)
+    importTimes = {}
+    children = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        selfTime, cumulative, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        name = name.strip()
+        # -X importtime lists nested imports before the module that made them
+        if name == module:
+            importTimes = {**children, module: int(cumulative) / 1e6}
+        elif depth == 1:
+            children[name] = int(cumulative) / 1e6
+        elif depth == 0:
+            children = {}
+    if module not in importTimes:
+        raise Exception(f'Import of {module} failed: {result.stderr.strip().splitlines()[-1:]}')
+    return importTimes
+
+def measureFirstWindow() -> tuple[float, list]:
+    # Wall time from launching the interpreter until the main window has been shown, and the modules loaded by then
+    start = time.perf_counter()
+    process = subprocess.Popen([sys.executable, '-c', firstWindowScript], cwd = appDirectory, env = benchmarkEnvironment(),
+                               stdout = subprocess.PIPE, stderr = subprocess.PIPE, text = True)
+    line = process.stdout.readline() # type: ignore
+    elapsed = time.perf_counter() - start
+    process.kill()
+    _, errors = process.communicate()
+    if not line.startswith('shown'):
+        raise Exception(f'Main window failed to open: {errors.strip()}')
+    return elapsed, line.split()[1].split(',')
+
+def runStartupBenchmark() -> dict:
+    firstWindowSeconds, loadedModules = measureFirstWindow()
+    return {
+        'firstWindowSeconds': firstWindowSeconds,
+        'importSeconds': measureImportTimes(),
+        'deferredModulesLoaded': [module for module in startupBudget['deferredModules'] if module in loadedModules],
+        'budget': startupBudget,
+    }
+
+if __name__ == '__main__':
+    report = runStartupBenchmark()
+    print(json.dumps(report, indent=4))
+    if report['firstWindowSeconds'] > startupBudget['firstWindowSeconds'] or report['deferredModulesLoaded']:
+        sys.exit(1)
@@ -0,0 +1,203 @@
+from pandasCGcalc import Portfolio, AssetType, TransactionType, shareSaleTypes, toCents, toDay, shiftYears, eventTotals, eventsNetGain
+import datetime as dt
+import numpy as np
+import pandas as pd
+import time
+
+def financialYearBounds(year: int) -> tuple[dt.date, dt.date]:
+    return dt.date(year - 1, 7, 1), dt.date(year, 6, 30)
+
+class SaleAssignment:
+    # Cost matrices for the reassigned sales of one asset, as (parcel, sale) pairs where the parcel was added before the sale
+    # Gains are per unit in cents, a discountable pair counts half its gain towards lossesCovered and every pair half towards lossesUncovered
+    candidates = 16 # Cheapest parcels per sale in the first restricted problem
+
+    def __init__(self, book, saleIndex: np.ndarray, saleDates: np.ndarray, salePrices: np.ndarray, saleSequences: np.ndarray, saleUnits: np.ndarray):
+        eligible = book.sequences[:, None] < saleSequences[None, :]
+        gains = salePrices[None, :] - (book.cents / book.quantities)[:, None]
+        discountable = (shiftYears(saleDates, -1)[None, :] > book.purchaseDates[:, None]) & (gains > 0)
+        self.parcels, self.sales = np.nonzero(eligible)
+        self.pairIndex = np.full(eligible.shape, -1, dtype=np.int64)
+        self.pairIndex[self.parcels, self.sales] = np.arange(len(self.parcels))
+        gains, discountable = gains[self.parcels, self.sales], discountable[self.parcels, self.sales]
+        self.lossesCovered = np.where(discountable, gains / 2, gains)
+        self.lossesUncovered = gains / 2
+        self.saleIndex = saleIndex
+        self.sequences = book.sequences
+        self.parcelUnits = book.quantities
+        self.saleUnits = saleUnits
+
+        # Pairs a first in first out replay would sell from, overlapping runs of cumulative units, so the first restricted problem is feasible
+        parcelEnds, saleEnds = np.cumsum(self.parcelUnits), np.cumsum(saleUnits)
+        first = np.searchsorted(parcelEnds, saleEnds - saleUnits, side='right')
+        last = np.minimum(np.searchsorted(parcelEnds, saleEnds - 1, side='right'), len(parcelEnds) - 1)
+        sales = np.repeat(np.arange(len(saleUnits)), last - first + 1)
+        parcels = np.concatenate([np.arange(low, high + 1) for low, high in zip(first, last)]) if len(saleUnits) else np.empty(0, dtype=np.int64)
+        self.fifoPairs = self.pairIndex[parcels, sales]
+        self.fifoPairs = self.fifoPairs[self.fifoPairs >= 0]
+
+    def solve(self, costs: np.ndarray) -> np.ndarray | None:
+        # Transportation problem, parcels supply at most what they hold and every sale takes exactly its quantity, solved by column generation:
+        # solve over the first in first out pairs and each sale's cheapest parcels, then add every pair the duals price below zero until none are
+        # Integer supplies and quantities make every vertex integral, so units are only rounded off float noise
+        active = np.zeros(len(costs), dtype=bool)
+        active[self.fifoPairs] = True
+        active[self.cheapest(costs)] = True
+        while True:
+            result = self.solveActive(costs, active)
+            if result is None:
+                if active.all():
+                    return None
+                active[:] = True
+                continue
+            units, supplyDuals, demandDuals = result
+            reduced = np.where(active, 0, costs - supplyDuals[self.parcels] - demandDuals[self.sales])
+            entering = self.cheapest(reduced)
+            entering = entering[reduced[entering] < -1e-6]
+            if not len(entering):
+                return units
+            active[entering] = True
+
+    def cheapest(self, costs: np.ndarray) -> np.ndarray:
+        # The pairs with the lowest costs for each sale
+        matrix = np.full(self.pairIndex.shape, np.inf)
+        matrix[self.parcels, self.sales] = costs
+        parcels = np.argpartition(matrix, min(self.candidates, len(matrix)) - 1, axis=0)[:self.candidates]
+        pairs = self.pairIndex[parcels, np.arange(matrix.shape[1])[None, :]]
+        return pairs[pairs >= 0]
+
+    def solveActive(self, costs: np.ndarray, active: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray] | None:
+        from scipy.optimize import linprog
+        from scipy.sparse import csr_array
+        pairs = np.flatnonzero(active)
+        columns = np.arange(len(pairs))
+        supply = csr_array((np.ones(len(pairs)), (self.parcels[pairs], columns)), shape=(len(self.parcelUnits), len(pairs)))
+        demand = csr_array((np.ones(len(pairs)), (self.sales[pairs], columns)), shape=(len(self.saleUnits), len(pairs)))
+        # Interior point with crossover is quickest here, dual simplex is the fallback if the crossover stops short of a vertex
+        for method in ['highs-ipm', 'highs-ds']:
+            result = linprog(costs[pairs], A_ub=supply, b_ub=self.parcelUnits, A_eq=demand, b_eq=self.saleUnits, bounds=(0, None), method=method)
+            if result.status != 0:
+                return None
+            if np.allclose(result.x, np.rint(result.x), atol=1e-6):
+                break
+        units = np.zeros(len(costs), dtype=np.int64)
+        units[pairs] = np.rint(result.x)
+        return units, result.ineqlin.marginals, result.eqlin.marginals
+
+def optimizeFinancialYear(transactions: pd.DataFrame, year: int, carriedLosses: float = 0.0, iterations: int = 20) -> tuple[Portfolio, dict]:
+    # Reassigns every share sale in the financial year to the parcels that minimise the year's net capital gain, the portfolio
+    # returned carries on through every transaction after the year
+    # Sales of an asset are only reassigned when the asset has nothing but purchases and sales during the year, others replay as entered
+    #
+    # With D, O and L the discountable gains, other gains and losses (carried losses included), net gain is O - L + D/2 while losses
+    # are covered by other gains and (O + D - L)/2 once they are not, a negative net gain doubling when losses exceed all gains.
+    # That is an increasing function of max(O - L + D/2, (O + D - L)/2), both linear in the units each sale takes from each parcel.
+    # Minimising either term alone splits into one transportation problem per asset, and if the minimiser of a term keeps that term
+    # the larger of the two it minimises the net gain outright. Otherwise the optimum is where losses just use up other gains, found
+    # by bisecting the weighting between the two terms and keeping the best assignment seen
+    try:
+        import scipy.optimize # Optional dependency, only needed for the optimizer
+    except ImportError:
+        raise Exception('The tax lot optimizer needs scipy, install it with "pip install scipy"')
+    start = time.perf_counter()
+    startDate, endDate = financialYearBounds(year)
+    portfolio = Portfolio()
+    portfolio.readTransactions(transactions[transactions['Date'] < toDay(startDate)])
+    during = transactions[(transactions['Date'] >= toDay(startDate)) & (transactions['Date'] <= toDay(endDate))]
+
+    shareRows = during[during['AssetType'] == AssetType.Share]
+    fixedAssets = shareRows.loc[~shareRows['TransactionType'].isin([TransactionType.Purchase, *shareSaleTypes]), 'AssetID'].unique()
+    reassigned = ((during['AssetType'] == AssetType.Share) & during['TransactionType'].isin(shareSaleTypes) & ~during['AssetID'].isin(fixedAssets)).to_numpy()
+    sales = during[reassigned]
+
+    # As entered, for comparison
+    asEntered = portfolio.fork()
+    asEntered.readTransactions(during)
+
+    # Replay everything else on a fork, leaving every parcel the reassigned sales can draw on and the year's fixed events
+    # Parcels are numbered in the order they are added, so a sale can use any parcel numbered below the next number when it is entered
+    plan = portfolio.fork()
+    saleSequences = []
+    for isReassigned, (index, transaction) in zip(reassigned, during.iterrows()):
+        if isReassigned:
+            saleSequences.append(plan.nextSequence)
+        else:
+            plan.applyTransaction(transaction)
+    saleSequences = np.array(saleSequences, dtype=np.int64)
+    fixedDiscountable, fixedOther, fixedLosses = eventTotals(plan.taxEvents.events)
+    fixedLosses -= toCents(carriedLosses)
+    coveredConstant = fixedOther + fixedLosses + fixedDiscountable / 2
+    uncoveredConstant = (fixedOther + fixedLosses + fixedDiscountable) / 2
+
+    saleDates = sales['Date'].to_numpy().astype('datetime64[D]')
+    saleUnits = sales['Quantity'].to_numpy().astype(np.int64)
+    salePrices = np.array([toCents(value) for value in sales['Value']]) / sales['Quantity'].to_numpy()
+    assignments = []
+    for asset in pd.unique(sales['AssetID']):
+        saleIndex = np.flatnonzero((sales['AssetID'] == asset).to_numpy())
+        book = plan.holdings.get((AssetType.Share, asset))
+        if book is None or not len(book):
+            raise Exception(f'FY{year} sales of {asset} exceed the parcels held')
+        assignments.append(SaleAssignment(book, saleIndex, saleDates[saleIndex], salePrices[saleIndex], saleSequences[saleIndex], saleUnits[saleIndex]))
+
+    def assign(weight: float) -> tuple[float, float, list]:
+        # Minimises weight * lossesCovered + (1 - weight) * lossesUncovered, returning how far lossesCovered is above lossesUncovered,
+        # the larger of the two and the units per pair for each asset
+        units = []
+        for assignment in assignments:
+            assigned = assignment.solve(weight * assignment.lossesCovered + (1 - weight) * assignment.lossesUncovered)
+            if assigned is None:
+                raise Exception(f'FY{year} sales of {sales["AssetID"].iloc[assignment.saleIndex[0]]} exceed the parcels held')
+            units.append(assigned)
+        covered = coveredConstant + sum(assignment.lossesCovered @ assigned for assignment, assigned in zip(assignments, units))
+        uncovered = uncoveredConstant + sum(assignment.lossesUncovered @ assigned for assignment, assigned in zip(assignments, units))
+        return covered - uncovered, max(covered, uncovered), units
+
+    best = []
+    if assignments:
+        difference, objective, units = assign(1.0)
+        candidates = [(objective, units)]
+        if difference < 0:
+            difference, objective, units = assign(0.0)
+            candidates.append((objective, units))
+            low, high = 0.0, 1.0
+            for iteration in range(iterations if difference > 0 else 0):
+                weight = (low + high) / 2
+                difference, objective, units = assign(weight)
+                candidates.append((objective, units))
+                if difference > 0:
+                    low = weight
+                else:
+                    high = weight
+        best = min(candidates, key=lambda candidate: candidate[0])[1]
+
+    # Units each reassigned sale takes, keyed by sale number, as (parcel sequence, units)
+    taken = {}
+    for assignment, units in zip(assignments, best):
+        for pair in np.flatnonzero(units):
+            taken.setdefault(assignment.saleIndex[assignment.sales[pair]], []).append((assignment.sequences[assignment.parcels[pair]], units[pair]))
+
+    firstEvent = len(portfolio.taxEvents)
+    saleNumber = 0
+    for isReassigned, (index, transaction) in zip(reassigned, during.iterrows()):
+        if not isReassigned:
+            portfolio.applyTransaction(transaction)
+            continue
+        parcels = sorted(taken.get(saleNumber, []))
+        portfolio.recordDate(transaction['Date'])
+        portfolio.recordEvents(portfolio.sellAssigned(AssetType.Share, transaction['AssetID'], transaction['Date'], toCents(transaction['Value']), transaction['Quantity'],
+                                                      np.array([sequence for sequence, units in parcels], dtype=np.int64), np.array([units for sequence, units in parcels], dtype=np.int64)))
+        saleNumber += 1
+    netGain = eventsNetGain(portfolio.taxEvents.recorded()[firstEvent:], toCents(carriedLosses))
+
+    # Later years replay as entered, selling from the parcels the optimized sales leave
+    portfolio.readTransactions(transactions[transactions['Date'] > toDay(endDate)])
+
+    return portfolio, {
+        'Year': year,
+        'Sales': len(sales),
+        'Parcels': sum(len(assignment.parcelUnits) for assignment in assignments),
+        'NetGain': netGain / 100,
+        'AsEnteredNetGain': eventsNetGain(asEntered.taxEvents.events, toCents(carriedLosses)) / 100,
+        'Seconds': time.perf_counter() - start,
+    }
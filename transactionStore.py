@@ -0,0 +1,132 @@
+from pandasCGcalc import TransactionHistory, Portfolio, AssetType, TransactionType, transactionTypeCategories, assetTypeCategories, identifierColumns, toDay, toDate
+from typing import Iterator
+import datetime as dt
+import numpy as np
+import pandas as pd
+import argparse
+import sqlite3
+
+transactionColumns = ['Date', 'AssetType', 'AssetID', 'TransactionType', 'Quantity', 'Value', 'OptionID', 'OptionSplitID']
+storeExtensions = ('.sqlite', '.db')
+
+def isStoreFile(path: str) -> bool:
+    return path.lower().endswith(storeExtensions)
+
+class TransactionStore:
+    # Decoded transaction history in SQLite, enums stored by value and dates as ISO text so both sort and compare in SQL
+    # Rows are read back in the same order TransactionHistory.sortByDate gives, in decoded frames of at most chunkSize rows
+    def __init__(self, path: str, chunkSize: int = 10000):
+        self.path = path
+        self.chunkSize = chunkSize
+        self.connection = sqlite3.connect(path)
+        self.connection.executescript('''
+            CREATE TABLE IF NOT EXISTS transactions (
+                Date TEXT NOT NULL, AssetType INTEGER NOT NULL, AssetID TEXT NOT NULL, TransactionType INTEGER NOT NULL,
+                Quantity REAL NOT NULL, Value REAL NOT NULL, OptionID TEXT NOT NULL DEFAULT '', OptionSplitID TEXT NOT NULL DEFAULT '');
+            CREATE INDEX IF NOT EXISTS transactionsByAssetDate ON transactions (AssetID, Date);
+            CREATE INDEX IF NOT EXISTS transactionsByOption ON transactions (OptionID);
+        ''')
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self) -> 'TransactionStore':
+        return self
+
+    def __exit__(self, *exception):
+        self.close()
+
+    def __len__(self) -> int:
+        return self.connection.execute('SELECT COUNT(*) FROM transactions').fetchone()[0]
+
+    def encode(self, transactions: pd.DataFrame) -> Iterator[tuple]:
+        # Rows of a decoded transactions frame as stored
+        return zip(np.datetime_as_string(transactions['Date'].to_numpy().astype('datetime64[D]')).tolist(),
+                   [assetType.value for assetType in transactions['AssetType']],
+                   transactions['AssetID'].astype(str).tolist(),
+                   [transactionType.value for transactionType in transactions['TransactionType']],
+                   transactions['Quantity'].astype(float).tolist(),
+                   transactions['Value'].astype(float).tolist(),
+                   transactions['OptionID'].astype(str).tolist(),
+                   transactions['OptionSplitID'].astype(str).tolist())
+
+    def insert(self, transactions: pd.DataFrame):
+        # Bulk insert of a decoded transactions frame, in one SQLite transaction
+        with self.connection:
+            self.connection.executemany('INSERT INTO transactions VALUES (?, ?, ?, ?, ?, ?, ?, ?)', self.encode(transactions))
+
+    def replace(self, transactions: pd.DataFrame):
+        # Delete and insert in one SQLite transaction, so a failed insert leaves the rows already stored
+        with self.connection:
+            self.connection.execute('DELETE FROM transactions')
+            self.connection.executemany('INSERT INTO transactions VALUES (?, ?, ?, ?, ?, ?, ?, ?)', self.encode(transactions))
+
+    def importFile(self, path: str):
+        transactionHistory = TransactionHistory()
+        transactionHistory.readData(pd.read_csv(path))
+        self.insert(transactionHistory.transactions)
+
+    def query(self, assetIdentifier: str | None = None, startDate: dt.date | None = None, endDate: dt.date | None = None, optionID: str | None = None) -> Iterator[pd.DataFrame]:
+        # Streams the matching rows through a cursor as decoded frames, the (AssetID, Date) and OptionID indexes serve the filters
+        conditions, parameters = [], []
+        for column, operator, value in [('AssetID', '=', assetIdentifier), ('Date', '>=', startDate), ('Date', '<=', endDate), ('OptionID', '=', optionID)]:
+            if value is not None:
+                conditions.append(f'{column} {operator} ?')
+                parameters.append(str(toDate(toDay(value))) if column == 'Date' else value)
+        where = f'WHERE {" AND ".join(conditions)}' if conditions else ''
+        cursor = self.connection.execute(f'SELECT {", ".join(transactionColumns)} FROM transactions {where} ORDER BY Date, AssetType, rowid', parameters)
+        try:
+            while rows := cursor.fetchmany(self.chunkSize):
+                yield self.decode(rows)
+        finally:
+            cursor.close()
+
+    def read(self, **filters) -> pd.DataFrame:
+        chunks = list(self.query(**filters))
+        if not chunks:
+            return self.decode([])
+        transactions = pd.concat(chunks, ignore_index=True)
+        for column in identifierColumns:
+            # Chunks with different categories concatenate to plain values
+            transactions[column] = transactions[column].astype(object).astype('category')
+        return transactions
+
+    def replay(self, portfolio: Portfolio | None = None, **filters) -> Portfolio:
+        # Feeds the matching rows to a portfolio one chunk at a time, so the full history is never held as one frame
+        portfolio = portfolio or Portfolio()
+        for chunk in self.query(**filters):
+            portfolio.readTransactions(chunk)
+        return portfolio
+
+    def decode(self, rows: list) -> pd.DataFrame:
+        # Same dtypes as TransactionHistory.readData produces
+        columns = list(zip(*rows)) if rows else [[] for column in transactionColumns]
+        transactions = pd.DataFrame({
+            'Date': np.array(columns[0], dtype='datetime64[D]'),
+            'AssetType': pd.Categorical([AssetType(value) for value in columns[1]], dtype=assetTypeCategories),
+            'AssetID': columns[2],
+            'TransactionType': pd.Categorical([TransactionType(value) for value in columns[3]], dtype=transactionTypeCategories),
+            'Quantity': np.array(columns[4], dtype=float),
+            'Value': np.array(columns[5], dtype=float),
+            'OptionID': columns[6],
+            'OptionSplitID': columns[7]
+        })
+        for column in identifierColumns:
+            transactions[column] = transactions[column].astype(object).astype('category')
+        return transactions
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'Imports transaction history CSVs into an indexed SQLite store and reports CGT events from it')
+    parser.add_argument('store', help = 'SQLite store file')
+    parser.add_argument('--import', dest = 'importFiles', nargs = '+', default = [], help = 'transaction history CSVs to add to the store')
+    parser.add_argument('--asset', help = 'only replay this AssetID')
+    parser.add_argument('--start', type = dt.date.fromisoformat, help = 'first date to replay, YYYY-MM-DD')
+    parser.add_argument('--end', type = dt.date.fromisoformat, help = 'last date to replay, YYYY-MM-DD')
+    args = parser.parse_args()
+
+    with TransactionStore(args.store) as store:
+        for file in args.importFiles:
+            store.importFile(file)
+        portfolio = store.replay(assetIdentifier = args.asset, startDate = args.start, endDate = args.end)
+        print(f'{len(store)} transactions stored')
+        print(portfolio.taxableTransactions.to_string(index = False))
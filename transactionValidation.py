@@ -0,0 +1,145 @@
+from pandasCGcalc import TransactionHistory, Portfolio, TransactionType, AssetType, shareSaleTypes, toDay, toDate
+import numpy as np
+import pandas as pd
+import argparse
+import sys
+
+issueColumns = ['Row', 'Date', 'AssetType', 'AssetID', 'OptionID', 'TransactionType', 'Quantity', 'Issue']
+tolerance = 1e-6 # Units, positions scaled by split ratios are floats
+
+def optionLineages(transactions: pd.DataFrame) -> np.ndarray:
+    # Option ID each row's units are held under, with options split or merged into a new ID followed back to the ID first bought
+    # Share rows are held under ''
+    optionIDs = transactions['OptionID'].astype(str)
+    isOption = (transactions['AssetType'] == AssetType.Option).to_numpy()
+    reorganised = transactions[isOption & transactions['TransactionType'].isin([TransactionType.Split, TransactionType.Merge]).to_numpy() & (transactions['OptionSplitID'].astype(str) != '').to_numpy()]
+    roots = {}
+    for optionID, splitOptionID in zip(reorganised['OptionID'].astype(str), reorganised['OptionSplitID'].astype(str)):
+        roots[splitOptionID] = roots.get(optionID, optionID)
+    lineages = optionIDs.map(roots).fillna(optionIDs) if roots else optionIDs
+    return np.where(isOption, lineages.to_numpy(dtype=object), '')
+
+def runningPositions(groups: np.ndarray, deltas: np.ndarray, ratios: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    # Units held in each group before each row's change, after its ratio, as replay would hold them, and the most replay can hold less
+    # Units are scaled by the cumulative split ratio so a split is a constant factor within the group, and a sale of more than is held
+    # leaves nothing rather than a short position, which is the running sum less its running minimum. Replay rounds each purchase date's
+    # units down on a split, which is not followed here. A split by a fractional ratio loses less than a unit per purchase date held, so
+    # under one per purchase before it, which scaled by the splits after it bounds the units replay holds less
+    scale = pd.Series(ratios).groupby(groups).cumprod().to_numpy()
+    sums = pd.Series(deltas / scale).groupby(groups).cumsum()
+    held = sums - np.minimum(sums.groupby(groups).cummin(), 0)
+    purchases = pd.Series(deltas > 0).groupby(groups).cumsum().to_numpy()
+    lost = pd.Series(np.where(ratios != np.trunc(ratios), purchases / scale, 0)).groupby(groups).cumsum()
+    return held.groupby(groups).shift(fill_value=0).to_numpy() * scale, lost.groupby(groups).shift(fill_value=0).to_numpy() * scale
+
+def replayedPositions(transactions: pd.DataFrame, rows: np.ndarray) -> np.ndarray:
+    # Units replay holds of each row's share, or option ID, before the row, for rows in replay order that replay can apply
+    # Which purchase dates are left to round down on a split depends on the sale order of every sale before it, so where that rounding
+    # decides a sale the asset is replayed rather than summed
+    portfolio = Portfolio()
+    held = np.zeros(len(rows))
+    for position, (index, transaction) in enumerate(transactions.iloc[rows].iterrows()):
+        book = portfolio.holdings.get((transaction['AssetType'], transaction['AssetID']))
+        if book is not None:
+            held[position] = book.quantities[book.select(str(transaction['OptionID']) if transaction['AssetType'] == AssetType.Option else None)].sum()
+        portfolio.applyTransaction(transaction)
+    return held
+
+def validateTransactions(transactions: pd.DataFrame) -> pd.DataFrame:
+    # Finds decoded transactions that replay would fail on or get wrong, one row per problem with Row the transaction's index
+    # Running positions for every (AssetID, OptionID) are taken for the whole history at once, in replay order
+    if transactions.empty:
+        return pd.DataFrame(columns=issueColumns)
+    transactionTypes = transactions['TransactionType']
+    isShare = (transactions['AssetType'] == AssetType.Share).to_numpy()
+    isOption = (transactions['AssetType'] == AssetType.Option).to_numpy()
+    isPurchase = (transactionTypes == TransactionType.Purchase).to_numpy()
+    isShareSale = transactionTypes.isin(shareSaleTypes).to_numpy()
+    isOptionSale = (transactionTypes == TransactionType.Option_Sale).to_numpy()
+    isSplit = (transactionTypes == TransactionType.Split).to_numpy()
+    isMerge = (transactionTypes == TransactionType.Merge).to_numpy()
+    isExercise = (transactionTypes == TransactionType.Exercise).to_numpy()
+    isExpire = (transactionTypes == TransactionType.Expire).to_numpy()
+    quantities = transactions['Quantity'].to_numpy(dtype=float)
+    units = np.maximum(np.trunc(quantities), 0) # Replay only holds and sells whole units
+    issues = []
+
+    # Sale types replay cannot apply to the asset type
+    shareSaleOnOption = isShareSale & isOption
+    optionSaleOnShare = isOptionSale & isShare
+    expireOnShare = isExpire & isShare
+    issues.append((shareSaleOnOption, 'Share sale type used on an option, options are sold with Option_Sale by option ID'))
+    issues.append((optionSaleOnShare, 'Option_Sale used on a share, shares are sold with a share sale type'))
+    issues.append((expireOnShare, 'Expire used on a share, only options expire'))
+    wrongType = shareSaleOnOption | optionSaleOnShare | expireOnShare
+
+    # Units each row adds or takes, and the factor splits and merges multiply the units held by
+    sells = ((isShareSale & isShare) | (isOptionSale & isOption) | (isExercise & isOption)) & ~wrongType
+    deltas = np.where(isPurchase | (isExercise & isShare), units, 0) - np.where(sells, units, 0)
+    ratios = np.ones(len(transactions))
+    ratios = np.where(isSplit & (quantities > 0), quantities, ratios)
+    ratios = np.where(isMerge & (quantities > 0), 1 / np.where(quantities > 0, quantities, 1), ratios)
+    expires = isExpire & isOption
+
+    # Positions are held per asset type, AssetID and option lineage, an expiry empties the position so rows after it start afresh
+    keys = pd.DataFrame({'AssetType': isOption, 'AssetID': transactions['AssetID'].astype(str).to_numpy(), 'OptionID': optionLineages(transactions)})
+    keys['Key'] = keys.groupby(['AssetType', 'AssetID', 'OptionID'], sort=False).ngroup()
+    keys['Segment'] = pd.Series(expires).groupby(keys['Key'].to_numpy()).cumsum().to_numpy() - expires
+    groups = keys.groupby(['Key', 'Segment'], sort=False).ngroup().to_numpy()
+    held, lost = runningPositions(groups, deltas, ratios)
+
+    # A share exercise takes the cost base of the option exercise before it with the same OptionID, which only one share exercise can use
+    exercises = transactions.loc[isExercise, ['OptionID']].astype(str)
+    exercises['Option'] = isOption[isExercise]
+    previousIsOption = exercises.groupby('OptionID', sort=False)['Option'].shift(fill_value=False).to_numpy(dtype=bool)
+    unmatched = np.zeros(len(transactions), dtype=bool)
+    unmatched[np.flatnonzero(isExercise)] = ~exercises['Option'].to_numpy() & ~previousIsOption
+    issues.append((unmatched, 'Share exercise has no option exercise with the same OptionID before it'))
+
+    # Assets with a sale or expiry that rounding on a split could decide take replay's positions up to their last such row, leaving out
+    # the rows replay would fail on
+    uncertain = ((sells & (units > held - lost - tolerance)) | (expires & (held - lost < 1))) & (lost > 0)
+    if uncertain.any():
+        assetIDs = keys['AssetID'].to_numpy()
+        lastUncertain = pd.Series(np.flatnonzero(uncertain)).groupby(assetIDs[uncertain]).max()
+        within = np.arange(len(transactions)) <= pd.Series(assetIDs).map(lastUncertain).fillna(-1).to_numpy()
+        replayed = np.flatnonzero(within & ~wrongType & ~unmatched & (quantities > 0))
+        held[replayed] = replayedPositions(transactions, replayed)
+
+    oversold = sells & (units > held + tolerance * np.maximum(held, 1))
+    issues.append((oversold & ~(isExercise & isOption), 'Sells more units than are held'))
+    issues.append((oversold & isExercise & isOption, 'Exercises more options than are held'))
+    issues.append((expires & (held < 1 - tolerance), 'Expires options that are not held'))
+
+    reported = []
+    for mask, issue in issues:
+        if mask.any():
+            rows = transactions.loc[mask, issueColumns[1:-1]].copy()
+            rows.insert(0, 'Row', transactions.index[mask])
+            rows['Issue'] = issue
+            reported.append(rows)
+    if not reported:
+        return pd.DataFrame(columns=issueColumns)
+    return pd.concat(reported).sort_values('Row', kind='stable', ignore_index=True)
+
+def checkTransactions(transactions: pd.DataFrame, limit: int = 20):
+    # Raises before replay when any transaction cannot be replayed, listing the first limit of them
+    issues = validateTransactions(transactions)
+    if len(issues):
+        lines = [f"Row {row.Row}, {toDate(toDay(row.Date))} {row.AssetID} {row.OptionID} {row.TransactionType}: {row.Issue}".replace('  ', ' ') for row in issues.head(limit).itertuples()]
+        if len(issues) > limit:
+            lines.append(f'and {len(issues) - limit} more')
+        raise Exception(f'{len(issues)} of the transactions cannot be calculated, please check them:\n' + '\n'.join(lines))
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'Checks a transaction history CSV for transactions that cannot be replayed')
+    parser.add_argument('file', help = 'transaction history CSV')
+    args = parser.parse_args()
+
+    transactionHistory = TransactionHistory()
+    transactionHistory.readData(pd.read_csv(args.file))
+    issues = validateTransactions(transactionHistory.transactions)
+    if len(issues):
+        print(issues.to_string(index = False))
+        sys.exit(1)
+    print(f'{len(transactionHistory.transactions)} transactions, no problems found')
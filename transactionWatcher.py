@@ -0,0 +1,102 @@
+from pandasCGcalc import TransactionHistory, Portfolio, sortKey
+import pandas as pd
+import argparse
+import io
+import os
+import time
+
+tailBytes = 64
+
+class TransactionWatcher:
+    # Follows a transaction history CSV that a broker feed appends to, parsing only the bytes added since the last poll
+    # Appended rows dated on or after the last transaction are replayed onto the existing portfolio, rows dated earlier change
+    # events already recorded so the whole history is replayed. A file that was rewritten rather than appended to is read again
+    def __init__(self, path: str):
+        self.path = path
+        self.transactionHistory = TransactionHistory()
+        self.portfolio = Portfolio()
+        self.columns = []
+        self.offset = 0
+        self.tail = b''
+        self.firstEvent = 0
+        self.replayed = False
+
+    @property
+    def transactions(self) -> pd.DataFrame:
+        return self.transactionHistory.transactions
+
+    def start(self):
+        with open(self.path, 'rb') as file:
+            data = file.read()
+        data = data[:data.rfind(b'\n') + 1] or data # A line still being written is left for the next poll, unless it is the header
+        self.columns = pd.read_csv(io.BytesIO(data), nrows=0).columns.tolist()
+        self.transactionHistory = TransactionHistory()
+        self.portfolio = Portfolio()
+        self.tail = b''
+        self.advance(data, 0, pd.read_csv(io.BytesIO(data)))
+
+    def advance(self, data: bytes, offset: int, rows: pd.DataFrame):
+        self.offset = offset + len(data)
+        self.tail = (self.tail + data)[-tailBytes:]
+        self.firstEvent = len(self.portfolio.taxEvents)
+        self.replayed = False
+        if rows.empty:
+            return
+        last = self.transactions.iloc[-1] if len(self.transactions) else None
+        appended = self.transactionHistory.appendData(rows)
+        if last is not None and sortKey(appended.iloc[0]) < sortKey(last):
+            self.portfolio = Portfolio()
+            self.portfolio.readTransactions(self.transactions)
+            self.firstEvent = 0
+            self.replayed = True
+        else:
+            self.portfolio.readTransactions(appended)
+
+    def appended(self) -> bool:
+        # The bytes already read are unchanged, so anything past them was appended
+        size = os.path.getsize(self.path)
+        if size < self.offset:
+            return False
+        with open(self.path, 'rb') as file:
+            file.seek(self.offset - len(self.tail))
+            return file.read(len(self.tail)) == self.tail
+
+    def poll(self) -> bool:
+        # Reads complete lines added since the last poll, True if the portfolio changed
+        if not self.appended():
+            self.start()
+            self.replayed = True
+            return True
+        with open(self.path, 'rb') as file:
+            file.seek(self.offset)
+            data = file.read()
+        data = data[:data.rfind(b'\n') + 1] # A line still being written is read once it is complete
+        if not data.strip():
+            return False
+        self.advance(data, self.offset, pd.read_csv(io.BytesIO(data), header=None, names=self.columns))
+        return True
+
+    def newEvents(self) -> pd.DataFrame:
+        # CGT events recorded by the last poll
+        return self.portfolio.taxableTransactions.iloc[self.firstEvent:]
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'Watches a transaction history CSV and reports CGT events as rows are appended to it')
+    parser.add_argument('file', help = 'transaction history CSV')
+    parser.add_argument('--interval', type = float, default = 0.5, help = 'seconds between checks of the file')
+    args = parser.parse_args()
+
+    watcher = TransactionWatcher(args.file)
+    watcher.start()
+    print(watcher.portfolio.taxableTransactions.to_string(index = False))
+    try:
+        while True:
+            time.sleep(args.interval)
+            start = time.perf_counter()
+            if watcher.poll():
+                print(f'{len(watcher.transactions)} transactions, {"replayed" if watcher.replayed else "advanced"} in {time.perf_counter() - start:.3f}s')
+                if len(watcher.newEvents()):
+                    print(watcher.newEvents().to_string(index = False))
+                print(watcher.portfolio.consolidatePortfolio().to_string(index = False))
+    except KeyboardInterrupt:
+        pass
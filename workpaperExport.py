@@ -0,0 +1,91 @@
+from concurrent.futures import ProcessPoolExecutor
+from pandasCGcalc import Portfolio, TransactionHistory
+import datetime as dt
+import pandas as pd
+import os
+import time
+
+def financialYear(dates: pd.Series) -> pd.Series:
+    # Australian financial years end on 30 June, FY2023 runs 1/7/2022 - 30/6/2023
+    dates = pd.to_datetime(dates)
+    return dates.dt.year + (dates.dt.month >= 7).astype(int)
+
+def partitionByFinancialYear(frame: pd.DataFrame, years: list[int], dateColumn: str = 'Date') -> dict:
+    if frame.empty:
+        return {year: frame for year in years}
+    groups = dict(tuple(frame.groupby(financialYear(frame[dateColumn]))))
+    return {year: groups[year] if year in groups else frame.iloc[0:0] for year in years}
+
+def writeWorkpaper(fileName: str, transactions: pd.DataFrame, taxTransactions: pd.DataFrame, startDate: dt.date | None = None, endDate: dt.date | None = None) -> float:
+    start = time.perf_counter()
+    portfolio = Portfolio()
+    tab1 = TransactionHistory().filterByDate(transactions, startDate, endDate)
+    tab2 = portfolio.filterTaxTransactions(taxTransactions, startDate, endDate)
+    tab3 = portfolio.filterTaxTransactions(taxTransactions, startDate, endDate, 1)
+    tab4 = portfolio.filterTaxTransactions(taxTransactions, startDate, endDate, 2)
+
+    with pd.ExcelWriter(fileName) as writer:
+        tab1.to_excel(writer, sheet_name = 'Transaction_Listing')
+        tab2.to_excel(writer, sheet_name = 'CGT_Transactions')
+        tab3.to_excel(writer, sheet_name = 'CGT_Consol_Date')
+        tab4.to_excel(writer, sheet_name = 'CGT_Consol_Asset')
+
+    import openpyxl as px # Deferred until export, openpyxl is slow to import and unused at startup
+    wb = px.load_workbook(fileName)
+    formatWorkpaper(wb)
+    wb.save(fileName)
+    return time.perf_counter() - start
+
+def formatWorkpaper(workbook):
+    from openpyxl.utils import get_column_letter
+    from openpyxl.styles import Alignment
+    for sheet in workbook.worksheets:
+        headers = [cell.value for cell in sheet[1]]
+        number_format_rules = {
+            'Value': '#,##0.00',
+            'Proceeds' : '#,##0.00',
+            'CostBase' : '#,##0.00',
+            'GrossValue' : '#,##0.00',
+            'Date' : 'DD/MM/YYYY',
+            'AcquisitionDate' : 'DD/MM/YYYY',
+        }
+        alignment_rules = {
+            'Discountable' : Alignment(horizontal="left"),
+        }
+        for i, column_cells in enumerate(sheet.columns, start=1):
+            column_letter = get_column_letter(i)
+            for cell in column_cells:
+                # Apply number format if column is in number_format_rules
+                if headers[i-1] in number_format_rules:
+                    cell.number_format = number_format_rules[headers[i-1]]
+                # Apply alignment if column is in alignment_rules
+                if headers[i-1] in alignment_rules:
+                    cell.alignment = alignment_rules[headers[i-1]]
+
+            max_length = 0
+            for cell in column_cells:
+                try:
+                    if len(str(cell.value)) > max_length:
+                        max_length = len(cell.value)
+                except:
+                    pass
+            adjusted_width = (max_length + 7)
+            sheet.column_dimensions[column_letter].width = adjusted_width
+
+def exportFinancialYears(directory: str, baseName: str, transactions: pd.DataFrame, taxTransactions: pd.DataFrame, firstYear: int, lastYear: int, maxWorkers: int | None = None) -> tuple[float, dict]:
+    # Partitions the transactions and CGT events by financial year once, then writes one workbook per year in worker processes
+    # Returns total elapsed time and elapsed time per financial year
+    start = time.perf_counter()
+    years = list(range(min(firstYear, lastYear), max(firstYear, lastYear) + 1))
+    transactionYears = partitionByFinancialYear(transactions, years)
+    taxYears = partitionByFinancialYear(taxTransactions, years)
+
+    yearTimes = {}
+    with ProcessPoolExecutor(max_workers = maxWorkers) as executor:
+        futures = {}
+        for year in years:
+            fileName = os.path.join(directory, f'{baseName}_FY{year}.xlsx')
+            futures[year] = executor.submit(writeWorkpaper, fileName, transactionYears[year], taxYears[year])
+        for year, future in futures.items():
+            yearTimes[year] = future.result()
+    return time.perf_counter() - start, yearTimes